@@ -6,4 +6,7 @@ set -o errexit
 pip install -r requirements.txt
 
 # Apply database migrations
-python flexilance-mvp/manage.py migrate
\ No newline at end of file
+python flexilance-mvp/manage.py migrate
+
+# Collect static files; WhiteNoise serves the precompressed copies
+python flexilance-mvp/manage.py collectstatic --noinput
\ No newline at end of file
@@ -1,9 +1,68 @@
+"""
+Admin for the marketplace tables.
+
+Jobs and proposals run to millions of rows, so their changelists avoid
+work that grows with the table:
+
+* related objects shown in a row are fetched in the page query
+  (``list_select_related``), not one query per row;
+* filters by user or job list only the selected object, never every
+  user in the sidebar; pick one from a row's link, then clear it with "All";
+* foreign keys on change forms use autocomplete widgets instead of
+  ``<select>`` boxes holding every row;
+* the "N total" count of the unfiltered table is not run;
+* pages are ordered by primary key and search matches exact values or
+  prefixes of indexed columns, never ``icontains`` over text bodies.
+"""
+from urllib.parse import urlencode
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from django.utils.html import format_html
+
 from .models import Profile, Job, Proposal
 
 
+class SelectedRelatedFilter(admin.RelatedFieldListFilter):
+    """
+    Related-object filter that lists only the selected object.
+
+    The stock filter loads every row of the related table into the
+    sidebar. This one shows nothing until the changelist is filtered
+    (see ``filter_link``), then shows that object and "All".
+    """
+
+    def field_choices(self, field, request, model_admin):
+        selected = [value for value in self.lookup_val or () if str(value).isdigit()]
+        if not selected:
+            return []
+        related = field.remote_field.model._default_manager.filter(pk__in=selected)
+        return [(obj.pk, str(obj)) for obj in related]
+
+    def has_output(self):
+        return bool(self.lookup_choices)
+
+
+def filter_link(field_name, label, description=None):
+    """
+    A list_display column showing a related object as a link that filters
+    the changelist by it.
+
+    Args:
+        field_name: Foreign key on the listed model
+        label: Callable giving the text for the related object; it should
+            only read fields loaded by ``list_select_related``
+        description: Column header, defaults to the field name
+    """
+    @admin.display(description=description or field_name.replace('_', ' '))
+    def column(obj):
+        query = urlencode({f'{field_name}__id__exact': getattr(obj, f'{field_name}_id')})
+        return format_html('<a href="?{}">{}</a>', query, label(getattr(obj, field_name)))
+
+    return column
+
+
 class ProfileInline(admin.StackedInline):
     """Inline admin descriptor for Profile model"""
     model = Profile
@@ -14,13 +73,21 @@ class ProfileInline(admin.StackedInline):
 class UserAdmin(BaseUserAdmin):
     """Custom User Admin with Profile inline"""
     inlines = [ProfileInline]
+    # Also serves the client/freelancer autocomplete widgets
+    search_fields = ['username__startswith']
+    show_full_result_count = False
 
 
 class JobAdmin(admin.ModelAdmin):
     """Admin configuration for Job model"""
-    list_display = ['title', 'client', 'budget', 'is_active', 'created_at']
-    list_filter = ['is_active', 'created_at', 'client']
-    search_fields = ['title', 'description', 'client__username']
+    list_display = ['title', filter_link('client', lambda user: user.username), 'budget', 'is_active', 'created_at']
+    list_select_related = ['client']
+    list_filter = ['is_active', 'created_at', ('client', SelectedRelatedFilter)]
+    # Also serves the proposal form's job autocomplete
+    search_fields = ['title__startswith', 'client__username__exact']
+    autocomplete_fields = ['client']
+    ordering = ['-id']
+    show_full_result_count = False
     readonly_fields = ['created_at', 'updated_at']
     fieldsets = (
         ('Basic Information', {
@@ -38,9 +105,16 @@ class JobAdmin(admin.ModelAdmin):
 
 class ProposalAdmin(admin.ModelAdmin):
     """Admin configuration for Proposal model"""
-    list_display = ['job', 'freelancer', 'bid_amount', 'status', 'created_at']
-    list_filter = ['status', 'created_at']
-    search_fields = ['job__title', 'freelancer__username', 'cover_letter']
+    list_display = [
+        '__str__', filter_link('job', lambda job: job.title),
+        filter_link('freelancer', lambda user: user.username), 'bid_amount', 'status', 'created_at',
+    ]
+    list_select_related = ['job', 'freelancer']
+    list_filter = ['status', 'created_at', ('job', SelectedRelatedFilter), ('freelancer', SelectedRelatedFilter)]
+    search_fields = ['job__title__startswith', 'freelancer__username__exact']
+    autocomplete_fields = ['job', 'freelancer']
+    ordering = ['-id']
+    show_full_result_count = False
     readonly_fields = ['created_at', 'updated_at']
     fieldsets = (
         ('Proposal Details', {
@@ -0,0 +1,128 @@
+"""
+Move closed jobs and their proposals into archive tables.
+
+Jobs that have been inactive for ``ARCHIVE_AFTER_DAYS`` are copied, with
+all their proposals, into ``ArchivedJob`` / ``ArchivedProposal`` and
+deleted from the live tables, so the indexes behind the job and proposal
+lists only cover rows that can still change. Rows keep their ids, and the
+archive tables use the live tables' column names, so the row serializers
+read both. History views (``my_jobs``, ``job_proposals``, the proposal
+list) union the two with ``with_archived``.
+
+Each batch is one transaction: the copy and the delete commit together
+or not at all. Stored attachments stay where they are; archived rows keep
+referencing them, so ``gc_media`` treats them as live.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import (
+    ArchivedJob, ArchivedProposal, Contract, Job, Proposal, Thread, keep_stored_files,
+)
+
+
+@dataclass
+class ArchiveReport:
+    batches: int = 0
+    jobs: int = 0
+    proposals: int = 0
+
+
+def archivable_jobs(before):
+    """
+    Inactive jobs last updated before ``before``.
+
+    Jobs are kept live while any of their proposals still has an open
+    contract or a thread with messages since ``before``: contracts and
+    threads point at proposals by id, so archiving those would leave them
+    dangling.
+    """
+    in_use = Proposal.objects.filter(job=OuterRef('pk')).filter(
+        Q(id__in=Contract.objects.exclude(status='completed').values('proposal_id'))
+        | Q(id__in=Thread.objects.filter(last_message_at__gte=before).values('proposal_id'))
+    )
+    return Job.objects.filter(is_active=False, updated_at__lt=before).exclude(Exists(in_use))
+
+
+def _copy(queryset, model, archived_at):
+    """
+    Insert ``model`` rows copied column for column from ``queryset``.
+    """
+    attnames = [field.attname for field in queryset.model._meta.concrete_fields]
+    rows = queryset.order_by().values(*attnames)
+    return len(model.objects.bulk_create(
+        [model(archived_at=archived_at, **row) for row in rows], batch_size=500,
+    ))
+
+
+def archive_jobs(days=None, batch_size=500, max_batches=None, dry_run=False, now=None):
+    """
+    Archive closed jobs in bounded batches.
+
+    Args:
+        days: Minimum days since a job was last updated; defaults to
+            ARCHIVE_AFTER_DAYS
+        batch_size: Jobs moved per transaction
+        max_batches: Stop after this many batches (None for no limit)
+        dry_run: Count what would be archived without moving anything
+        now: Reference time, defaults to timezone.now()
+
+    Returns:
+        ArchiveReport: Batches run and rows moved
+    """
+    now = now or timezone.now()
+    before = now - timedelta(days=settings.ARCHIVE_AFTER_DAYS if days is None else days)
+    report = ArchiveReport()
+
+    if dry_run:
+        jobs = archivable_jobs(before)
+        report.jobs = jobs.count()
+        report.proposals = Proposal.objects.filter(job__in=jobs).count()
+        return report
+
+    while max_batches is None or report.batches < max_batches:
+        with transaction.atomic():
+            ids = list(
+                archivable_jobs(before).select_for_update().order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            jobs = Job.objects.filter(id__in=ids)
+            proposals = Proposal.objects.filter(job_id__in=ids)
+            report.jobs += _copy(jobs, ArchivedJob, now)
+            report.proposals += _copy(proposals, ArchivedProposal, now)
+            with keep_stored_files():
+                proposals.delete()
+                jobs.delete()
+        report.batches += 1
+        if len(ids) < batch_size:
+            break
+    return report
+
+
+def with_archived(row_serializer, live, archived):
+    """
+    Rows from a live queryset followed by matching archived rows.
+
+    Args:
+        row_serializer: RowSerializer selecting the columns
+        live: Queryset on Job or Proposal
+        archived: Matching queryset on ArchivedJob or ArchivedProposal
+
+    Returns:
+        QuerySet: ``UNION ALL`` of both projections, newest first. created_at
+        and id are appended to the projection when the serializer does not
+        read them; ``serialize`` ignores trailing columns.
+    """
+    columns = list(row_serializer.columns)
+    columns += [column for column in ('created_at', 'id') if column not in columns]
+    rows = live.order_by().values_list(*columns).union(
+        archived.order_by().values_list(*columns), all=True,
+    )
+    return rows.order_by('-created_at', '-id')
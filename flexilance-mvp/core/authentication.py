@@ -0,0 +1,16 @@
+"""
+Authentication classes for the API.
+"""
+from rest_framework.authentication import TokenAuthentication
+
+from .instrumentation import span
+
+
+class TimedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that reports its time as the ``auth`` span.
+    """
+
+    def authenticate(self, request):
+        with span('auth'):
+            return super().authenticate(request)
@@ -0,0 +1,24 @@
+"""
+HTTP benchmark suite for the Flexilance API.
+
+Run it with ``python manage.py benchmark``; see that command for options.
+"""
+from .dataset import seed_dataset
+from .environment import throwaway_environment
+from .report import compare_to_baseline, format_table, load_baseline, save_baseline, summarize
+from .runner import SCENARIOS, LiveServerTransport, WSGITransport, prepare_dataset, run_scenario
+
+__all__ = [
+    'SCENARIOS',
+    'LiveServerTransport',
+    'WSGITransport',
+    'compare_to_baseline',
+    'format_table',
+    'load_baseline',
+    'prepare_dataset',
+    'run_scenario',
+    'save_baseline',
+    'seed_dataset',
+    'summarize',
+    'throwaway_environment',
+]
@@ -0,0 +1,112 @@
+"""
+Dataset seeding for the benchmark suite.
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+
+from core.models import Profile, Job, Proposal
+from core.seeding import SKILLS
+
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+def seed_dataset(clients=10, freelancers=50, jobs_per_client=20,
+                 proposals_per_job=5, open_jobs=0, prefix='bench', seed=0):
+    """
+    Create a benchmark dataset with bulk inserts.
+
+    Args:
+        clients: Number of client users to create
+        freelancers: Number of freelancer users to create
+        jobs_per_client: Active jobs posted by each client
+        proposals_per_job: Proposals submitted to each job
+        open_jobs: Extra jobs without proposals, used by proposal-create runs
+        prefix: Username prefix for every seeded user
+        seed: Random seed so runs are repeatable
+
+    Returns:
+        dict: Auth tokens and object ids the scenarios draw from
+    """
+    rng = random.Random(seed)
+    password = make_password(BENCHMARK_PASSWORD)
+
+    client_users = User.objects.bulk_create([
+        User(username=f'{prefix}_client_{i}', email=f'{prefix}_client_{i}@example.com', password=password)
+        for i in range(clients)
+    ])
+    freelancer_users = User.objects.bulk_create([
+        User(username=f'{prefix}_freelancer_{i}', email=f'{prefix}_freelancer_{i}@example.com', password=password)
+        for i in range(freelancers)
+    ])
+
+    # bulk_create skips the post_save signal, so profiles are created here;
+    # use seed_marketplace for datasets too large to hold in memory
+    Profile.objects.bulk_create(
+        [Profile(user=user, is_freelancer=False) for user in client_users] +
+        [
+            Profile(user=user, is_freelancer=True, skills=', '.join(rng.sample(SKILLS, 3)))
+            for user in freelancer_users
+        ]
+    )
+
+    client_tokens = Token.objects.bulk_create([
+        Token(user=user, key=Token.generate_key()) for user in client_users
+    ])
+    freelancer_tokens = Token.objects.bulk_create([
+        Token(user=user, key=Token.generate_key()) for user in freelancer_users
+    ])
+
+    jobs = []
+    for client in client_users:
+        for n in range(jobs_per_client):
+            jobs.append(Job(
+                title=f'{rng.choice(SKILLS)} project {n}',
+                description=f'Seeded job {n} for {client.username}. ' * 5,
+                budget=Decimal(rng.randrange(50, 5000)),
+                client=client,
+                skills_required=', '.join(rng.sample(SKILLS, 3)),
+            ))
+    jobs = Job.objects.bulk_create(jobs)
+
+    open_job_list = Job.objects.bulk_create([
+        Job(
+            title=f'Open benchmark job {n}',
+            description='Seeded job without proposals',
+            budget=Decimal(1000),
+            client=client_users[n % len(client_users)],
+        )
+        for n in range(open_jobs)
+    ]) if client_users else []
+
+    proposals = []
+    per_job = min(proposals_per_job, len(freelancer_users))
+    for job in jobs:
+        for freelancer in rng.sample(freelancer_users, per_job):
+            proposals.append(Proposal(
+                job=job,
+                freelancer=freelancer,
+                cover_letter=f'Seeded proposal from {freelancer.username}. ' * 5,
+                bid_amount=(job.budget * Decimal(rng.uniform(0.6, 1.1))).quantize(Decimal('0.01')),
+                delivery_time=rng.randrange(1, 60),
+            ))
+    Proposal.objects.bulk_create(proposals, batch_size=1000)
+
+    client_jobs = {}
+    for job in jobs:
+        client_jobs.setdefault(job.client_id, []).append(job.id)
+
+    return {
+        'prefix': prefix,
+        'clients': [
+            {'token': token.key, 'job_ids': client_jobs.get(token.user_id, [])}
+            for token in client_tokens
+        ],
+        'freelancers': [{'token': token.key} for token in freelancer_tokens],
+        'job_ids': [job.id for job in jobs],
+        'open_job_ids': [job.id for job in open_job_list],
+    }
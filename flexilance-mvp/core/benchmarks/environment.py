@@ -0,0 +1,33 @@
+"""
+Isolated database and media directory for benchmark runs.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import override_settings
+
+
+@contextmanager
+def throwaway_environment():
+    """
+    Run the block against a freshly migrated test database and a temporary
+    MEDIA_ROOT, both removed afterwards.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    workdir = tempfile.mkdtemp(prefix='flexilance-bench-')
+    if connection.vendor == 'sqlite':
+        # A file database lets worker threads write concurrently;
+        # shared-cache in-memory databases fail with "table is locked".
+        connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'benchmark.sqlite3')
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(workdir, 'media')):
+            yield workdir
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,241 @@
+"""
+Microbenchmarks for hot code paths that are too small to see in HTTP runs.
+"""
+import time
+
+from rest_framework.test import APIRequestFactory
+
+from .dataset import seed_dataset
+
+
+def best_of(func, repeat):
+    """
+    Smallest wall time of ``repeat`` calls to ``func``, in seconds.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _rows_result(benchmark, variants, rows, baseline):
+    results = []
+    base = variants[baseline]
+    for variant, seconds in variants.items():
+        results.append({
+            'benchmark': benchmark,
+            'variant': variant,
+            'per_row_us': round(seconds / rows * 1e6, 2),
+            'speedup': round(base / seconds, 2) if seconds else None,
+        })
+    return results
+
+
+def bench_serialization(rows=100, repeat=30):
+    """
+    Per-row cost of a job and a proposal list page.
+
+    Compares the ModelSerializer path as the views used it (lazy related
+    lookups), the same with select_related, and the RowSerializer fast path,
+    both end to end (query + serialization) and for serialization alone.
+    """
+    from core.models import Job, Proposal
+    from core.serializers import (
+        JobSerializer, ProposalSerializer, JOB_ROW_SERIALIZER, PROPOSAL_ROW_SERIALIZER,
+    )
+
+    dataset = seed_dataset(clients=1, freelancers=20, jobs_per_client=rows, proposals_per_job=1, prefix='micro')
+    request = APIRequestFactory().get('/api/jobs/')
+    client_id = Job.objects.filter(id=dataset['job_ids'][0]).values_list('client_id', flat=True).get()
+
+    cases = [
+        ('jobs', Job.objects.filter(is_active=True), JobSerializer, JOB_ROW_SERIALIZER, ['client']),
+        ('proposals', Proposal.objects.filter(job__client_id=client_id), ProposalSerializer,
+         PROPOSAL_ROW_SERIALIZER, ['job', 'freelancer']),
+    ]
+
+    results = []
+    for name, queryset, serializer_class, row_serializer, related in cases:
+        context = {'request': request}
+        variants = {
+            'model-serializer': best_of(
+                lambda: serializer_class(list(queryset[:rows]), many=True, context=context).data, repeat),
+            'model-serializer+select_related': best_of(
+                lambda: serializer_class(
+                    list(queryset.select_related(*related)[:rows]), many=True, context=context
+                ).data, repeat),
+            'row-serializer': best_of(
+                lambda: row_serializer.serialize(list(row_serializer.values(queryset)[:rows]), request), repeat),
+        }
+        results += _rows_result(f'{name} end-to-end', variants, rows, 'model-serializer')
+
+        instances = list(queryset.select_related(*related)[:rows])
+        tuples = list(row_serializer.values(queryset)[:rows])
+        variants = {
+            'model-serializer': best_of(
+                lambda: serializer_class(instances, many=True, context=context).data, repeat),
+            'row-serializer': best_of(lambda: row_serializer.serialize(tuples, request), repeat),
+        }
+        results += _rows_result(f'{name} serialize-only', variants, rows, 'model-serializer')
+    return results
+
+
+def bench_json(rows=100, repeat=30):
+    """
+    Per-row cost of rendering and parsing a job list page as JSON.
+
+    Compares DRF's stdlib JSONRenderer/JSONParser with the orjson-backed
+    FastJSONRenderer/FastJSONParser on the same paginated payload.
+    """
+    from io import BytesIO
+
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from core.models import Job
+    from core.parsers import FastJSONParser
+    from core.renderers import FastJSONRenderer
+    from core.serializers import JOB_ROW_SERIALIZER
+
+    seed_dataset(clients=1, freelancers=1, jobs_per_client=rows, proposals_per_job=0, prefix='micro')
+    request = APIRequestFactory().get('/api/jobs/')
+    results_page = JOB_ROW_SERIALIZER.serialize(
+        list(JOB_ROW_SERIALIZER.values(Job.objects.filter(is_active=True))[:rows]), request)
+    page = {'count': len(results_page), 'next': None, 'previous': None, 'results': results_page}
+    body = JSONRenderer().render(page)
+
+    results = []
+    variants = {
+        'stdlib': best_of(lambda: JSONRenderer().render(page), repeat),
+        'orjson': best_of(lambda: FastJSONRenderer().render(page), repeat),
+    }
+    results += _rows_result('json render', variants, rows, 'stdlib')
+    variants = {
+        'stdlib': best_of(lambda: JSONParser().parse(BytesIO(body)), repeat),
+        'orjson': best_of(lambda: FastJSONParser().parse(BytesIO(body)), repeat),
+    }
+    results += _rows_result('json parse', variants, rows, 'stdlib')
+    return results
+
+
+def bench_sparse(rows=100, repeat=30):
+    """
+    Per-row time and payload size of sparse job and proposal list pages.
+
+    Descriptions and cover letters are padded to ~2 KB, typical of real
+    posts, so the cost of fetching and encoding large text columns shows.
+    Each variant runs the query, serialization and JSON rendering.
+    """
+    from core.models import Job, Proposal
+    from core.renderers import FastJSONRenderer
+    from core.serializers import JOB_ROW_SERIALIZER, PROPOSAL_ROW_SERIALIZER
+
+    dataset = seed_dataset(clients=1, freelancers=20, jobs_per_client=rows, proposals_per_job=1, prefix='micro')
+    Job.objects.update(description='Looking for an experienced developer. ' * 55)
+    Proposal.objects.update(cover_letter='I have delivered similar projects before. ' * 50)
+    request = APIRequestFactory().get('/api/jobs/')
+    client_id = Job.objects.filter(id=dataset['job_ids'][0]).values_list('client_id', flat=True).get()
+
+    cases = [
+        ('jobs', Job.objects.filter(is_active=True), JOB_ROW_SERIALIZER, {
+            'all fields': {},
+            'omit=description,client_email': {'omit': ['description', 'client_email']},
+            'fields=id,title,budget,deadline': {'fields': ['id', 'title', 'budget', 'deadline']},
+        }),
+        ('proposals', Proposal.objects.filter(job__client_id=client_id), PROPOSAL_ROW_SERIALIZER, {
+            'all fields': {},
+            'omit=cover_letter,freelancer_email': {'omit': ['cover_letter', 'freelancer_email']},
+            'fields=id,job,bid_amount,status': {'fields': ['id', 'job', 'bid_amount', 'status']},
+        }),
+    ]
+
+    results = []
+    for name, queryset, row_serializer, variants in cases:
+        timings = {}
+        sizes = {}
+        for variant, options in variants.items():
+            sparse = row_serializer.subset(**options)
+
+            def render(sparse=sparse):
+                return FastJSONRenderer().render(sparse.serialize(list(sparse.values(queryset)[:rows]), request))
+
+            timings[variant] = best_of(render, repeat)
+            sizes[variant] = len(render())
+        for result in _rows_result(f'{name} sparse', timings, rows, 'all fields'):
+            result['bytes_per_row'] = round(sizes[result['variant']] / rows)
+            results.append(result)
+    return results
+
+
+def bench_throttle(rows=100, repeat=30):
+    """
+    Per-request cost of the token-bucket throttles.
+
+    ``rows`` requests from as many users run through both throttle classes
+    (user and IP bucket) with each bucket store: the process-local memory
+    cache and the shared memory file used across gunicorn workers.
+    """
+    import os
+    import tempfile
+
+    from django.contrib.auth.models import User
+    from django.test import override_settings
+
+    from core import throttling
+
+    factory = APIRequestFactory()
+    requests = []
+    for i in range(rows):
+        request = factory.get('/api/jobs/', REMOTE_ADDR=f'10.0.{i // 256}.{i % 256}')
+        request.user = User(pk=i + 1)
+        request.resolver_match = None
+        requests.append(request)
+    throttles = [throttling.UserTokenBucketThrottle(), throttling.IPTokenBucketThrottle()]
+
+    def check():
+        for request in requests:
+            for throttle in throttles:
+                throttle.allow_request(request, None)
+
+    directory = tempfile.mkdtemp()
+    variants = {}
+    stores = {
+        'locmem-cache': {'THROTTLE_STORE_PATH': None},
+        'shared-memory': {'THROTTLE_STORE_PATH': os.path.join(directory, 'buckets')},
+    }
+    try:
+        for variant, options in stores.items():
+            with override_settings(THROTTLE_ENABLED=True, THROTTLE_RATES={'user': '1000000/s', 'ip': '1000000/s'},
+                                   **options):
+                throttling.reset_store()
+                variants[variant] = best_of(check, repeat)
+    finally:
+        throttling.reset_store()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    return _rows_result('throttle check', variants, rows, 'locmem-cache')
+
+
+MICROBENCHMARKS = {
+    'serialization': bench_serialization,
+    'json': bench_json,
+    'sparse': bench_sparse,
+    'throttle': bench_throttle,
+}
+
+
+def format_results(results):
+    """
+    Render microbenchmark rows as a fixed-width text table.
+    """
+    header = f"{'benchmark':<28}{'variant':<34}{'us/row':>10}{'speedup':>9}{'bytes/row':>11}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        size = r.get('bytes_per_row', '')
+        lines.append(
+            f"{r['benchmark']:<28}{r['variant']:<34}{r['per_row_us']:>10.2f}{r['speedup']:>8.2f}x{size:>11}"
+        )
+    return '\n'.join(lines)
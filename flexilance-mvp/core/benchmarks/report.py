@@ -0,0 +1,128 @@
+"""
+Latency summaries and baseline comparison for the benchmark suite.
+"""
+import json
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers.
+
+    Args:
+        values: Numbers to rank, in any order
+        pct: Percentile between 0 and 100
+
+    Returns:
+        float: The percentile value, or 0.0 for an empty list
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(name, latencies, elapsed, queries=None, errors=None):
+    """
+    Reduce raw per-request timings to the figures we track.
+
+    Args:
+        name: Scenario name
+        latencies: Per-request wall time in seconds
+        elapsed: Wall time of the whole run in seconds
+        queries: Per-request SQL query counts, when they were recorded
+        errors: Status codes or exception reprs of failed requests
+
+    Returns:
+        dict: Throughput, latency percentiles in ms and queries per request
+    """
+    errors = errors or []
+    count = len(latencies)
+    return {
+        'scenario': name,
+        'requests': count,
+        'errors': len(errors),
+        'error_samples': sorted({str(error) for error in errors})[:5],
+        'rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def load_baseline(path):
+    """
+    Load a baseline file written by save_baseline.
+
+    Returns:
+        dict: Scenario name to summary
+    """
+    with open(path) as f:
+        return json.load(f)['scenarios']
+
+
+def save_baseline(path, results):
+    """
+    Store run summaries as the new JSON baseline.
+    """
+    with open(path, 'w') as f:
+        json.dump({'scenarios': {result['scenario']: result for result in results}}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25):
+    """
+    Find scenarios that regressed against a stored baseline.
+
+    Latency and throughput may drift by ``tolerance`` (a fraction) before
+    they count as a regression; query counts must not grow at all.
+
+    Args:
+        results: Summaries from the current run
+        baseline: Scenario name to summary, as returned by load_baseline
+        tolerance: Allowed relative slowdown
+
+    Returns:
+        list: Human readable regression messages, empty when nothing regressed
+    """
+    regressions = []
+    for result in results:
+        base = baseline.get(result['scenario'])
+        if not base:
+            continue
+        name = result['scenario']
+
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if base.get(key) and result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {result[key]} > baseline {base[key]}")
+
+        if base.get('rps') and result['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: rps {result['rps']} < baseline {base['rps']}")
+
+        if (base.get('queries_per_request') is not None and result['queries_per_request'] is not None
+                and result['queries_per_request'] > base['queries_per_request']):
+            regressions.append(
+                f"{name}: queries_per_request {result['queries_per_request']} > "
+                f"baseline {base['queries_per_request']}"
+            )
+
+        if result['errors'] > base.get('errors', 0):
+            regressions.append(f"{name}: errors {result['errors']} > baseline {base.get('errors', 0)}")
+    return regressions
+
+
+def format_table(results):
+    """
+    Render summaries as a fixed-width text table.
+    """
+    header = f"{'scenario':<28}{'req':>7}{'err':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'q/req':>8}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        qpr = '-' if r['queries_per_request'] is None else f"{r['queries_per_request']:.1f}"
+        lines.append(
+            f"{r['scenario']:<28}{r['requests']:>7}{r['errors']:>6}{r['rps']:>10.1f}"
+            f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{qpr:>8}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,372 @@
+"""
+Concurrent request driver for the benchmark suite.
+
+Requests go either straight into the project's WSGI application in this
+process, or over HTTP to a live server such as ``manage.py runserver``.
+"""
+import http.client
+import io
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from urllib.parse import urlencode, urlsplit
+
+from django.db import connection
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+from .report import summarize
+
+
+class WSGITransport:
+    """
+    Call the Django WSGI application in-process, without a socket.
+    """
+
+    counts_queries = True
+
+    def __init__(self, application=None):
+        if application is None:
+            from django.core.wsgi import get_wsgi_application
+            application = get_wsgi_application()
+        self.application = application
+
+    def request(self, method, path, query=None, body=b'', content_type=None, token=None):
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': urlencode(query or {}),
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'testserver',
+            'REMOTE_ADDR': '127.0.0.1',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if content_type:
+            environ['CONTENT_TYPE'] = content_type
+        if token:
+            environ['HTTP_AUTHORIZATION'] = f'Token {token}'
+
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split(' ', 1)[0]))
+
+        result = self.application(environ, start_response)
+        try:
+            size = sum(len(chunk) for chunk in result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return status[0], size
+
+    def close(self):
+        pass
+
+
+class LiveServerTransport:
+    """
+    Send requests to a running server over keep-alive HTTP connections.
+    """
+
+    counts_queries = False
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self._local.connection = conn
+        return conn
+
+    def request(self, method, path, query=None, body=b'', content_type=None, token=None):
+        url = self.prefix + path
+        if query:
+            url = f'{url}?{urlencode(query)}'
+        headers = {}
+        if content_type:
+            headers['Content-Type'] = content_type
+        if token:
+            headers['Authorization'] = f'Token {token}'
+
+        conn = self._connection()
+        try:
+            conn.request(method, url, body=body or None, headers=headers)
+            response = conn.getresponse()
+            payload = response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self._local.connection = None
+            raise
+        return response.status, len(payload)
+
+    def close(self):
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            conn.close()
+
+
+def _multipart(data):
+    return encode_multipart(BOUNDARY, data), MULTIPART_CONTENT
+
+
+def _tiny_png():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color='blue').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class _NamedBytes(io.BytesIO):
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+def _client(dataset, i):
+    return dataset['clients'][i % len(dataset['clients'])]
+
+
+def _freelancer(dataset, i):
+    return dataset['freelancers'][i % len(dataset['freelancers'])]
+
+
+def jobs_list(dataset, i):
+    return {'method': 'GET', 'path': '/api/jobs/', 'token': _freelancer(dataset, i)['token']}
+
+
+def jobs_search(dataset, i):
+    return {
+        'method': 'GET',
+        'path': '/api/jobs/',
+        'query': {'search': ('Python', 'React', 'Figma', 'SEO')[i % 4]},
+        'token': _freelancer(dataset, i)['token'],
+    }
+
+
+def jobs_create(dataset, i):
+    body, content_type = _multipart({
+        'title': f'Benchmark job {i}',
+        'description': 'Created by the benchmark suite',
+        'budget': '750.00',
+        'skills_required': 'Python, Django',
+    })
+    return {
+        'method': 'POST', 'path': '/api/jobs/', 'body': body,
+        'content_type': content_type, 'token': _client(dataset, i)['token'],
+    }
+
+
+def my_jobs(dataset, i):
+    return {'method': 'GET', 'path': '/api/my-jobs/', 'token': _client(dataset, i)['token']}
+
+
+def proposals_list_freelancer(dataset, i):
+    return {'method': 'GET', 'path': '/api/proposals/', 'token': _freelancer(dataset, i)['token']}
+
+
+def proposals_list_client(dataset, i):
+    return {'method': 'GET', 'path': '/api/proposals/', 'token': _client(dataset, i)['token']}
+
+
+def proposals_create(dataset, i):
+    freelancers = len(dataset['freelancers'])
+    open_jobs = dataset['open_job_ids'] or dataset['job_ids']
+    body, content_type = _multipart({
+        'job': open_jobs[(i // freelancers) % len(open_jobs)],
+        'cover_letter': 'Benchmark proposal',
+        'bid_amount': '500.00',
+        'delivery_time': 7,
+    })
+    return {
+        'method': 'POST', 'path': '/api/proposals/', 'body': body,
+        'content_type': content_type, 'token': _freelancer(dataset, i)['token'],
+    }
+
+
+def job_proposals(dataset, i):
+    client = _client(dataset, i)
+    job_id = client['job_ids'][i % len(client['job_ids'])]
+    return {'method': 'GET', 'path': f'/api/jobs/{job_id}/proposals/', 'token': client['token']}
+
+
+def jobs_batch(dataset, i):
+    client = _client(dataset, i)
+    return {
+        'method': 'GET', 'path': '/api/jobs/',
+        'query': {'ids': ','.join(str(job_id) for job_id in client['job_ids'])},
+        'token': client['token'],
+    }
+
+
+def dashboard_client(dataset, i):
+    return {'method': 'GET', 'path': '/api/dashboard/', 'token': _client(dataset, i)['token']}
+
+
+def dashboard_freelancer(dataset, i):
+    return {'method': 'GET', 'path': '/api/dashboard/', 'token': _freelancer(dataset, i)['token']}
+
+
+def profile(dataset, i):
+    return {'method': 'GET', 'path': '/api/profile/', 'token': _freelancer(dataset, i)['token']}
+
+
+def register(dataset, i):
+    body, content_type = _multipart({
+        'username': f"{dataset['prefix']}_{dataset['run_id']}_reg_{i}",
+        'email': f"{dataset['prefix']}_{dataset['run_id']}_reg_{i}@example.com",
+        'password': 'benchmark-password',
+        'is_freelancer': 'true',
+    })
+    return {'method': 'POST', 'path': '/api/register/', 'body': body, 'content_type': content_type}
+
+
+def upload_profile_picture(dataset, i):
+    body, content_type = _multipart({
+        'profile_picture': _NamedBytes(dataset['image'], f'bench_{i}.png'),
+    })
+    return {
+        'method': 'PATCH', 'path': '/api/profile/picture/', 'body': body,
+        'content_type': content_type, 'token': _freelancer(dataset, i)['token'],
+    }
+
+
+def upload_job_attachment(dataset, i):
+    body, content_type = _multipart({
+        'title': f'Benchmark job with attachment {i}',
+        'description': 'Created by the benchmark suite',
+        'budget': '750.00',
+        'attachment': _NamedBytes(dataset['attachment'], f'brief_{i}.txt'),
+    })
+    return {
+        'method': 'POST', 'path': '/api/jobs/', 'body': body,
+        'content_type': content_type, 'token': _client(dataset, i)['token'],
+    }
+
+
+SCENARIOS = {
+    'jobs-list': jobs_list,
+    'jobs-search': jobs_search,
+    'jobs-create': jobs_create,
+    'my-jobs': my_jobs,
+    'job-proposals': job_proposals,
+    'proposals-list-freelancer': proposals_list_freelancer,
+    'proposals-list-client': proposals_list_client,
+    'proposals-create': proposals_create,
+    'jobs-batch': jobs_batch,
+    'dashboard-client': dashboard_client,
+    'dashboard-freelancer': dashboard_freelancer,
+    'profile': profile,
+    'register': register,
+    'upload-profile-picture': upload_profile_picture,
+    'upload-job-attachment': upload_job_attachment,
+}
+
+
+def prepare_dataset(dataset):
+    """
+    Add the request payloads shared by every scenario to a seeded dataset.
+    """
+    dataset.setdefault('run_id', format(int(time.time() * 1000), 'x'))
+    dataset.setdefault('image', _tiny_png())
+    dataset.setdefault('attachment', b'benchmark attachment\n' * 512)
+    return dataset
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_scenario(name, transport, dataset, requests=200, concurrency=4, warmup=10):
+    """
+    Drive one scenario and summarize its latency distribution.
+
+    Args:
+        name: Key into SCENARIOS
+        transport: WSGITransport or LiveServerTransport instance
+        dataset: Dataset returned by seed_dataset and prepare_dataset
+        requests: Number of measured requests
+        concurrency: Number of worker threads issuing requests
+        warmup: Requests sent before measuring starts
+
+    Returns:
+        dict: Summary produced by report.summarize
+    """
+    build = SCENARIOS[name]
+    sequence = itertools.count()
+    latencies = []
+    queries = []
+    errors = []
+    lock = threading.Lock()
+
+    def send(i, measure):
+        spec = build(dataset, i)
+        counter = _QueryCounter()
+        started = time.perf_counter()
+        wrapper = connection.execute_wrapper(counter) if transport.counts_queries else nullcontext()
+        try:
+            with wrapper:
+                status_code, _ = transport.request(
+                    spec['method'], spec['path'], spec.get('query'),
+                    spec.get('body', b''), spec.get('content_type'), spec.get('token'),
+                )
+        except Exception as e:
+            status_code = repr(e)
+        elapsed = time.perf_counter() - started
+
+        if not measure:
+            return
+        with lock:
+            latencies.append(elapsed)
+            if transport.counts_queries:
+                queries.append(counter.count)
+            if not isinstance(status_code, int) or status_code >= 400:
+                errors.append(status_code)
+
+    def worker(limit, measure):
+        try:
+            while True:
+                i = next(sequence)
+                if i >= limit:
+                    break
+                send(i, measure)
+        finally:
+            transport.close()
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    for _ in range(warmup):
+        send(next(sequence), measure=False)
+
+    limit = warmup + requests
+    started = time.perf_counter()
+    if concurrency <= 1:
+        worker(limit, measure=True)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(worker, limit, True) for _ in range(concurrency)]:
+                future.result()
+    elapsed = time.perf_counter() - started
+
+    return summarize(name, latencies, elapsed, queries=queries, errors=errors)
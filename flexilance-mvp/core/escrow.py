@@ -0,0 +1,299 @@
+"""
+Contracts, milestones and escrow payments.
+
+A client turns an accepted proposal into a ``Contract`` split into
+``Milestone``s. Each milestone moves ``pending -> funded`` when the client
+pays it into escrow, then ``funded -> released`` when the client pays the
+freelancer or ``funded -> refunded`` when the freelancer (or staff) hands
+the money back. Every move is a ``Payment`` ledger row.
+
+A move takes two transactions around the gateway call, so no database
+lock is held while the provider answers:
+
+1. lock the milestone, check its state and record a pending payment
+   (a milestone with a pending payment cannot start another);
+2. record the outcome; on success also advance the milestone and add the
+   amount to the running totals on the contract and on the client's and
+   freelancer's ``UserFinancialTotals``.
+
+Totals change only in step 2, inside the same transaction as the ledger
+row, so history and earnings endpoints read them instead of summing
+payments.
+
+If a worker dies between the two steps, the payment stays pending and
+blocks its milestone. ``reconcile_pending`` (run by the scheduler) asks
+the gateway about payments pending longer than ``PAYMENT_PENDING_TIMEOUT``
+and finishes step 2 for them. Step 2 only applies to a payment that is
+still pending, so a late worker and the reconciler cannot both count it.
+"""
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Contract, Milestone, Payment, UserFinancialTotals
+from .payment_gateway import get_gateway
+
+
+logger = logging.getLogger('core.escrow')
+
+
+class EscrowError(Exception):
+    """Base class for refused contract and payment operations"""
+
+
+class EscrowForbidden(EscrowError):
+    """The user may not perform this operation"""
+
+
+class EscrowConflict(EscrowError):
+    """The contract or milestone is not in a state that allows this operation"""
+
+
+class PaymentDeclined(EscrowError):
+    """The gateway refused the payment"""
+
+    def __init__(self, message, payment):
+        super().__init__(message)
+        self.payment = payment
+
+
+class PaymentPending(EscrowError):
+    """The gateway call failed without an answer; reconciliation settles the payment"""
+
+    def __init__(self, message, payment):
+        super().__init__(message)
+        self.payment = payment
+
+
+@dataclass(frozen=True)
+class Move:
+    source: str
+    target: str
+    total: str
+    gateway_call: str
+
+
+MOVES = {
+    'escrow': Move('pending', 'funded', 'escrowed', 'charge'),
+    'release': Move('funded', 'released', 'released', 'transfer'),
+    'refund': Move('funded', 'refunded', 'refunded', 'refund'),
+}
+
+
+def contracts_for(user):
+    """
+    Contracts the user is the client or freelancer on.
+    """
+    return Contract.objects.filter(Q(client=user) | Q(freelancer=user))
+
+
+def create_contract(proposal, client, milestones=None):
+    """
+    Create a contract for an accepted proposal.
+
+    Args:
+        proposal: Proposal with its job loaded
+        client: The job's owner
+        milestones: List of dicts with title, amount and optional
+            due_date; defaults to one milestone for the bid amount
+
+    Returns:
+        Contract: The new contract, amount being the milestones' total
+
+    Raises:
+        EscrowForbidden: ``client`` does not own the job
+        EscrowConflict: The proposal is not accepted or already has a contract
+    """
+    if proposal.job.client_id != client.pk:
+        raise EscrowForbidden('Only the job owner can create a contract')
+    if proposal.status != 'accepted':
+        raise EscrowConflict('Only accepted proposals can become contracts')
+    milestones = milestones or [{'title': proposal.job.title[:200], 'amount': proposal.bid_amount}]
+
+    with transaction.atomic():
+        if Contract.objects.filter(proposal_id=proposal.pk).exists():
+            raise EscrowConflict('This proposal already has a contract')
+        contract = Contract.objects.create(
+            proposal_id=proposal.pk,
+            title=proposal.job.title[:200],
+            client_id=client.pk,
+            freelancer_id=proposal.freelancer_id,
+            amount=sum((Decimal(m['amount']) for m in milestones), Decimal('0')),
+        )
+        Milestone.objects.bulk_create([
+            Milestone(contract=contract, position=position, title=m['title'], amount=m['amount'],
+                      due_date=m.get('due_date'))
+            for position, m in enumerate(milestones)
+        ])
+    return contract
+
+
+def complete_contract(contract, user, now=None):
+    """
+    Mark a contract completed once no milestone is unpaid or in escrow.
+
+    Raises:
+        EscrowForbidden: ``user`` is not the client
+        EscrowConflict: Some milestone is still pending or funded
+    """
+    if contract.client_id != user.pk:
+        raise EscrowForbidden('Only the client can complete a contract')
+    with transaction.atomic():
+        contract = Contract.objects.select_for_update().get(pk=contract.pk)
+        if contract.status == 'completed':
+            return contract
+        if contract.milestones.filter(status__in=['pending', 'funded']).exists():
+            raise EscrowConflict('Every milestone must be released or refunded first')
+        contract.status = 'completed'
+        contract.completed_at = now or timezone.now()
+        contract.save(update_fields=['status', 'completed_at'])
+    return contract
+
+
+def _check_actor(kind, contract, user):
+    if kind == 'refund':
+        if user.pk != contract.freelancer_id and not user.is_staff:
+            raise EscrowForbidden('Only the freelancer or staff can refund a milestone')
+    elif user.pk != contract.client_id:
+        raise EscrowForbidden('Only the client can pay a milestone')
+
+
+def add_to_totals(contract, total, amount):
+    """
+    Add ``amount`` to one running total of a contract and of both its users.
+    """
+    Contract.objects.filter(pk=contract.pk).update(**{total: F(total) + amount})
+    UserFinancialTotals.objects.bulk_create([
+        UserFinancialTotals(user_id=contract.client_id, role='client'),
+        UserFinancialTotals(user_id=contract.freelancer_id, role='freelancer'),
+    ], ignore_conflicts=True)
+    UserFinancialTotals.objects.filter(
+        Q(user_id=contract.client_id, role='client') | Q(user_id=contract.freelancer_id, role='freelancer'),
+    ).update(**{total: F(total) + amount})
+
+
+def move(milestone_id, user, kind):
+    """
+    Escrow, release or refund a milestone through the payment gateway.
+
+    Args:
+        milestone_id: Milestone to move
+        user: User asking for the move
+        kind: 'escrow', 'release' or 'refund'
+
+    Returns:
+        Payment: The succeeded ledger row
+
+    Raises:
+        Milestone.DoesNotExist: No such milestone on the user's contracts
+            (any contract for staff)
+        EscrowForbidden: The user's role does not allow this move
+        EscrowConflict: The milestone is in the wrong state or has a payment in progress
+        PaymentDeclined: The gateway refused; the failed payment is recorded
+        PaymentPending: The gateway call raised or timed out; the provider
+            may still have moved the money, so the payment stays pending
+            (blocking the milestone) until ``reconcile_pending`` looks it up
+    """
+    step = MOVES[kind]
+    with transaction.atomic():
+        milestones = Milestone.objects.select_for_update(of=('self',)).select_related(
+            'contract__client', 'contract__freelancer',
+        )
+        if not user.is_staff:
+            milestones = milestones.filter(Q(contract__client=user) | Q(contract__freelancer=user))
+        milestone = milestones.get(pk=milestone_id)
+        contract = milestone.contract
+        _check_actor(kind, contract, user)
+        if contract.status != 'active':
+            raise EscrowConflict(f'Contract is {contract.status}')
+        if milestone.status != step.source:
+            raise EscrowConflict(f'Milestone is {milestone.status}, not {step.source}')
+        if milestone.payments.filter(status='pending').exists():
+            raise EscrowConflict('A payment for this milestone is in progress')
+        payment = Payment.objects.create(
+            contract=contract, milestone=milestone, kind=kind, amount=milestone.amount,
+            reference=f'{kind}_{uuid.uuid4().hex}',
+        )
+
+    counterparty = contract.freelancer if kind == 'release' else contract.client
+    try:
+        result = getattr(get_gateway(), step.gateway_call)(payment, counterparty)
+    except Exception:
+        logger.exception('Payment gateway %s failed for %s', step.gateway_call, payment.reference)
+        raise PaymentPending('The payment is in progress; its outcome is not known yet', payment)
+
+    _settle(payment, result)
+    if payment.status != 'succeeded':
+        raise PaymentDeclined(result.message or 'Payment failed', payment)
+    return payment
+
+
+def _settle(payment, result):
+    """
+    Record a gateway answer on a pending payment (step 2).
+
+    On success, also advances the milestone and adds to the totals.
+
+    Returns:
+        bool: False if the payment was already settled elsewhere; ``payment``
+        then gets the stored status
+    """
+    step = MOVES[payment.kind]
+    status = 'succeeded' if result.succeeded else 'failed'
+    reference = result.reference
+    with transaction.atomic():
+        if not Payment.objects.filter(pk=payment.pk, status='pending').update(
+            status=status, gateway_reference=reference,
+        ):
+            payment.refresh_from_db(fields=['status', 'gateway_reference'])
+            return False
+        payment.status, payment.gateway_reference = status, reference
+        if status == 'succeeded':
+            Milestone.objects.filter(pk=payment.milestone_id).update(status=step.target)
+            add_to_totals(payment.contract, step.total, payment.amount)
+    return True
+
+
+def reconcile_pending(now=None, older_than=None):
+    """
+    Settle payments left pending by a worker that died during the gateway call.
+
+    Each is looked up by reference: a payment the provider completed
+    succeeds, with the milestone and totals moved as ``move()`` would;
+    one it has no successful record of fails, so the milestone is payable
+    again. Payments whose lookup errors stay pending for the next run.
+
+    Args:
+        now: Current time, defaults to timezone.now()
+        older_than: Seconds a payment must have been pending, defaults to
+            PAYMENT_PENDING_TIMEOUT
+
+    Returns:
+        dict: Number of payments that succeeded and failed
+    """
+    now = now or timezone.now()
+    if older_than is None:
+        older_than = settings.PAYMENT_PENDING_TIMEOUT
+    stale = Payment.objects.filter(
+        status='pending', created_at__lt=now - timedelta(seconds=older_than),
+    ).select_related('contract').order_by('id')
+    counts = {'succeeded': 0, 'failed': 0}
+    gateway = get_gateway()
+    for payment in stale:
+        try:
+            result = gateway.lookup(payment)
+        except Exception:
+            logger.exception('Payment gateway lookup failed for %s', payment.reference)
+            continue
+        if _settle(payment, result):
+            counts[payment.status] += 1
+    if counts['succeeded'] or counts['failed']:
+        logger.info('Reconciled pending payments: %(succeeded)d succeeded, %(failed)d failed', counts)
+    return counts
@@ -1,6 +1,7 @@
 """
 Custom file fields for handling both Cloudinary and local storage backends.
 """
+import logging
 import os
 from django.db import models
 from django.conf import settings
@@ -8,6 +9,11 @@ from django.core.files.storage import default_storage
 from django.core.files import File
 from django.utils.deconstruct import deconstructible
 
+from .storage_gateway import StorageGatewayError, get_gateway
+
+
+logger = logging.getLogger('core.storage')
+
 
 @deconstructible
 class FlexibleFileField(models.FileField):
@@ -51,18 +57,23 @@ class FlexibleFileField(models.FileField):
             if settings.CLOUDINARY_ENABLED:
                 # Use Cloudinary storage
                 try:
-                    from cloudinary.uploader import upload
-                    from cloudinary.utils import cloudinary_url
-                    
                     # Upload to Cloudinary
-                    result = upload(file, folder="flexilance")
+                    result = get_gateway().upload(file, folder="flexilance")
                     file.name = result['public_id']
                     file._committed = True
                     
-                except Exception as e:
-                    # Fallback to local storage if Cloudinary fails
-                    print(f"Cloudinary upload failed, falling back to local storage: {e}")
-                    return super().pre_save(model_instance, add)
+                except StorageGatewayError as e:
+                    # Fallback to local storage if Cloudinary fails or its circuit is open;
+                    # the field's own storage is Cloudinary, so write to MEDIA_ROOT directly
+                    from .storage_utils import upload_file_fallback
+
+                    logger.warning("Cloudinary upload failed, falling back to local storage: %s", e)
+                    file.seek(0)
+                    result = upload_file_fallback(file, folder="flexilance")
+                    if not result['success']:
+                        raise
+                    file.name = result['filename']
+                    file._committed = True
             else:
                 # Use local storage
                 return super().pre_save(model_instance, add)
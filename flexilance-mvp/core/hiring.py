@@ -0,0 +1,98 @@
+"""
+Accepting and rejecting a job's proposals in bulk.
+
+``decide()`` applies a client's decisions in one transaction: it locks
+the job row, so concurrent decisions on one job run one after another;
+locks and reads the affected proposals once; changes their status with at
+most two ``UPDATE`` statements, however many proposals there are; closes
+the job when someone is hired; and records a single ``proposals.decided``
+outbox event that fans out into one notification per freelancer.
+"""
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import notifications
+from .models import Job, Proposal
+
+
+class DecisionConflict(Exception):
+    """Some proposals were already decided or do not belong to the job, or the job cannot hire"""
+
+    def __init__(self, message, proposal_ids=()):
+        super().__init__(message)
+        self.proposal_ids = sorted(proposal_ids)
+
+
+@dataclass
+class Decision:
+    job_id: int
+    is_active: bool
+    accepted: list = field(default_factory=list)
+    rejected: list = field(default_factory=list)
+
+
+def decide(job_id, client, accept=(), reject=(), reject_others=False, now=None):
+    """
+    Accept and reject pending proposals on one of the client's jobs.
+
+    Args:
+        job_id: Id of the job
+        client: The job's owner
+        accept: Proposal ids to accept; at most one
+        reject: Proposal ids to reject
+        reject_others: Also reject every other pending proposal
+        now: Timestamp for updated_at
+
+    Returns:
+        Decision: Ids accepted and rejected, and whether the job is still open
+
+    Raises:
+        Job.DoesNotExist: No such job owned by ``client``
+        DecisionConflict: A listed proposal is not pending on this job, or
+            a proposal is accepted on a closed job or one that already hired;
+            nothing is changed
+    """
+    accept, reject = set(accept), set(reject)
+    if accept & reject:
+        raise DecisionConflict('A proposal cannot be both accepted and rejected', accept & reject)
+    if len(accept) > 1:
+        raise DecisionConflict('Only one proposal can be accepted', accept)
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        job = Job.objects.select_for_update().get(pk=job_id, client=client)
+        if accept:
+            if not job.is_active:
+                raise DecisionConflict('The job is closed', accept)
+            hired = list(Proposal.objects.filter(job=job, status='accepted').values_list('id', flat=True))
+            if hired:
+                raise DecisionConflict('The job already has an accepted proposal', hired)
+        pending = Proposal.objects.select_for_update().filter(job=job, status='pending')
+        if not reject_others:
+            pending = pending.filter(id__in=accept | reject)
+        freelancers = dict(pending.order_by().values_list('id', 'freelancer_id'))
+
+        missing = (accept | reject) - freelancers.keys()
+        if missing:
+            raise DecisionConflict('Proposals are not pending on this job', missing)
+        rejected = freelancers.keys() - accept
+
+        if accept:
+            Proposal.objects.filter(id__in=accept).update(status='accepted', updated_at=now)
+            Job.objects.filter(pk=job.pk).update(is_active=False, updated_at=now)
+            job.is_active = False
+        if rejected:
+            Proposal.objects.filter(id__in=rejected).update(status='rejected', updated_at=now)
+
+        decision = Decision(job.pk, job.is_active, sorted(accept), sorted(rejected))
+        if freelancers:
+            notifications.emit(
+                'proposals.decided',
+                job_id=job.pk,
+                job_title=job.title,
+                accepted=[[pk, freelancers[pk]] for pk in decision.accepted],
+                rejected=[[pk, freelancers[pk]] for pk in decision.rejected],
+            )
+    return decision
@@ -0,0 +1,128 @@
+"""
+Idempotency keys for create endpoints.
+
+A client that may retry a ``POST`` sends the same ``Idempotency-Key``
+header on every attempt. The first attempt claims the key for the user by
+inserting an ``IdempotencyKey`` row, runs normally, and stores its status
+and body on the row. A retry finds the row and gets the stored response
+back (with ``Idempotent-Replayed: true``) without parsing the body or
+running serializers, uploads or writes again. While the first attempt is
+still running, retries get ``409``.
+
+Keys are scoped to the user and last ``IDEMPOTENCY_KEY_TTL`` seconds;
+expired rows are purged by a periodic task. Reusing a key on a different
+endpoint is refused with ``422``. Only completed responses are stored:
+a 5xx, or an exception raised by the view (validation errors included),
+releases the key so a retry runs again. A worker killed mid-request
+releases nothing, so a claim without a response is a lease: after
+``IDEMPOTENCY_CLAIM_TIMEOUT`` seconds the next retry takes the key over
+and runs the request.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import record_cache
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def claim(user, key, fingerprint, now=None):
+    """
+    Claim ``key`` for a new request, or return the record of an earlier one.
+
+    An expired record, or one claimed more than ``IDEMPOTENCY_CLAIM_TIMEOUT``
+    seconds ago and never completed, is replaced.
+
+    Returns:
+        tuple: (IdempotencyKey, claimed) where ``claimed`` is True if the
+        caller should run the request and store its response
+    """
+    now = now or timezone.now()
+    expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    abandoned = now - timedelta(seconds=settings.IDEMPOTENCY_CLAIM_TIMEOUT)
+    for _ in range(2):
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is not None:
+            if record.expires_at > now and (record.status_code is not None or record.created_at > abandoned):
+                return record, False
+            record.delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=fingerprint, expires_at=expires_at,
+                )
+            return record, True
+        except IntegrityError:
+            # Another attempt claimed it first; read its record
+            continue
+    return IdempotencyKey.objects.get(user=user, key=key), False
+
+
+def purge_expired(now=None):
+    """
+    Delete expired keys.
+
+    Returns:
+        int: Keys deleted
+    """
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
+
+
+class IdempotentCreateMixin:
+    """
+    Make a view's ``create`` replay its first response for a repeated Idempotency-Key.
+
+    Requests without the header, or from anonymous users, are unaffected.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return super().create(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = f'{request.method} {request.path}'[:255]
+        record, claimed = claim(request.user, key, fingerprint)
+        record_cache('idempotency', hit=not claimed)
+        if not claimed:
+            return self.replay(record, fingerprint)
+
+        try:
+            response = super().create(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            record.delete()
+        else:
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code, response=response.data,
+            )
+        return response
+
+    def replay(self, record, fingerprint):
+        if record.fingerprint != fingerprint:
+            return Response(
+                {'error': f'This {HEADER} was used for a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if record.status_code is None:
+            return Response(
+                {'error': f'A request with this {HEADER} is still in progress'},
+                status=status.HTTP_409_CONFLICT,
+                headers={'Retry-After': '1'},
+            )
+        return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
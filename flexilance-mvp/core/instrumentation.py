@@ -0,0 +1,114 @@
+"""
+Per-request performance instrumentation.
+
+``ServerTimingMiddleware`` activates a ``RequestTimings`` recorder for a
+sampled subset of requests. Code that wants its time attributed wraps the
+work in ``span('name')``; outside a sampled request a span does nothing
+beyond one context variable lookup.
+"""
+import time
+from contextvars import ContextVar
+
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Accumulated durations and counts for one request.
+    """
+
+    __slots__ = ('durations', 'counts', 'depth')
+
+    def __init__(self):
+        self.durations = {}
+        self.counts = {}
+        self.depth = {}
+
+    def add(self, name, seconds, count=1):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper that times every query.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - started)
+
+    def as_dict(self, total):
+        """
+        Durations in milliseconds plus counts, keyed for log records.
+        """
+        data = {'total_ms': round(total * 1000, 2)}
+        for name, seconds in self.durations.items():
+            data[f'{name}_ms'] = round(seconds * 1000, 2)
+            data[f'{name}_count'] = self.counts[name]
+        return data
+
+    def server_timing(self, total):
+        """
+        Render the ``Server-Timing`` header value.
+        """
+        metrics = []
+        for name, seconds in self.durations.items():
+            count = self.counts[name]
+            label = 'queries' if name == 'db' else 'calls'
+            metrics.append(f'{name};dur={seconds * 1000:.2f};desc="{count} {label}"')
+        metrics.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+class span:
+    """
+    Attribute the time spent in a block to ``name`` on the active request.
+
+    Nested spans with the same name only count the outermost block, so
+    per-row helpers can be wrapped without double counting.
+    """
+
+    __slots__ = ('name', 'timings', 'started')
+
+    def __init__(self, name):
+        self.name = name
+        self.timings = None
+
+    def __enter__(self):
+        timings = _current.get()
+        if timings is not None:
+            depth = timings.depth.get(self.name, 0)
+            timings.depth[self.name] = depth + 1
+            if not depth:
+                self.timings = timings
+                self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        timings = _current.get()
+        if timings is not None:
+            timings.depth[self.name] -= 1
+        if self.timings is not None:
+            self.timings.add(self.name, time.perf_counter() - self.started)
+            self.timings = None
+        return False
+
+
+def current_timings():
+    """
+    The recorder for the current request, or None when it is not sampled.
+    """
+    return _current.get()
+
+
+def activate(timings):
+    """
+    Make ``timings`` the recorder for the current context; returns a reset token.
+    """
+    return _current.set(timings)
+
+
+def deactivate(token):
+    _current.reset(token)
@@ -0,0 +1,30 @@
+"""
+Move closed jobs and their proposals into the archive tables.
+"""
+from django.core.management.base import BaseCommand
+
+from core.archive import archive_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy jobs inactive for ARCHIVE_AFTER_DAYS days, with their proposals, "
+        "into the archive tables and delete them from the live tables, one "
+        "transaction per batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive jobs inactive for this many days (default ARCHIVE_AFTER_DAYS).')
+        parser.add_argument('--batch-size', type=int, default=500, help='Jobs moved per transaction.')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches.')
+        parser.add_argument('--dry-run', action='store_true', help='Count archivable rows without moving them.')
+
+    def handle(self, *args, **options):
+        report = archive_jobs(
+            days=options['days'],
+            batch_size=max(1, options['batch_size']),
+            max_batches=options['max_batches'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would archive' if options['dry_run'] else f'Archived in {report.batches} batches:'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {report.jobs} jobs and {report.proposals} proposals'))
@@ -0,0 +1,116 @@
+"""
+Run the HTTP benchmark suite against the API endpoints.
+"""
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import (
+    SCENARIOS, LiveServerTransport, WSGITransport, compare_to_baseline, format_table,
+    load_baseline, prepare_dataset, run_scenario, save_baseline, seed_dataset, throwaway_environment,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a benchmark dataset and measure throughput, latency percentiles and "
+        "queries per request for the API endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenarios', default=','.join(SCENARIOS),
+            help=f"Comma separated scenarios to run. Available: {', '.join(SCENARIOS)}",
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent worker threads.')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per scenario.')
+        parser.add_argument(
+            '--url',
+            help=(
+                'Benchmark a live server (e.g. http://127.0.0.1:8000) instead of the in-process '
+                'WSGI app. The dataset is seeded into the configured database and removed afterwards.'
+            ),
+        )
+        parser.add_argument('--clients', type=int, default=10)
+        parser.add_argument('--freelancers', type=int, default=50)
+        parser.add_argument('--jobs-per-client', type=int, default=20)
+        parser.add_argument('--proposals-per-job', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset.')
+        parser.add_argument('--baseline', help='Compare results against this JSON baseline file.')
+        parser.add_argument('--save-baseline', help='Write results to this JSON baseline file.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Allowed relative latency/throughput regression before failing (default 0.25).',
+        )
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(unknown)}")
+
+        per_scenario = options['requests'] + options['warmup']
+        dataset_options = {
+            'clients': max(1, options['clients']),
+            'freelancers': max(1, options['freelancers']),
+            'jobs_per_client': max(1, options['jobs_per_client']),
+            'proposals_per_job': options['proposals_per_job'],
+            'open_jobs': -(-per_scenario // max(1, options['freelancers'])),
+            'seed': options['seed'],
+        }
+
+        if options['url']:
+            results = self._run_live(names, options, dataset_options)
+        else:
+            results = self._run_in_process(names, options, dataset_options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(format_table(results))
+
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['save_baseline']}"))
+
+        if options['baseline']:
+            regressions = compare_to_baseline(results, load_baseline(options['baseline']), options['tolerance'])
+            if regressions:
+                raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+
+    def _run_scenarios(self, names, transport, dataset, options):
+        results = []
+        for name in names:
+            if options['verbosity'] > 1:
+                self.stderr.write(f'Running {name}...')
+            results.append(run_scenario(
+                name, transport, dataset,
+                requests=options['requests'],
+                concurrency=options['concurrency'],
+                warmup=options['warmup'],
+            ))
+        return results
+
+    def _run_in_process(self, names, options, dataset_options):
+        """
+        Run against a throwaway database and media directory.
+        """
+        with throwaway_environment():
+            dataset = prepare_dataset(seed_dataset(**dataset_options))
+            return self._run_scenarios(names, WSGITransport(), dataset, options)
+
+    def _run_live(self, names, options, dataset_options):
+        """
+        Run against a live server that shares this project's database.
+        """
+        prefix = f"bench{format(int(time.time()), 'x')}"
+        dataset = prepare_dataset(seed_dataset(prefix=prefix, **dataset_options))
+        try:
+            return self._run_scenarios(names, LiveServerTransport(options['url']), dataset, options)
+        finally:
+            User.objects.filter(username__startswith=f'{prefix}_').delete()
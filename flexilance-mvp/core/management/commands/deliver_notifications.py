@@ -0,0 +1,33 @@
+"""
+Deliver pending outbox events as notifications.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.notifications import deliver_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "Turn outbox events into notifications in batches. The web workers' "
+        "scheduler does this every NOTIFICATION_DELIVERY_INTERVAL seconds; run "
+        "this with --loop as a dedicated worker when the scheduler is disabled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Events per batch (default NOTIFICATION_BATCH_SIZE).')
+        parser.add_argument('--loop', action='store_true', help='Keep delivering until interrupted.')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = deliver_pending(batch_size=options['batch_size'])
+            if not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Delivered {processed} events'))
+                return
+            if processed:
+                self.stdout.write(f'Delivered {processed} events')
+            connection.close()
+            time.sleep(settings.NOTIFICATION_DELIVERY_INTERVAL)
@@ -0,0 +1,21 @@
+"""
+Deactivate jobs whose deadline has passed.
+"""
+from django.core.management.base import BaseCommand
+
+from core.tasks import expire_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Set is_active=False on active jobs past their deadline, in chunked "
+        "bulk updates. The web workers' scheduler runs the same sweep every "
+        "JOB_EXPIRY_INTERVAL seconds; use this from cron when it is disabled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Jobs per UPDATE (default JOB_EXPIRY_BATCH_SIZE).')
+
+    def handle(self, *args, **options):
+        expired = expire_jobs(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} jobs'))
@@ -0,0 +1,84 @@
+"""
+Delete stored media files that no database row references.
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import media_gc
+from core.storage_utils import LOCAL_FALLBACK_PREFIX, RAW_PREFIX
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the media storage listing, check it against file fields in the "
+        "database in batches, and delete unreferenced files concurrently."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend', choices=['auto', 'local', 'cloudinary'], default='auto',
+            help='Storage to scan (default: Cloudinary when enabled, else MEDIA_ROOT, '
+                 'which includes files the Cloudinary fallback wrote under local/).',
+        )
+        parser.add_argument(
+            '--folders',
+            help='Comma separated top-level folders to scan (default: the upload_to folders of all file fields).',
+        )
+        parser.add_argument(
+            '--min-age', type=float, default=24,
+            help='Only delete files older than this many hours (default 24).',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Names per database lookup.')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent delete threads.')
+        parser.add_argument('--dry-run', action='store_true', help='Report orphans without deleting them.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        backend = options['backend']
+        if backend == 'auto':
+            backend = 'cloudinary' if settings.CLOUDINARY_ENABLED else 'local'
+        if options['folders']:
+            folders = [folder.strip().strip('/') for folder in options['folders'].split(',') if folder.strip()]
+        else:
+            folders = media_gc.default_folders()
+            if backend == 'local':
+                # Files the upload fallback wrote while Cloudinary was unavailable
+                folders.append(LOCAL_FALLBACK_PREFIX.strip('/'))
+            else:
+                # Attachments uploaded with a ticket are raw resources
+                folders += [f'{RAW_PREFIX}{folder}' for folder in folders]
+
+        listing = media_gc.list_cloudinary(folders) if backend == 'cloudinary' else media_gc.list_local(folders)
+        report = media_gc.collect(
+            listing,
+            backend=backend,
+            min_age=options['min_age'] * 3600,
+            batch_size=max(1, options['batch_size']),
+            workers=options['workers'],
+            dry_run=options['dry_run'],
+            keep_orphans=options['verbosity'] > 1,
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps({'backend': backend, 'dry_run': options['dry_run'], **report.as_dict()}))
+            return
+
+        for name in report.orphans:
+            self.stdout.write(f'  orphan: {name}')
+        verb = 'Would reclaim' if options['dry_run'] else 'Reclaimed'
+        self.stdout.write(
+            f"Scanned {report.scanned} files in {', '.join(folders) or '(none)'} ({backend}): "
+            f"{report.referenced} referenced, {report.too_recent} too recent, {report.orphaned} orphaned"
+        )
+        if not options['dry_run']:
+            self.stdout.write(f'Deleted {report.deleted}, failed {report.failed}')
+        self.stdout.write(self.style.SUCCESS(f'{verb} {format_bytes(report.reclaimed_bytes)}'))
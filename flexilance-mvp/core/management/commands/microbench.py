@@ -0,0 +1,38 @@
+"""
+Run microbenchmarks for individual hot paths.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import throwaway_environment
+from core.benchmarks.micro import MICROBENCHMARKS, format_results
+
+
+class Command(BaseCommand):
+    help = "Measure per-row costs of hot code paths against a throwaway database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'benchmarks', nargs='*',
+            help=f"Benchmarks to run (default all). Available: {', '.join(MICROBENCHMARKS)}",
+        )
+        parser.add_argument('--rows', type=int, default=100, help='Rows per page (default 100).')
+        parser.add_argument('--repeat', type=int, default=30, help='Repetitions; the best is kept (default 30).')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+
+    def handle(self, *args, **options):
+        names = options['benchmarks'] or list(MICROBENCHMARKS)
+        unknown = [name for name in names if name not in MICROBENCHMARKS]
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(unknown)}")
+
+        results = []
+        for name in names:
+            with throwaway_environment():
+                results += MICROBENCHMARKS[name](rows=max(1, options['rows']), repeat=max(1, options['repeat']))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(format_results(results))
@@ -0,0 +1,58 @@
+"""
+Report the SQL fingerprints that dominate database time.
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import querystats
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge the query fingerprint snapshots written by each server process to "
+        "QUERY_STATS_DIR and print the top N by total, count, max or mean time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Number of fingerprints to show (default 20).')
+        parser.add_argument(
+            '--sort', choices=['total', 'count', 'max', 'mean'], default='total',
+            help='Ranking key (default total).',
+        )
+        parser.add_argument('--dir', help='Snapshot directory (defaults to QUERY_STATS_DIR).')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.QUERY_STATS_DIR
+        if not directory:
+            raise CommandError('QUERY_STATS_DIR is not set; pass --dir or configure the setting')
+
+        aggregates = querystats.load_snapshots(directory)
+        rows = []
+        for fp, entry in querystats.top(aggregates, options['top'], options['sort']):
+            views = sorted(entry['views'].items(), key=lambda item: item[1], reverse=True)
+            rows.append({
+                'id': querystats.fingerprint_id(fp),
+                'count': entry['count'],
+                'total_ms': round(entry['total'] * 1000, 2),
+                'mean_ms': round(entry['total'] / entry['count'] * 1000, 3) if entry['count'] else 0.0,
+                'max_ms': round(entry['max'] * 1000, 2),
+                'views': [view for view, _ in views[:3]],
+                'fingerprint': fp,
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+        elif not rows:
+            self.stdout.write('No query statistics recorded yet.')
+        else:
+            grand_total = sum(entry['total'] for entry in aggregates.values()) * 1000 or 1
+            for row in rows:
+                self.stdout.write(
+                    f"{row['id']}  total={row['total_ms']:.1f}ms ({row['total_ms'] / grand_total:.0%})  "
+                    f"count={row['count']}  mean={row['mean_ms']:.2f}ms  max={row['max_ms']:.1f}ms  "
+                    f"views={','.join(str(view) for view in row['views'])}"
+                )
+                self.stdout.write(f"    {row['fingerprint'][:300]}")
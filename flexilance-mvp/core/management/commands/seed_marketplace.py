@@ -0,0 +1,84 @@
+"""
+Generate a large marketplace dataset for performance work.
+"""
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from core.seeding import MarketplaceSeeder, default_workers, supports_parallel_writes
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-create users, profiles, jobs and proposals with realistic skill, budget "
+        "and bid distributions, e.g. --users 200000 --jobs 100000 --proposals 1000000."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Total users (default 10000).')
+        parser.add_argument(
+            '--freelancer-ratio', type=float, default=0.7,
+            help='Fraction of users who are freelancers (default 0.7).',
+        )
+        parser.add_argument('--jobs', type=int, default=5000, help='Total jobs (default 5000).')
+        parser.add_argument('--proposals', type=int, default=50000, help='Total proposals (default 50000).')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT (default 5000).')
+        parser.add_argument(
+            '--workers', type=int,
+            help='Worker processes. Defaults to one per CPU, or 1 on SQLite which has a single writer.',
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Username prefix for seeded users; must not be used by existing users (default "seed").',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default 0).')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to seed.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        workers = options['workers'] or default_workers(using)
+        if workers > 1 and not supports_parallel_writes(using):
+            self.stderr.write(self.style.WARNING(
+                'This database backend does not allow concurrent writers; using a single process.'
+            ))
+            workers = 1
+        if not 0 <= options['freelancer_ratio'] <= 1:
+            raise CommandError('--freelancer-ratio must be between 0 and 1')
+        if User.objects.using(using).filter(username__startswith=options['prefix']).exists():
+            raise CommandError(
+                f"Users with prefix '{options['prefix']}' already exist; pass a different --prefix"
+            )
+
+        started = time.monotonic()
+
+        def progress(phase, done, total):
+            if options['verbosity'] and total and (done == total or done % 10 == 0):
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'{phase}: {done}/{total} batches ({elapsed:.1f}s)')
+
+        seeder = MarketplaceSeeder(
+            users=options['users'],
+            jobs=options['jobs'],
+            proposals=options['proposals'],
+            freelancer_ratio=options['freelancer_ratio'],
+            prefix=options['prefix'],
+            batch_size=max(1, options['batch_size']),
+            workers=workers,
+            seed=options['seed'],
+            using=using,
+            progress=progress,
+        )
+        try:
+            created = seeder.run()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        elapsed = time.monotonic() - started
+        total_rows = sum(created.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created['users']} users, {created['profiles']} profiles, {created['jobs']} jobs and "
+            f"{created['proposals']} proposals in {elapsed:.1f}s "
+            f"({total_rows / elapsed if elapsed else total_rows:.0f} rows/s, {workers} worker(s))"
+        ))
@@ -0,0 +1,185 @@
+"""
+Serve locally stored media without copying files through Python.
+
+Used when Cloudinary is not configured, and for files the upload fallback
+kept on disk. Depending on settings the web server sends the file itself
+(``X-Accel-Redirect`` / ``X-Sendfile``); otherwise a ``FileResponse`` hands
+gunicorn a real file descriptor so it can ``sendfile()`` the requested
+byte range straight from the page cache.
+
+Media URLs carry a signature of the stored name (``?sig=``), added by
+``storage_utils.storage_url``. The API only returns a file's URL to users
+who can see the job, proposal or profile it belongs to, so a path that is
+known or guessed without its signature is not served.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.signing import Signer
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+SIGNATURE_PARAM = 'sig'
+
+
+def media_signature(name):
+    """
+    Signature of a stored name, keyed by SECRET_KEY.
+    """
+    return Signer(salt='core.media').signature(name)
+
+
+def signed_media_url(url, name):
+    """
+    ``url`` (a MEDIA_URL address of ``name``) with its signature appended.
+    """
+    return f'{url}?{SIGNATURE_PARAM}={media_signature(name)}'
+
+
+class BoundedFile:
+    """
+    Read-only view of ``length`` bytes of an open file from its current offset.
+
+    Exposes ``fileno()`` so WSGI servers with ``wsgi.file_wrapper`` use
+    sendfile; the caller sets ``Content-Length`` to ``length``, which bounds
+    what gunicorn sends. Servers without sendfile fall back to ``read()``,
+    which never returns bytes past the range.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Resolve a single-range ``Range`` header against a file size.
+
+    Args:
+        header: Raw Range header value
+        size: File size in bytes
+
+    Returns:
+        tuple or None: Inclusive ``(start, end)``, ``None`` to serve the
+        whole file (no header, or a form we do not support such as
+        multiple ranges)
+
+    Raises:
+        ValueError: If the range cannot be satisfied
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError('Unsatisfiable range')
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Unsatisfiable range')
+    return start, end
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with conditional and Range request support.
+
+    Requests without a valid signature for ``path`` get 404, as missing
+    files do.
+    """
+    if not constant_time_compare(request.GET.get(SIGNATURE_PARAM, ''), media_signature(path)):
+        raise Http404('File not found')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid path')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('File not found')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+
+    etag = '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+    last_modified = http_date(stat.st_mtime)
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime),
+    )
+    if not_modified is not None:
+        return not_modified
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX or settings.MEDIA_SENDFILE_HEADER:
+        # The front server reads the file and handles Range itself
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+            prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/')
+            relative = os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+            response['X-Accel-Redirect'] = f'{prefix}/{quote(relative)}'
+        else:
+            response[settings.MEDIA_SENDFILE_HEADER] = full_path
+    else:
+        byte_range = None
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range is None or if_range in (etag, last_modified):
+            try:
+                byte_range = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{stat.st_size}'
+                return response
+
+        start, end = byte_range or (0, stat.st_size - 1)
+        length = end - start + 1
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+        else:
+            file = open(full_path, 'rb')
+            file.seek(start)
+            response = FileResponse(BoundedFile(file, length), content_type=content_type)
+        response['Content-Length'] = str(length)
+        if byte_range is not None:
+            response.status_code = 206
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    return response
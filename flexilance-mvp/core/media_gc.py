@@ -0,0 +1,215 @@
+"""
+Find and delete stored media that no database row references.
+
+Storage is listed as a stream and checked against the database one batch
+at a time: each batch of names costs one indexed ``IN`` query per file
+field, so memory stays bounded by the batch size however many objects the
+bucket or media directory holds. Deletes run on a thread pool because they
+are dominated by filesystem or HTTP latency.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+
+from .storage_gateway import StorageGatewayError, get_gateway
+from .storage_utils import cloudinary_resource_type
+
+
+@dataclass
+class StoredFile:
+    name: str
+    size: int
+    modified: float
+
+
+@dataclass
+class GCReport:
+    scanned: int = 0
+    referenced: int = 0
+    too_recent: int = 0
+    orphaned: int = 0
+    deleted: int = 0
+    failed: int = 0
+    reclaimed_bytes: int = 0
+    orphans: list = field(default_factory=list)
+
+    def as_dict(self):
+        return {
+            'scanned': self.scanned,
+            'referenced': self.referenced,
+            'too_recent': self.too_recent,
+            'orphaned': self.orphaned,
+            'deleted': self.deleted,
+            'failed': self.failed,
+            'reclaimed_bytes': self.reclaimed_bytes,
+        }
+
+
+def file_fields():
+    """
+    Every concrete FileField of every installed model, as (model, field) pairs.
+    """
+    return [
+        (model, model_field)
+        for model in apps.get_models()
+        for model_field in model._meta.concrete_fields
+        if isinstance(model_field, models.FileField)
+    ]
+
+
+def default_folders():
+    """
+    Top-level folders the project's file fields upload into.
+    """
+    folders = set()
+    for _, model_field in file_fields():
+        folder = str(model_field.upload_to).strip('/').split('/')[0]
+        if folder and '%' not in folder:
+            folders.add(folder)
+    return sorted(folders)
+
+
+def list_local(folders, root=None):
+    """
+    Stream files under MEDIA_ROOT/<folder> for each folder.
+    """
+    root = root or settings.MEDIA_ROOT
+    stack = [os.path.join(root, folder) for folder in reversed(folders)]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                    yield StoredFile(name, stat.st_size, stat.st_mtime)
+
+
+def list_cloudinary(folders, page_size=500):
+    """
+    Stream uploaded Cloudinary resources under each folder prefix.
+    """
+    import cloudinary.api
+
+    for folder in folders:
+        cursor = None
+        while True:
+            options = {
+                'type': 'upload', 'prefix': f'{folder}/', 'max_results': page_size,
+                'resource_type': cloudinary_resource_type(f'{folder}/'),
+            }
+            if cursor:
+                options['next_cursor'] = cursor
+            page = cloudinary.api.resources(**options)
+            for resource in page.get('resources', []):
+                created = datetime.fromisoformat(resource['created_at'].replace('Z', '+00:00'))
+                yield StoredFile(resource['public_id'], resource.get('bytes', 0), created.timestamp())
+            cursor = page.get('next_cursor')
+            if not cursor:
+                break
+
+
+def referenced_names(names, fields=None):
+    """
+    The subset of ``names`` stored in any file field.
+    """
+    found = set()
+    for model, model_field in fields or file_fields():
+        found.update(
+            model._default_manager.filter(**{f'{model_field.name}__in': names})
+            .values_list(model_field.attname, flat=True)
+        )
+    return found
+
+
+def _delete_local(name):
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    return True
+
+
+def _delete_cloudinary(name):
+    try:
+        return get_gateway().destroy(name, cloudinary_resource_type(name))
+    except StorageGatewayError:
+        return False
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def collect(listing, backend='local', min_age=86400, batch_size=1000, workers=8,
+            dry_run=False, keep_orphans=False, now=None):
+    """
+    Delete stored files that no row references.
+
+    Args:
+        listing: Iterable of StoredFile, e.g. list_local() or list_cloudinary()
+        backend: 'local' or 'cloudinary', selecting how files are deleted
+        min_age: Skip files modified less than this many seconds ago, so
+            uploads whose row is not committed yet are left alone
+        batch_size: Names checked against the database per query
+        workers: Concurrent delete threads
+        dry_run: Only report what would be deleted
+        keep_orphans: Keep orphan names on the report (for --verbosity 2)
+        now: Reference time, defaults to time.time()
+
+    Returns:
+        GCReport: Counts and reclaimed bytes
+    """
+    delete = _delete_cloudinary if backend == 'cloudinary' else _delete_local
+    cutoff = (now or time.time()) - min_age
+    fields = file_fields()
+    report = GCReport()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch in _batches(listing, batch_size):
+            report.scanned += len(batch)
+            referenced = referenced_names([stored.name for stored in batch], fields)
+            report.referenced += len(referenced)
+
+            orphans = []
+            for stored in batch:
+                if stored.name in referenced:
+                    continue
+                if stored.modified > cutoff:
+                    report.too_recent += 1
+                    continue
+                orphans.append(stored)
+            report.orphaned += len(orphans)
+            if keep_orphans:
+                report.orphans.extend(stored.name for stored in orphans)
+            if dry_run:
+                report.reclaimed_bytes += sum(stored.size for stored in orphans)
+                continue
+
+            for stored, ok in zip(orphans, pool.map(delete, [stored.name for stored in orphans])):
+                if ok:
+                    report.deleted += 1
+                    report.reclaimed_bytes += stored.size
+                else:
+                    report.failed += 1
+    return report
@@ -0,0 +1,97 @@
+"""
+Client/freelancer messaging about proposals.
+
+Each proposal has at most one ``Thread`` between the job's client and the
+freelancer. Messages are only ever appended and are read newest first by
+keyset pagination on the ``(thread, id)`` index, so a page costs the same
+however long the thread is.
+
+Unread state is two read cursors per thread rather than a flag per
+message: sending a message bumps the thread's ``last_seq`` and moves the
+sender's cursor to it; reading moves the reader's cursor forward. A
+participant's unread count is ``last_seq`` minus their cursor, so listing
+an inbox reads one row per thread no matter how many messages there are.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, When
+from django.db.models.functions import Greatest
+
+from . import pubsub
+from .models import Message, Thread
+
+
+def thread_for_proposal(proposal):
+    """
+    The proposal's thread, created on first use.
+    """
+    thread, _ = Thread.objects.get_or_create(proposal_id=proposal.pk, defaults={
+        'subject': proposal.job.title[:200],
+        'client_id': proposal.job.client_id,
+        'freelancer_id': proposal.freelancer_id,
+    })
+    return thread
+
+
+def threads_for(user):
+    """
+    The user's threads, annotated with ``unread``.
+    """
+    return Thread.objects.filter(Q(client=user) | Q(freelancer=user)).annotate(unread=Case(
+        When(client=user, then=F('last_seq') - F('client_read_seq')),
+        default=F('last_seq') - F('freelancer_read_seq'),
+        output_field=IntegerField(),
+    ))
+
+
+def send(thread, sender, body):
+    """
+    Append a message to a thread.
+
+    The thread row is locked while the message takes the next seq, so
+    concurrent senders get consecutive numbers. The sender has read
+    everything up to their own message.
+
+    Returns:
+        Message: The new message
+    """
+    role = thread.role(sender)
+    if role is None:
+        raise ValueError('Sender is not a participant in this thread')
+    with transaction.atomic():
+        seq = Thread.objects.select_for_update().values_list('last_seq', flat=True).get(pk=thread.pk) + 1
+        message = Message.objects.create(thread=thread, sender=sender, seq=seq, body=body)
+        Thread.objects.filter(pk=thread.pk).update(**{
+            'last_seq': seq,
+            'last_message_at': message.created_at,
+            f'{role}_read_seq': seq,
+        })
+        recipient = thread.freelancer_id if role == 'client' else thread.client_id
+        pubsub.publish_on_commit(f'user:{recipient}', 'message.created', {
+            'id': message.id,
+            'thread_id': thread.pk,
+            'sender_id': sender.pk,
+            'body': body[:200],
+        })
+    return message
+
+
+def mark_read(thread, user, up_to=None):
+    """
+    Move the user's read cursor to message ``up_to`` (an id), or to the end.
+
+    Cursors only move forward.
+
+    Returns:
+        int: The user's unread count in the thread afterwards
+    """
+    role = thread.role(user)
+    if role is None:
+        raise ValueError('User is not a participant in this thread')
+    cursor = f'{role}_read_seq'
+    if up_to is None:
+        seq = F('last_seq')
+    else:
+        seq = Message.objects.filter(thread=thread, id__lte=up_to).order_by('-id').values_list('seq', flat=True).first()
+    if seq is not None:
+        Thread.objects.filter(pk=thread.pk).update(**{cursor: Greatest(F(cursor), seq)})
+    return threads_for(user).values_list('unread', flat=True).get(pk=thread.pk)
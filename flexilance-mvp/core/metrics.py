@@ -0,0 +1,438 @@
+"""
+Prometheus metrics with multiprocess aggregation.
+
+Each process keeps its samples in a memory-mapped file under
+``METRICS_MULTIPROC_DIR`` (one file per pid), so increments are a dict
+lookup and a ``struct.pack_into``. The metrics endpoint sums the files of
+every gunicorn worker when it renders the text exposition format. Without
+a directory configured, samples live in process memory only.
+
+Every metric type here is additive (counters and histograms), which is
+what makes summing across worker files correct.
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_INITIAL_FILE_SIZE = 1024 * 1024
+_HEADER = struct.Struct('<I4x')
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+
+
+class _LocalStore:
+    """
+    In-memory sample store for single-process deployments.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+class _MmapStore:
+    """
+    Sample store backed by a memory-mapped file owned by one process.
+
+    Layout: an 8 byte header holding the used length, then entries of
+    ``<uint32 key length><utf-8 key, padded to 8 bytes><float64 value>``.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(_INITIAL_FILE_SIZE)
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        for key, value, offset in _read_entries(self._map, self._used):
+            self._positions[key] = offset
+
+    def _add_key(self, key):
+        encoded = key.encode('utf-8')
+        padded = len(encoded) + (8 - (len(encoded) + _KEY_LENGTH.size) % 8) % 8
+        entry_size = _KEY_LENGTH.size + padded + _VALUE.size
+        while self._used + entry_size > self._capacity:
+            self._capacity *= 2
+            self._file.truncate(self._capacity)
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), self._capacity)
+
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _KEY_LENGTH.size:self._used + _KEY_LENGTH.size + len(encoded)] = encoded
+        offset = self._used + _KEY_LENGTH.size + padded
+        _VALUE.pack_into(self._map, offset, 0.0)
+        self._used += entry_size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = offset
+        return offset
+
+    def inc(self, key, amount):
+        with self._lock:
+            offset = self._positions.get(key)
+            if offset is None:
+                offset = self._add_key(key)
+            value = _VALUE.unpack_from(self._map, offset)[0]
+            _VALUE.pack_into(self._map, offset, value + amount)
+
+    def items(self):
+        with self._lock:
+            return [(key, value) for key, value, _ in _read_entries(self._map, self._used)]
+
+
+def _read_entries(data, used):
+    position = _HEADER.size
+    while position < used:
+        length = _KEY_LENGTH.unpack_from(data, position)[0]
+        key_start = position + _KEY_LENGTH.size
+        key = bytes(data[key_start:key_start + length]).decode('utf-8')
+        padded = length + (8 - (length + _KEY_LENGTH.size) % 8) % 8
+        offset = key_start + padded
+        yield key, _VALUE.unpack_from(data, offset)[0], offset
+        position = offset + _VALUE.size
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        return []
+    used = _HEADER.unpack_from(data, 0)[0]
+    return [(key, value) for key, value, _ in _read_entries(data, used)]
+
+
+def multiprocess_dir():
+    return getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    The sample store for this process, reopened after a fork.
+    """
+    global _store, _store_pid
+    pid = os.getpid()
+    if _store_pid != pid:
+        with _store_lock:
+            if _store_pid != pid:
+                directory = multiprocess_dir()
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                    _store = _MmapStore(os.path.join(directory, f'metrics_{pid}.db'))
+                else:
+                    _store = _LocalStore()
+                _store_pid = pid
+    return _store
+
+
+def reset_store():
+    """
+    Drop this process's store; the next sample opens a fresh one.
+    """
+    global _store, _store_pid
+    with _store_lock:
+        _store = None
+        _store_pid = None
+
+
+def clear_multiprocess_dir():
+    """
+    Remove every worker file. Call from the gunicorn master before forking.
+    """
+    directory = multiprocess_dir()
+    if directory:
+        for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+            os.remove(path)
+
+
+def collect_samples():
+    """
+    Sum samples across all worker files (or this process's memory).
+
+    Returns:
+        dict: Sample key to aggregated value
+    """
+    directory = multiprocess_dir()
+    if not directory:
+        return dict(get_store().items())
+
+    totals = {}
+    get_store()
+    for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+        try:
+            items = _read_file(path)
+        except OSError:
+            continue
+        for key, value in items:
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+_REGISTRY = {}
+
+
+def _sample_key(name, labels):
+    return json.dumps([name, labels], separators=(',', ':'))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        _REGISTRY[name] = self
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(str(kwargs[label]) for label in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._make_child(list(zip(self.labelnames, values)))
+        return child
+
+
+class _CounterChild:
+    __slots__ = ('key',)
+
+    def __init__(self, name, labels):
+        self.key = _sample_key(f'{name}_total', labels)
+
+    def inc(self, amount=1):
+        get_store().inc(self.key, amount)
+
+
+class Counter(_Metric):
+    """
+    Monotonic counter; the exposed sample name gets a ``_total`` suffix.
+    """
+
+    kind = 'counter'
+
+    def _make_child(self, labels):
+        return _CounterChild(self.name, labels)
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'bucket_keys', 'sum_key', 'count_key')
+
+    def __init__(self, name, labels, buckets):
+        self.buckets = buckets
+        self.bucket_keys = [
+            _sample_key(f'{name}_bucket', labels + [('le', _format_bound(bound))])
+            for bound in buckets
+        ] + [_sample_key(f'{name}_bucket', labels + [('le', '+Inf')])]
+        self.sum_key = _sample_key(f'{name}_sum', labels)
+        self.count_key = _sample_key(f'{name}_count', labels)
+
+    def observe(self, value):
+        store = get_store()
+        # Buckets are stored non-cumulatively and summed when rendering,
+        # so an observation costs three increments whatever the bucket count.
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                store.inc(self.bucket_keys[index], 1)
+                break
+        else:
+            store.inc(self.bucket_keys[-1], 1)
+        store.inc(self.sum_key, value)
+        store.inc(self.count_key, 1)
+
+
+class Histogram(_Metric):
+    """
+    Histogram with fixed upper bounds, exposed with cumulative buckets.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _make_child(self, labels):
+        return _HistogramChild(self.name, labels, self.buckets)
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def render():
+    """
+    Render all registered metrics in the Prometheus text format.
+    """
+    families = {}
+    for key, value in collect_samples().items():
+        sample, labels = json.loads(key)
+        for suffix in ('_total', '_bucket', '_sum', '_count'):
+            if sample.endswith(suffix) and sample[:-len(suffix)] in _REGISTRY:
+                family = sample[:-len(suffix)]
+                break
+        else:
+            continue
+        families.setdefault(family, []).append((sample, [tuple(pair) for pair in labels], value))
+
+    lines = []
+    for name in sorted(families):
+        metric = _REGISTRY[name]
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        samples = families[name]
+        if metric.kind == 'histogram':
+            samples = _cumulative_buckets(metric, samples)
+        for sample, labels, value in sorted(samples, key=_sample_order):
+            lines.append(f'{sample}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _sample_order(sample):
+    name, labels, _ = sample
+    plain = [pair for pair in labels if pair[0] != 'le']
+    bound = next((float(value) for label, value in labels if label == 'le'), 0.0)
+    return plain, name.endswith('_count'), name.endswith('_sum'), bound
+
+
+def _cumulative_buckets(metric, samples):
+    bucket_counts = {}
+    result = []
+    for sample, labels, value in samples:
+        if sample.endswith('_bucket'):
+            plain = tuple(pair for pair in labels if pair[0] != 'le')
+            bound = dict(labels)['le']
+            bucket_counts.setdefault(plain, {})[bound] = value
+        else:
+            result.append((sample, labels, value))
+
+    bounds = [_format_bound(bound) for bound in metric.buckets] + ['+Inf']
+    for plain, counts in bucket_counts.items():
+        running = 0.0
+        for bound in bounds:
+            running += counts.get(bound, 0.0)
+            result.append((f'{metric.name}_bucket', list(plain) + [('le', bound)], running))
+    return result
+
+
+REQUEST_LATENCY = Histogram(
+    'flexilance_http_request_duration_seconds',
+    'Request latency by view.',
+    ['view', 'method'],
+)
+REQUESTS = Counter(
+    'flexilance_http_requests',
+    'Requests by view and response status.',
+    ['view', 'method', 'status'],
+)
+EXCEPTIONS = Counter(
+    'flexilance_http_exceptions',
+    'Unhandled exceptions raised by views.',
+    ['view', 'exception'],
+)
+DB_QUERIES = Counter(
+    'flexilance_db_queries',
+    'SQL queries executed, by view.',
+    ['view'],
+)
+UPLOAD_BYTES = Counter(
+    'flexilance_storage_upload_bytes',
+    'Bytes uploaded by storage backend.',
+    ['backend'],
+)
+UPLOAD_LATENCY = Histogram(
+    'flexilance_storage_upload_duration_seconds',
+    'Upload duration by storage backend.',
+    ['backend'],
+)
+UPLOAD_FAILURES = Counter(
+    'flexilance_storage_upload_failures',
+    'Failed uploads by storage backend.',
+    ['backend'],
+)
+STORAGE_CALLS = Counter(
+    'flexilance_storage_remote_calls',
+    'Remote storage API calls by operation and outcome (ok, retry, error, short_circuit).',
+    ['operation', 'outcome'],
+)
+TASK_RUNS = Counter(
+    'flexilance_task_runs',
+    'Scheduled task runs by task and outcome (ok or error).',
+    ['task', 'outcome'],
+)
+THROTTLED = Counter(
+    'flexilance_throttled_requests',
+    'Requests refused by rate limiting, by throttle scope (user or ip).',
+    ['scope'],
+)
+STREAM_CONNECTIONS = Counter(
+    'flexilance_stream_connections',
+    'Event stream connections opened and closed; open = opened - closed.',
+    ['event'],
+)
+CACHE_REQUESTS = Counter(
+    'flexilance_cache_requests',
+    'Cache lookups by cache name and result (hit or miss).',
+    ['cache', 'result'],
+)
+
+
+def record_cache(cache, hit):
+    """
+    Count a cache lookup; hit ratio is hits / (hits + misses).
+    """
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_upload(backend, size, seconds, success=True):
+    """
+    Count an upload's bytes and duration against its storage backend.
+    """
+    if success:
+        UPLOAD_BYTES.labels(backend).inc(size or 0)
+    else:
+        UPLOAD_FAILURES.labels(backend).inc()
+    UPLOAD_LATENCY.labels(backend).observe(seconds)
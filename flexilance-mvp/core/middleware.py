@@ -0,0 +1,231 @@
+"""
+Project middleware.
+"""
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from . import metrics, querystats
+from .instrumentation import RequestTimings, activate, deactivate
+
+
+perf_logger = logging.getLogger('core.perf')
+
+
+class ServerTimingMiddleware:
+    """
+    Record DB, serializer, storage and auth time for sampled requests.
+
+    The breakdown is returned in a ``Server-Timing`` header and logged as a
+    key=value line on the ``core.perf`` logger. ``SERVER_TIMING_SAMPLE_RATE``
+    (0.0-1.0) controls the fraction of requests measured; unsampled requests
+    pay for a single random() call.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.SERVER_TIMING_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = activate(timings)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timings.db_wrapper):
+                response = self.get_response(request)
+        finally:
+            deactivate(token)
+        total = time.perf_counter() - started
+
+        response['Server-Timing'] = timings.server_timing(total)
+
+        if perf_logger.isEnabledFor(logging.INFO):
+            fields = {
+                'method': request.method,
+                'path': request.path,
+                'view': getattr(request.resolver_match, 'view_name', None),
+                'status': response.status_code,
+                **timings.as_dict(total),
+            }
+            perf_logger.info(
+                ' '.join(f'{key}={value}' for key, value in fields.items()),
+                extra={'timings': fields},
+            )
+        return response
+
+
+class _QueryCounter:
+    __slots__ = ('count',)
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Feed per-view latency, status, query and exception counters to core.metrics.
+
+    Views are labelled by URL name rather than path so label cardinality
+    stays bounded; unmatched URLs share the ``<unresolved>`` label.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        view = self._view_name(request)
+        metrics.REQUEST_LATENCY.labels(view, request.method).observe(elapsed)
+        metrics.REQUESTS.labels(view, request.method, response.status_code).inc()
+        if counter.count:
+            metrics.DB_QUERIES.labels(view).inc(counter.count)
+        return response
+
+    def process_exception(self, request, exception):
+        metrics.EXCEPTIONS.labels(self._view_name(request), type(exception).__name__).inc()
+
+    @staticmethod
+    def _view_name(request):
+        match = request.resolver_match
+        if match is None:
+            return '<unresolved>'
+        return match.view_name
+
+
+class QueryStatsMiddleware:
+    """
+    Aggregate SQL by fingerprint and log slow queries with their view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_STATS_ENABLED:
+            return self.get_response(request)
+
+        token = querystats.set_view(None)
+        try:
+            with connection.execute_wrapper(querystats.record_query):
+                response = self.get_response(request)
+        finally:
+            querystats.reset_view(token)
+        querystats.stats.maybe_flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        querystats.set_view(request.resolver_match.view_name)
+
+
+# Content types worth compressing; images, archives and PDFs already are.
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+# Brotli quality for on-the-fly compression: close to gzip's speed at a
+# better ratio. Static assets are precompressed at maximum quality instead.
+BROTLI_QUALITY = 4
+
+
+def accepted_encoding(header):
+    """
+    Pick the response encoding from an Accept-Encoding header.
+
+    Args:
+        header: Raw Accept-Encoding value
+
+    Returns:
+        str or None: 'br', 'gzip' or None when neither is acceptable.
+        Brotli wins ties when it is installed.
+    """
+    weights = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+
+    wildcard = weights.get('*', 0.0)
+    candidates = ('br', 'gzip') if brotli is not None else ('gzip',)
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compress text and JSON responses with brotli or gzip.
+
+    Only buffered responses of at least ``COMPRESSION_MIN_SIZE`` bytes are
+    compressed; streamed responses (media files, static assets) are left to
+    sendfile and WhiteNoise's precompressed variants. Pages that embed a
+    CSRF token are skipped so the token cannot be recovered by BREACH-style
+    length probing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+
+        content_type = response.get('Content-Type', '').split(';', 1)[0].strip().lower()
+        if not (content_type.startswith('text/') or content_type in COMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        if 'CSRF_COOKIE_NEEDS_UPDATE' in request.META:
+            return response
+
+        encoding = accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding == 'br':
+            compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        elif encoding == 'gzip':
+            compressed = compress_string(response.content)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-19 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_job_attachment_alter_profile_profile_picture_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='attachment',
+            field=models.FileField(blank=True, db_index=True, null=True, upload_to='jobs/'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='profile_picture',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='profiles/'),
+        ),
+        migrations.AlterField(
+            model_name='proposal',
+            name='proposal_attachment',
+            field=models.FileField(blank=True, db_index=True, null=True, upload_to='proposals/'),
+        ),
+    ]
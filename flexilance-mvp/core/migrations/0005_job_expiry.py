@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-19 13:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_index_file_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskLock',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('locked_until', models.DateTimeField()),
+                ('owner', models.CharField(blank=True, max_length=100)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['is_active', 'deadline'], name='core_job_active_deadline_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.14 on 2026-10-19 13:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_job_expiry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedJob',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('budget', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('skills_required', models.TextField(blank=True)),
+                ('deadline', models.DateTimeField(blank=True, null=True)),
+                ('attachment', models.FileField(blank=True, db_index=True, null=True, upload_to='jobs/')),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('is_active', models.BooleanField(default=False)),
+                ('archived_at', models.DateTimeField()),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedProposal',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('cover_letter', models.TextField()),
+                ('bid_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('delivery_time', models.IntegerField(help_text='Estimated delivery time in days')),
+                ('proposal_attachment', models.FileField(blank=True, db_index=True, null=True, upload_to='proposals/')),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('status', models.CharField(max_length=20)),
+                ('archived_at', models.DateTimeField()),
+                ('freelancer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_proposals', to=settings.AUTH_USER_MODEL)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proposals', to='core.archivedjob')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-19 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='title',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-19 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_confirmed_uploads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'created_at'], name='core_payment_status_idx'),
+        ),
+    ]
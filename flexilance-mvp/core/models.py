@@ -1,14 +1,20 @@
-from django.db import models
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
 
+from .storage_utils import delete_file
+
 
 class Profile(models.Model):
     """Extended user profile for freelancer/client roles"""
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     is_freelancer = models.BooleanField(default=False)
-    profile_picture = models.ImageField(upload_to='profiles/', null=True, blank=True)
+    profile_picture = models.ImageField(upload_to='profiles/', null=True, blank=True, db_index=True)
     skills = models.TextField(blank=True)
     bio = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -20,19 +26,24 @@ class Profile(models.Model):
 
 class Job(models.Model):
     """Job posting model for clients"""
-    title = models.CharField(max_length=200)
+    # Indexed for the admin's prefix search
+    title = models.CharField(max_length=200, db_index=True)
     description = models.TextField()
     budget = models.DecimalField(max_digits=10, decimal_places=2)
     client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posted_jobs')
     skills_required = models.TextField(blank=True)
     deadline = models.DateTimeField(null=True, blank=True)
-    attachment = models.FileField(upload_to='jobs/', null=True, blank=True)
+    attachment = models.FileField(upload_to='jobs/', null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Expiry sweep: active jobs whose deadline has passed
+            models.Index(fields=['is_active', 'deadline'], name='core_job_active_deadline_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.client.username}"
@@ -45,7 +56,7 @@ class Proposal(models.Model):
     cover_letter = models.TextField()
     bid_amount = models.DecimalField(max_digits=10, decimal_places=2)
     delivery_time = models.IntegerField(help_text="Estimated delivery time in days")
-    proposal_attachment = models.FileField(upload_to='proposals/', null=True, blank=True)
+    proposal_attachment = models.FileField(upload_to='proposals/', null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(
@@ -66,6 +77,311 @@ class Proposal(models.Model):
         return f"Proposal by {self.freelancer.username} for {self.job.title}"
 
 
+class ArchivedJob(models.Model):
+    """Closed job moved out of the live table by `manage.py archive_jobs`"""
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    budget = models.DecimalField(max_digits=10, decimal_places=2)
+    client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_jobs')
+    skills_required = models.TextField(blank=True)
+    deadline = models.DateTimeField(null=True, blank=True)
+    attachment = models.FileField(upload_to='jobs/', null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    is_active = models.BooleanField(default=False)
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.title} - {self.client.username} (archived)"
+
+
+class ArchivedProposal(models.Model):
+    """Proposal archived together with its job"""
+    id = models.BigIntegerField(primary_key=True)
+    job = models.ForeignKey(ArchivedJob, on_delete=models.CASCADE, related_name='proposals')
+    freelancer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_proposals')
+    cover_letter = models.TextField()
+    bid_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    delivery_time = models.IntegerField(help_text="Estimated delivery time in days")
+    proposal_attachment = models.FileField(upload_to='proposals/', null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    status = models.CharField(max_length=20)
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Proposal by {self.freelancer.username} for {self.job.title} (archived)"
+
+
+class OutboxEvent(models.Model):
+    """Domain event written in the same transaction as the change it describes"""
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk}"
+
+
+class Notification(models.Model):
+    """In-app notification; bursts of similar events share one row"""
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=50)
+    group_key = models.CharField(max_length=100)
+    message = models.CharField(max_length=255)
+    data = models.JSONField(default=dict)
+    count = models.PositiveIntegerField(default=1)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['recipient', '-id'], name='core_notif_recipient_id_idx'),
+            models.Index(fields=['recipient', 'group_key'], name='core_notif_recipient_group_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient.username}: {self.message}"
+
+
+class NotificationCounter(models.Model):
+    """Unread notification count per user, kept in step with Notification"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.unread} unread"
+
+
+class Thread(models.Model):
+    """
+    Conversation between a job's client and a freelancer about one proposal
+
+    ``last_seq`` numbers the thread's messages; each participant's read
+    cursor is the last seq they have seen, so their unread count is
+    ``last_seq - <role>_read_seq`` without counting messages.
+    """
+    # No database constraint: archived proposals keep their id in the archive tables
+    proposal = models.OneToOneField(
+        Proposal, on_delete=models.DO_NOTHING, db_constraint=False, related_name='thread',
+    )
+    subject = models.CharField(max_length=200)
+    client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='client_threads')
+    freelancer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='freelancer_threads')
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_seq = models.PositiveIntegerField(default=0)
+    client_read_seq = models.PositiveIntegerField(default=0)
+    freelancer_read_seq = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-last_message_at', '-id']
+        indexes = [
+            models.Index(fields=['client', '-last_message_at'], name='core_thread_client_recent_idx'),
+            models.Index(fields=['freelancer', '-last_message_at'], name='core_thread_free_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject}: {self.client.username} / {self.freelancer.username}"
+
+    def role(self, user):
+        """'client', 'freelancer', or None if ``user`` is not a participant"""
+        if user.pk == self.client_id:
+            return 'client'
+        if user.pk == self.freelancer_id:
+            return 'freelancer'
+        return None
+
+
+class Message(models.Model):
+    """Message in a thread; rows are only ever appended"""
+    # Covered by the (thread, id) index
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='messages', db_index=False)
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
+    seq = models.PositiveIntegerField()
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['thread', 'id'], name='core_message_thread_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sender.username} in thread {self.thread_id}: {self.body[:50]}"
+
+
+class FinancialTotals(models.Model):
+    """
+    Running escrow totals, updated in the same transaction as each payment
+
+    ``escrowed`` is everything paid into escrow; ``released`` and
+    ``refunded`` are what left it, so ``held`` is still in escrow.
+    """
+    escrowed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    released = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refunded = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def held(self):
+        return self.escrowed - self.released - self.refunded
+
+
+class Contract(FinancialTotals):
+    """Agreement created from an accepted proposal, paid milestone by milestone"""
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('completed', 'Completed'),
+    ]
+
+    # No database constraint: archived proposals keep their id in the archive tables
+    proposal = models.OneToOneField(
+        Proposal, on_delete=models.DO_NOTHING, db_constraint=False, related_name='contract',
+    )
+    title = models.CharField(max_length=200)
+    client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='client_contracts')
+    freelancer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='freelancer_contracts')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"{self.title}: {self.client.username} / {self.freelancer.username}"
+
+
+class Milestone(models.Model):
+    """Deliverable of a contract with the amount paid for it"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('funded', 'Funded'),
+        ('released', 'Released'),
+        ('refunded', 'Refunded'),
+    ]
+
+    contract = models.ForeignKey(Contract, on_delete=models.CASCADE, related_name='milestones')
+    title = models.CharField(max_length=200)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    due_date = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['contract', 'position', 'id']
+
+    def __str__(self):
+        return f"{self.title} ({self.amount}, {self.status})"
+
+
+class Payment(models.Model):
+    """Ledger entry for money moving into or out of escrow"""
+    KIND_CHOICES = [
+        ('escrow', 'Escrow'),
+        ('release', 'Release'),
+        ('refund', 'Refund'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    contract = models.ForeignKey(Contract, on_delete=models.CASCADE, related_name='payments')
+    milestone = models.ForeignKey(Milestone, on_delete=models.CASCADE, related_name='payments')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    reference = models.CharField(max_length=100, unique=True)
+    gateway_reference = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='core_payment_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.amount} ({self.status}) for {self.milestone}"
+
+
+class UserFinancialTotals(FinancialTotals):
+    """A user's escrow totals in one role, across all their contracts"""
+    ROLE_CHOICES = [
+        ('client', 'Client'),
+        ('freelancer', 'Freelancer'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='financial_totals')
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'role'], name='core_user_totals_user_role_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} as {self.role}: {self.held} held"
+
+
+class IdempotencyKey(models.Model):
+    """First response to a request sent with an Idempotency-Key, replayed on retries"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    # Method and path the key was first used for
+    fingerprint = models.CharField(max_length=255)
+    # Null while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    # When the key was claimed; an unfinished claim is abandoned after IDEMPOTENCY_CLAIM_TIMEOUT
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='core_idempotency_user_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.key}"
+
+
+class ConfirmedUpload(models.Model):
+    """Storage name attached through an upload ticket; each ticket is confirmed once"""
+    name = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='confirmed_uploads')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.name}"
+
+
+class TaskLock(models.Model):
+    """Lease row that lets one process at a time run a periodic task"""
+    name = models.CharField(max_length=100, primary_key=True)
+    locked_until = models.DateTimeField()
+    owner = models.CharField(max_length=100, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} until {self.locked_until}"
+
+
 # Signal to automatically create profile when user is created
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -76,3 +392,62 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
+
+
+# Stored files are removed once the row that owns them is deleted or points
+# at a new file. Deletes run after commit so a rollback never loses a file;
+# anything missed (crashes, bulk SQL) is collected by `manage.py gc_media`.
+_keep_stored_files = ContextVar('keep_stored_files', default=False)
+
+
+@contextmanager
+def keep_stored_files():
+    """Delete rows inside this block without deleting their stored files"""
+    token = _keep_stored_files.set(True)
+    try:
+        yield
+    finally:
+        _keep_stored_files.reset(token)
+
+
+def stored_file_names(instance):
+    """Map each loaded file field of an instance to its stored name"""
+    names = {}
+    for field in instance._meta.concrete_fields:
+        if isinstance(field, models.FileField) and field.attname in instance.__dict__:
+            value = instance.__dict__[field.attname]
+            names[field.attname] = getattr(value, 'name', value) or None
+    return names
+
+
+def delete_files_on_commit(names):
+    for name in names:
+        if name:
+            transaction.on_commit(lambda name=name: delete_file(name))
+
+
+def remember_stored_files(sender, instance, **kwargs):
+    instance._stored_files = stored_file_names(instance)
+
+
+def delete_replaced_files(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_stored_files', {})
+    current = stored_file_names(instance)
+    if not created and not raw:
+        delete_files_on_commit(
+            name for attname, name in previous.items()
+            if attname in current and current[attname] != name
+        )
+    instance._stored_files = current
+
+
+def delete_owned_files(sender, instance, **kwargs):
+    if _keep_stored_files.get():
+        return
+    delete_files_on_commit(stored_file_names(instance).values())
+
+
+for model in (Profile, Job, Proposal, ArchivedJob, ArchivedProposal):
+    post_init.connect(remember_stored_files, sender=model, dispatch_uid=f'remember_files_{model.__name__}')
+    post_save.connect(delete_replaced_files, sender=model, dispatch_uid=f'replace_files_{model.__name__}')
+    post_delete.connect(delete_owned_files, sender=model, dispatch_uid=f'delete_files_{model.__name__}')
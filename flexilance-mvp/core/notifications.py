@@ -0,0 +1,229 @@
+"""
+Transactional outbox and batched notification delivery.
+
+Views record what happened with ``emit()`` inside the transaction that
+makes the change, so an event exists if and only if the change committed.
+``deliver_pending()`` (run by the scheduler every
+``NOTIFICATION_DELIVERY_INTERVAL`` seconds, or by ``manage.py
+deliver_notifications``) turns outbox rows into notifications a batch at
+a time:
+
+* events in a batch that target the same recipient and group (e.g. new
+  proposals on one job) become one notification with a count;
+* an unread notification for the same group from the last
+  ``NOTIFICATION_COALESCE_WINDOW`` seconds is folded into the new one, so
+  a burst shows up as "5 new proposals" rather than five rows;
+* unread counts are kept in ``NotificationCounter`` with one ``UPDATE``
+  per batch, so clients never need a ``COUNT(*)``.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Notification, NotificationCounter, OutboxEvent
+
+
+logger = logging.getLogger('core.notifications')
+
+# Longest list kept in merged notification data
+MAX_MERGED_ITEMS = 50
+
+
+@dataclass
+class NotificationKind:
+    """
+    How outbox events of one kind become notifications.
+
+    Attributes:
+        recipients: Callable taking an event payload and returning
+            ``(recipient_id, group_key, data)`` for each user to notify
+        describe: Callable taking ``(count, data)`` and returning the message
+    """
+    recipients: object
+    describe: object
+
+
+KINDS = {}
+
+
+def emit(kind, **payload):
+    """
+    Record an event in the outbox.
+
+    Call inside the transaction that makes the change; the event is
+    delivered only if it commits.
+    """
+    return OutboxEvent.objects.create(kind=kind, payload=payload)
+
+
+def merge_data(old, new):
+    """
+    Combine notification data: lists are concatenated, other keys take the newer value.
+    """
+    merged = dict(old)
+    for key, value in new.items():
+        if isinstance(value, list) and isinstance(old.get(key), list):
+            merged[key] = (old[key] + value)[-MAX_MERGED_ITEMS:]
+        else:
+            merged[key] = value
+    return merged
+
+
+def _group(events):
+    groups = {}
+    for event in events:
+        kind = KINDS.get(event.kind)
+        if kind is None:
+            logger.warning('No notification kind for outbox event %s #%s', event.kind, event.pk)
+            continue
+        for recipient_id, group_key, data in kind.recipients(event.payload):
+            key = (recipient_id, event.kind, group_key)
+            if key in groups:
+                count, previous = groups[key]
+                groups[key] = (count + 1, merge_data(previous, data))
+            else:
+                groups[key] = (1, data)
+    return groups
+
+
+def _deliver(events, now):
+    groups = _group(events)
+    if not groups:
+        return 0
+
+    # Fold recent unread notifications for the same groups into the new rows
+    cutoff = now - timedelta(seconds=settings.NOTIFICATION_COALESCE_WINDOW)
+    recent = Notification.objects.select_for_update().filter(
+        recipient_id__in={recipient for recipient, _, _ in groups},
+        group_key__in={group_key for _, _, group_key in groups},
+        is_read=False,
+        created_at__gte=cutoff,
+    ).order_by('id')
+    superseded = {}
+    for old in recent:
+        key = (old.recipient_id, old.kind, old.group_key)
+        if key in groups:
+            count, data = groups[key]
+            groups[key] = (old.count + count, merge_data(old.data, data))
+            superseded[old.id] = old.recipient_id
+    if superseded:
+        Notification.objects.filter(id__in=superseded).delete()
+
+    Notification.objects.bulk_create([
+        Notification(
+            recipient_id=recipient_id, kind=kind, group_key=group_key,
+            message=KINDS[kind].describe(count, data)[:255], data=data, count=count,
+        )
+        for (recipient_id, kind, group_key), (count, data) in groups.items()
+    ])
+
+    deltas = {}
+    for recipient_id, _, _ in groups:
+        deltas[recipient_id] = deltas.get(recipient_id, 0) + 1
+    for recipient_id in superseded.values():
+        deltas[recipient_id] -= 1
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=recipient_id) for recipient_id in deltas], ignore_conflicts=True,
+    )
+    changed = {recipient_id: delta for recipient_id, delta in deltas.items() if delta}
+    if changed:
+        NotificationCounter.objects.filter(user_id__in=changed).update(unread=F('unread') + Case(
+            *[When(user_id=recipient_id, then=Value(delta)) for recipient_id, delta in changed.items()],
+            default=Value(0), output_field=IntegerField(),
+        ))
+    return len(groups)
+
+
+def deliver_pending(batch_size=None, now=None):
+    """
+    Turn outbox events into notifications, one transaction per batch.
+
+    Args:
+        batch_size: Events per batch, defaults to NOTIFICATION_BATCH_SIZE
+        now: Reference time for the coalescing window
+
+    Returns:
+        int: Events processed
+    """
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    processed = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size]
+            )
+            if not events:
+                break
+            _deliver(events, now or timezone.now())
+            OutboxEvent.objects.filter(id__in=[event.id for event in events]).delete()
+        processed += len(events)
+        if len(events) < batch_size:
+            break
+    return processed
+
+
+def unread_count(user):
+    """
+    The user's unread notification count, from the counter row.
+    """
+    return NotificationCounter.objects.filter(user=user).values_list('unread', flat=True).first() or 0
+
+
+def mark_read(user, ids=None):
+    """
+    Mark the user's notifications read, all of them or just ``ids``.
+
+    Returns:
+        int: Notifications that changed from unread to read
+    """
+    with transaction.atomic():
+        notifications = Notification.objects.filter(recipient=user, is_read=False)
+        if ids is not None:
+            notifications = notifications.filter(id__in=ids)
+        changed = notifications.update(is_read=True)
+        if changed:
+            NotificationCounter.objects.filter(user=user).update(unread=Greatest(F('unread') - changed, 0))
+    return changed
+
+
+def _proposal_created_recipients(payload):
+    return [(payload['client_id'], f"job:{payload['job_id']}", {
+        'job_id': payload['job_id'],
+        'job_title': payload['job_title'],
+        'proposal_ids': [payload['proposal_id']],
+    })]
+
+
+def _describe_proposal_created(count, data):
+    if count == 1:
+        return f"New proposal for \"{data['job_title']}\""
+    return f"{count} new proposals for \"{data['job_title']}\""
+
+
+KINDS['proposal.created'] = NotificationKind(_proposal_created_recipients, _describe_proposal_created)
+
+
+def _proposals_decided_recipients(payload):
+    for decision, pairs in (('accepted', payload['accepted']), ('rejected', payload['rejected'])):
+        for proposal_id, freelancer_id in pairs:
+            yield freelancer_id, f"job:{payload['job_id']}", {
+                'job_id': payload['job_id'],
+                'job_title': payload['job_title'],
+                'proposal_id': proposal_id,
+                'status': decision,
+            }
+
+
+def _describe_proposals_decided(count, data):
+    if data['status'] == 'accepted':
+        return f"Your proposal for \"{data['job_title']}\" was accepted"
+    return f"Your proposal for \"{data['job_title']}\" was not selected"
+
+
+KINDS['proposals.decided'] = NotificationKind(_proposals_decided_recipients, _describe_proposals_decided)
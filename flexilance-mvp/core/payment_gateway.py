@@ -0,0 +1,127 @@
+"""
+Payment provider interface for escrow.
+
+``core.escrow`` moves money through the gateway named by
+``PAYMENT_GATEWAY``, a dotted path to a ``PaymentGateway`` subclass. A
+gateway makes three calls, each given the pending ``Payment`` row, whose
+``reference`` is unique and can be passed to the provider as an
+idempotency key:
+
+* ``charge``: collect a milestone's amount from the client into escrow;
+* ``transfer``: pay an escrowed amount out to the freelancer;
+* ``refund``: return an escrowed amount to the client.
+
+``lookup`` asks the provider what became of a payment by its
+``reference``, as Paystack's transaction verify does; reconciliation uses
+it for payments left pending when a worker died mid-call.
+
+``FakePaystackGateway`` stands in for Paystack locally and in tests: it
+answers at once, without network access, with Paystack-style references.
+It keeps its records in the process's memory, so ``lookup`` only knows
+calls made by the same process; settings refuse it as an implicit
+default when DEBUG is off.
+"""
+import threading
+import uuid
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+@dataclass
+class GatewayResult:
+    succeeded: bool
+    reference: str = ''
+    message: str = ''
+
+
+class PaymentGateway:
+    """
+    Base class for payment providers.
+    """
+
+    def charge(self, payment, payer):
+        raise NotImplementedError
+
+    def transfer(self, payment, recipient):
+        raise NotImplementedError
+
+    def refund(self, payment, recipient):
+        raise NotImplementedError
+
+    def lookup(self, payment):
+        """
+        Outcome of an earlier call for ``payment``: a succeeded result with
+        the provider's reference, or a failed one if it never went through.
+        """
+        raise NotImplementedError
+
+
+class FakePaystackGateway(PaymentGateway):
+    """
+    In-process Paystack stand-in that records calls and approves them.
+
+    Set ``decline_next`` to make the following calls fail, as a declined
+    card or a failed transfer would.
+    """
+
+    PREFIXES = {'charge': 'T', 'transfer': 'TRF_', 'refund': 'RFD_'}
+
+    def __init__(self):
+        self.calls = []
+        self.completed = {}
+        self.decline_next = 0
+        self._lock = threading.Lock()
+
+    def _call(self, operation, payment, user):
+        with self._lock:
+            self.calls.append((operation, payment.reference, payment.amount, user.pk))
+            if self.decline_next > 0:
+                self.decline_next -= 1
+                return GatewayResult(False, message='Declined')
+            reference = f'{self.PREFIXES[operation]}{uuid.uuid4().hex[:12]}'
+            self.completed[payment.reference] = reference
+        return GatewayResult(True, reference=reference)
+
+    def charge(self, payment, payer):
+        return self._call('charge', payment, payer)
+
+    def transfer(self, payment, recipient):
+        return self._call('transfer', payment, recipient)
+
+    def refund(self, payment, recipient):
+        return self._call('refund', payment, recipient)
+
+    def lookup(self, payment):
+        with self._lock:
+            self.calls.append(('lookup', payment.reference, payment.amount, None))
+            reference = self.completed.get(payment.reference)
+        if reference is None:
+            return GatewayResult(False, message='Transaction not found')
+        return GatewayResult(True, reference=reference)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """
+    The configured PAYMENT_GATEWAY, created on first use.
+    """
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = import_string(settings.PAYMENT_GATEWAY)()
+    return _gateway
+
+
+def reset_gateway():
+    """
+    Drop the gateway; the next call builds one from settings.
+    """
+    global _gateway
+    with _gateway_lock:
+        _gateway = None
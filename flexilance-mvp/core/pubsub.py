@@ -0,0 +1,232 @@
+"""
+Publish/subscribe for real-time events.
+
+Views publish small JSON-safe messages to named channels (``user:<id>``
+for one user, ``jobs`` for new jobs) after their transaction commits.
+Event-stream connections subscribe from the ASGI event loop; each
+subscription is an ``asyncio.Queue`` fed thread-safely, so publishers can
+be sync views running in worker threads.
+
+Backends (``PUBSUB_BACKEND``):
+
+* ``local``: messages reach subscribers in the same process only. Fine
+  for a single ASGI process and for tests.
+* ``postgres``: messages are sent with ``pg_notify`` and every process
+  runs one listener thread on a dedicated connection that fans them out to
+  its local subscribers, so all processes see all messages. Payloads are
+  limited to about 8000 bytes by Postgres.
+"""
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+logger = logging.getLogger('core.pubsub')
+
+# Sentinel put on a subscription's queue when it should end
+CLOSED = object()
+
+PG_CHANNEL = 'flexilance_events'
+
+
+class Subscription:
+    """
+    Messages for one subscriber on one event loop.
+
+    Holds at most ``maxsize`` undelivered messages; a subscriber that falls
+    further behind is closed so it reconnects rather than buffering without
+    bound.
+    """
+
+    def __init__(self, channels, loop, maxsize):
+        self.channels = tuple(channels)
+        self.loop = loop
+        self.maxsize = maxsize
+        self.queue = asyncio.Queue()
+        self.overflowed = False
+
+    def deliver(self, message):
+        """Queue a message; must run on the subscription's loop."""
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= self.maxsize:
+            self.overflowed = True
+            self.queue.put_nowait(CLOSED)
+            return
+        self.queue.put_nowait(message)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, CLOSED)
+
+
+def _deliver_all(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.deliver(message)
+
+
+class LocalBroker:
+    """
+    Fan messages out to subscriptions in this process.
+    """
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels, maxsize=None):
+        """
+        Subscribe the running event loop to ``channels``.
+
+        Returns:
+            Subscription: Await ``subscription.queue.get()`` for messages
+        """
+        subscription = Subscription(
+            channels, asyncio.get_running_loop(), maxsize or settings.SSE_QUEUE_SIZE,
+        )
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._channels.get(channel, ()))
+            return len({sub for subscribers in self._channels.values() for sub in subscribers})
+
+    def publish(self, channel, message):
+        self.dispatch(channel, message)
+
+    def dispatch(self, channel, message):
+        """
+        Hand a message to this process's subscribers, one loop callback per event loop.
+        """
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        by_loop = {}
+        for subscription in subscribers:
+            by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver_all, subscriptions, message)
+            except RuntimeError:
+                # Loop already closed; its subscriptions are gone with it
+                pass
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Broker that relays messages between processes with LISTEN/NOTIFY.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def publish(self, channel, message):
+        payload = json.dumps({'c': channel, 'm': message}, separators=(',', ':'))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [PG_CHANNEL, payload])
+
+    def subscribe(self, channels, maxsize=None):
+        self._ensure_listener()
+        return super().subscribe(channels, maxsize)
+
+    def _ensure_listener(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='core-pubsub', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        import psycopg2
+
+        delay = 1.0
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**connection.get_connection_params())
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN {PG_CHANNEL}')
+                delay = 1.0
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            data = json.loads(notify.payload)
+                        except ValueError:
+                            continue
+                        self.dispatch(data['c'], data['m'])
+            except Exception:
+                logger.exception('Pub/sub listener failed; reconnecting in %.0fs', delay)
+                if conn is not None:
+                    conn.close()
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+
+_broker = None
+_broker_pid = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    The broker for this process, chosen by PUBSUB_BACKEND.
+    """
+    global _broker, _broker_pid
+    pid = os.getpid()
+    if _broker_pid != pid:
+        with _broker_lock:
+            if _broker_pid != pid:
+                _broker = PostgresBroker() if settings.PUBSUB_BACKEND == 'postgres' else LocalBroker()
+                _broker_pid = pid
+    return _broker
+
+
+def reset_broker():
+    """
+    Drop this process's broker; the next call builds one from settings.
+    """
+    global _broker, _broker_pid
+    with _broker_lock:
+        _broker = None
+        _broker_pid = None
+
+
+def publish_on_commit(channel, event, data):
+    """
+    Publish ``{'event': event, 'data': data}`` once the current transaction
+    commits (at once outside one).
+    """
+    message = {'event': event, 'data': data}
+    transaction.on_commit(lambda: _publish(channel, message))
+
+
+def _publish(channel, message):
+    try:
+        get_broker().publish(channel, message)
+    except Exception:
+        # Real-time delivery is best effort; the write already committed
+        logger.exception('Could not publish to %s', channel)
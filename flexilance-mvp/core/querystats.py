@@ -0,0 +1,197 @@
+"""
+Query fingerprint aggregation and slow-query logging.
+
+``QueryStatsMiddleware`` wraps every request's SQL with ``record_query``,
+which normalizes the statement into a fingerprint (literals and
+placeholders become ``?``, IN lists collapse) and accumulates count, total
+and max time per fingerprint in process memory. Fingerprints are cached per
+raw SQL string, and Django emits parameterized SQL, so the regex work runs
+once per distinct statement rather than once per query.
+
+Each process periodically writes a JSON snapshot to ``QUERY_STATS_DIR``;
+``manage.py query_report`` merges the snapshots into a top-N report.
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+
+
+logger = logging.getLogger('core.slowquery')
+
+_current_view = ContextVar('query_stats_view', default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALUES_LIST = re.compile(r'(?:\(\?(?:, \?)*\)(?:, )?){2,}')
+_WHITESPACE = re.compile(r'\s+')
+
+MAX_VIEWS_PER_FINGERPRINT = 10
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    Normalize a SQL statement so queries differing only in values match.
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _IN_LIST.sub('(...)', sql)
+    sql = _VALUES_LIST.sub('(...)', sql)
+    return sql
+
+
+def fingerprint_id(fp):
+    """
+    Short stable identifier for a fingerprint, for logs and reports.
+    """
+    return hashlib.md5(fp.encode('utf-8')).hexdigest()[:12]
+
+
+class QueryStats:
+    """
+    Per-fingerprint aggregates for one process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, sql, seconds, view=None):
+        fp = fingerprint(sql)
+        with self._lock:
+            entry = self._stats.get(fp)
+            if entry is None:
+                entry = self._stats[fp] = {'count': 0, 'total': 0.0, 'max': 0.0, 'views': {}}
+            entry['count'] += 1
+            entry['total'] += seconds
+            if seconds > entry['max']:
+                entry['max'] = seconds
+            views = entry['views']
+            if view in views or len(views) < MAX_VIEWS_PER_FINGERPRINT:
+                views[view] = views.get(view, 0) + 1
+        return fp
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                fp: {**entry, 'views': dict(entry['views'])}
+                for fp, entry in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def maybe_flush(self):
+        """
+        Write this process's snapshot if the flush interval has elapsed.
+        """
+        directory = settings.QUERY_STATS_DIR
+        if not directory:
+            return
+        now = time.monotonic()
+        if now - self._last_flush < settings.QUERY_STATS_FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        self.flush(directory)
+
+    def flush(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'querystats_{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+
+stats = QueryStats()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper feeding the process-wide QueryStats.
+    """
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        view = _current_view.get()
+        fp = stats.record(sql, elapsed, view)
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if threshold is not None and elapsed * 1000 >= threshold:
+            logger.warning(
+                'slow query %.1fms view=%s fingerprint=%s sql=%s',
+                elapsed * 1000, view, fingerprint_id(fp), sql[:1000],
+                extra={'duration_ms': elapsed * 1000, 'view': view, 'fingerprint': fp},
+            )
+
+
+def set_view(view):
+    """
+    Label subsequent queries in this context with ``view``; returns a reset token.
+    """
+    return _current_view.set(view)
+
+
+def reset_view(token):
+    _current_view.reset(token)
+
+
+def load_snapshots(directory):
+    """
+    Merge every process snapshot in ``directory``.
+
+    Returns:
+        dict: Fingerprint to aggregated count, total, max and views
+    """
+    merged = {}
+    for path in glob.glob(os.path.join(directory, 'querystats_*.json')):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        merge(merged, snapshot)
+    return merged
+
+
+def merge(target, snapshot):
+    for fp, entry in snapshot.items():
+        current = target.get(fp)
+        if current is None:
+            target[fp] = {**entry, 'views': dict(entry['views'])}
+            continue
+        current['count'] += entry['count']
+        current['total'] += entry['total']
+        current['max'] = max(current['max'], entry['max'])
+        for view, count in entry['views'].items():
+            current['views'][view] = current['views'].get(view, 0) + count
+    return target
+
+
+def top(aggregates, n=20, sort='total'):
+    """
+    The ``n`` heaviest fingerprints by total, count, max or mean time.
+    """
+    def key(item):
+        entry = item[1]
+        if sort == 'mean':
+            return entry['total'] / entry['count'] if entry['count'] else 0.0
+        return entry[sort]
+
+    return sorted(aggregates.items(), key=key, reverse=True)[:n]
@@ -0,0 +1,46 @@
+"""
+Fast JSON renderer built on orjson, with DRF's JSONRenderer as fallback.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+except ImportError:
+    orjson = None
+    ORJSON_OPTIONS = 0
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Render JSON with orjson, producing the same bytes as JSONRenderer.
+
+    Datetimes, dates, times and dataclasses are passed through to DRF's
+    encoder so their formatting is unchanged (UTC becomes ``Z``); Decimal
+    falls back to the encoder too, UUIDs are native. Indented output,
+    non-compact or ASCII-only settings, and anything orjson rejects (e.g.
+    integers beyond 64 bits) are rendered by the stdlib renderer. Raw
+    floats are the one known difference: orjson writes ``1e16`` where
+    Python writes ``1e+16``; serializers emit decimals as strings, so API
+    payloads are unaffected.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except (orjson.JSONEncodeError, ValueError):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Match JSONRenderer, which escapes these to stay a strict JavaScript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,188 @@
+"""
+Fast read-only list serialization.
+
+``RowSerializer`` renders list pages straight from ``values_list()`` tuples
+instead of model instances. The column list and per-field converters are
+derived once from an existing ``ModelSerializer`` so the output matches it
+exactly: plain values (ids, strings, booleans) are copied through, while
+decimals and datetimes reuse the original DRF field's ``to_representation``.
+Related fields read from joined columns (``client__username``) in the same
+query, so a page costs one SELECT instead of one per row. ``subset()``
+narrows both the output and the SELECT list, so omitted text columns are
+never fetched and omitted related fields drop their JOIN.
+"""
+from functools import lru_cache
+
+from rest_framework import fields as drf_fields
+from rest_framework import relations
+
+from .instrumentation import span
+from .storage_utils import storage_url
+
+
+# Fields whose to_representation is a no-op for the values the DB returns
+_PASSTHROUGH_FIELDS = (drf_fields.CharField, drf_fields.IntegerField, drf_fields.BooleanField)
+
+
+def _is_passthrough(field):
+    for field_class in _PASSTHROUGH_FIELDS:
+        if isinstance(field, field_class):
+            return type(field).to_representation is field_class.to_representation
+    return False
+
+
+class RowSerializer:
+    """
+    Serialize querysets for list endpoints without ModelSerializer overhead.
+
+    Args:
+        serializer_class: ModelSerializer whose read output is reproduced
+        url_fields: SerializerMethodField names that return the URL of a
+            file field, mapped to that file field's name
+    """
+
+    def __init__(self, serializer_class, url_fields=None):
+        self.serializer_class = serializer_class
+        self.url_fields = url_fields or {}
+        self._plan = None
+
+    def _compile(self):
+        serializer = self.serializer_class()
+        model = serializer.Meta.model
+        columns = []
+        plan = []
+
+        def column_index(column):
+            if column not in columns:
+                columns.append(column)
+            return columns.index(column)
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+
+            if name in self.url_fields:
+                model_field = model._meta.get_field(self.url_fields[name])
+                plan.append((name, column_index(model_field.attname), 'url', model_field.storage))
+            elif isinstance(field, drf_fields.SerializerMethodField):
+                raise ValueError(f'{self.serializer_class.__name__}.{name} cannot be read from a values() row')
+            elif isinstance(field, relations.PrimaryKeyRelatedField):
+                attname = model._meta.get_field(field.source).attname
+                plan.append((name, column_index(attname), None, None))
+            elif isinstance(field, drf_fields.FileField):
+                model_field = model._meta.get_field(field.source)
+                plan.append((name, column_index(model_field.attname), 'file', model_field.storage))
+            elif _is_passthrough(field):
+                plan.append((name, column_index(field.source.replace('.', '__')), None, None))
+            else:
+                plan.append((name, column_index(field.source.replace('.', '__')), 'field', field))
+
+        return columns, plan
+
+    @property
+    def columns(self):
+        if self._plan is None:
+            self._plan = self._compile()
+        return self._plan[0]
+
+    @property
+    def field_names(self):
+        if self._plan is None:
+            self._plan = self._compile()
+        return [name for name, _, _, _ in self._plan[1]]
+
+    def subset(self, fields=None, omit=()):
+        """
+        Restrict output to some of the fields.
+
+        Args:
+            fields: Field names to keep, or None for all of them
+            omit: Field names to drop
+
+        Returns:
+            RowSerializer: Serializer that selects only the columns the
+            remaining fields read
+
+        Raises:
+            ValueError: If a requested field does not exist
+        """
+        names = self.field_names
+        unknown = sorted(set(fields or ()).union(omit) - set(names))
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+        keep = set(names if fields is None else fields).difference(omit)
+        return self._subset(tuple(name for name in names if name in keep))
+
+    @lru_cache(maxsize=64)
+    def _subset(self, names):
+        columns = []
+        plan = []
+        for name, index, kind, extra in self._plan[1]:
+            if name not in names:
+                continue
+            column = self._plan[0][index]
+            if column not in columns:
+                columns.append(column)
+            plan.append((name, columns.index(column), kind, extra))
+
+        subset = RowSerializer(self.serializer_class, self.url_fields)
+        subset._plan = (columns, plan)
+        return subset
+
+    def values(self, queryset):
+        """
+        Project a queryset onto the columns this serializer reads.
+        """
+        return queryset.values_list(*self.columns)
+
+    def serialize(self, rows, request=None):
+        """
+        Render rows from ``values()`` as the wrapped serializer would.
+
+        Args:
+            rows: Tuples from ``values()``, e.g. a paginated page
+            request: Current request; file fields become absolute URLs with it,
+                as they do when DRF serializers receive it in their context
+
+        Returns:
+            list: One dict per row
+        """
+        if self._plan is None:
+            self._plan = self._compile()
+        _, plan = self._plan
+
+        converters = []
+        for name, index, kind, extra in plan:
+            if kind is None:
+                converters.append((name, index, None))
+            elif kind == 'field':
+                converters.append((name, index, extra.to_representation))
+            elif kind == 'url':
+                converters.append((name, index, _storage_url(extra, None)))
+            else:
+                converters.append((name, index, _storage_url(extra, request)))
+
+        with span('serialize'):
+            data = []
+            for row in rows:
+                item = {}
+                for name, index, convert in converters:
+                    value = row[index]
+                    if value is None or convert is None:
+                        item[name] = value
+                    else:
+                        item[name] = convert(value)
+                data.append(item)
+        return data
+
+
+def _storage_url(storage, request):
+    def convert(name):
+        if not name:
+            return None
+        with span('storage'):
+            url = storage_url(storage, name)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+    return convert
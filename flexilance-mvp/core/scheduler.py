@@ -0,0 +1,193 @@
+"""
+In-process periodic task scheduler.
+
+Every web worker runs a daemon thread that wakes up every
+``SCHEDULER_TICK`` seconds and runs the registered tasks that are due.
+A task is due when its ``TaskLock`` lease has lapsed: the worker that
+extends the lease with a conditional ``UPDATE`` runs the task, the others
+see zero rows updated and skip it. Each task therefore runs about once per
+interval across all workers and hosts sharing the database, with no
+broker or separate beat process.
+
+Tasks register with the ``periodic`` decorator (see ``core.tasks``) and
+should be idempotent: a run that outlives its interval can overlap the
+next one.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from .metrics import TASK_RUNS
+
+
+logger = logging.getLogger('core.scheduler')
+
+
+@dataclass
+class PeriodicTask:
+    name: str
+    interval: float
+    func: object
+
+
+TASKS = {}
+
+
+def periodic(name, interval):
+    """
+    Register a function to run every ``interval`` seconds.
+
+    Args:
+        name: Unique task name, also the TaskLock primary key
+        interval: Seconds between runs, or a callable returning them so
+            the value can come from settings at run time
+    """
+    def decorator(func):
+        TASKS[name] = PeriodicTask(name, interval, func)
+        return func
+    return decorator
+
+
+def task_owner():
+    return f'{socket.gethostname()}:{os.getpid()}'[:100]
+
+
+def acquire(name, lease, now=None, owner=None):
+    """
+    Take the lease on a task for ``lease`` seconds if it has lapsed.
+
+    Returns:
+        bool: True if this caller holds the lease and should run the task
+    """
+    from .models import TaskLock
+
+    now = now or timezone.now()
+    values = {'locked_until': now + timedelta(seconds=lease), 'owner': owner or task_owner()}
+    if TaskLock.objects.filter(name=name, locked_until__lte=now).update(**values):
+        return True
+    # First run of this task anywhere: create a lapsed row, then race for it
+    TaskLock.objects.bulk_create(
+        [TaskLock(name=name, locked_until=now - timedelta(seconds=1))], ignore_conflicts=True,
+    )
+    return TaskLock.objects.filter(name=name, locked_until__lte=now).update(**values) == 1
+
+
+def run_task(task, now=None):
+    """
+    Run one task if its lease can be taken.
+
+    Returns:
+        bool: True if the task ran (successfully or not)
+    """
+    from .models import TaskLock
+
+    now = now or timezone.now()
+    interval = task.interval() if callable(task.interval) else task.interval
+    if not acquire(task.name, interval, now):
+        return False
+    try:
+        task.func()
+    except Exception:
+        TASK_RUNS.labels(task.name, 'error').inc()
+        logger.exception('Task %s failed', task.name)
+    else:
+        TASK_RUNS.labels(task.name, 'ok').inc()
+    TaskLock.objects.filter(name=task.name).update(last_run_at=timezone.now())
+    return True
+
+
+def run_due(now=None):
+    """
+    Run every registered task whose lease has lapsed.
+
+    Returns:
+        list: Names of the tasks that ran
+    """
+    ran = []
+    for task in list(TASKS.values()):
+        try:
+            if run_task(task, now):
+                ran.append(task.name)
+        except DatabaseError:
+            logger.exception('Could not schedule task %s', task.name)
+    return ran
+
+
+class Scheduler:
+    """
+    Daemon thread calling ``run_due`` every ``tick`` seconds.
+
+    The first tick is delayed by a random fraction of ``tick`` so workers
+    started together do not all contend for the same leases at once.
+    """
+
+    def __init__(self, tick):
+        self.tick = tick
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='core-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        delay = random.uniform(0, self.tick)
+        while not self._stop.wait(delay):
+            try:
+                run_due()
+            except Exception:
+                logger.exception('Scheduler tick failed')
+            finally:
+                # Connections are per thread; do not hold one between ticks
+                connection.close()
+            delay = self.tick
+
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+def start():
+    """
+    Start this process's scheduler thread if enabled; safe to call repeatedly.
+
+    Threads do not survive ``fork()``, so a forked child (e.g. gunicorn
+    ``--preload`` workers) starts its own.
+    """
+    global _scheduler, _scheduler_pid
+    if not settings.SCHEDULER_ENABLED:
+        return None
+    from . import tasks  # noqa: F401  (registers the project's tasks)
+
+    pid = os.getpid()
+    with _scheduler_lock:
+        if _scheduler_pid != pid:
+            _scheduler = Scheduler(settings.SCHEDULER_TICK)
+            _scheduler.start()
+            _scheduler_pid = pid
+    return _scheduler
+
+
+def _restart_after_fork():
+    global _scheduler_lock
+    _scheduler_lock = threading.Lock()
+    if _scheduler_pid is not None:
+        start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
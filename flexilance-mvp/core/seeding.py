@@ -0,0 +1,302 @@
+"""
+Bulk generators for large, realistic marketplace datasets.
+
+Rows are written with ``bulk_create`` in batches, so the per-user
+``post_save`` profile signals never fire; profiles are inserted explicitly.
+Each phase (users, jobs, proposals) is split into independent chunks which
+can run in forked worker processes on backends that allow concurrent
+writers.
+"""
+import multiprocessing
+import os
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import Profile, Job, Proposal
+
+
+# Relative demand for each skill, roughly following marketplace listings
+SKILL_WEIGHTS = {
+    'Python': 14, 'JavaScript': 14, 'React': 12, 'Django': 8, 'Node.js': 8,
+    'TypeScript': 7, 'WordPress': 7, 'Figma': 6, 'Graphic Design': 6, 'SEO': 6,
+    'Copywriting': 6, 'PostgreSQL': 4, 'AWS': 4, 'Flutter': 4, 'Data Entry': 4,
+    'Video Editing': 3, 'Excel': 3, 'Laravel': 3, 'Swift': 2, 'Kotlin': 2,
+    'Machine Learning': 2, 'Translation': 2, 'Shopify': 2, 'Rust': 1,
+}
+SKILLS = list(SKILL_WEIGHTS)
+
+JOB_TITLES = [
+    '{skill} developer needed', 'Build a {skill} MVP', 'Fix bugs in {skill} project',
+    'Long-term {skill} contractor', '{skill} expert for quick task', 'Migrate app to {skill}',
+]
+DELIVERY_DAYS = [1, 3, 5, 7, 10, 14, 21, 30, 45, 60, 90]
+DELIVERY_WEIGHTS = [2, 8, 10, 16, 10, 18, 10, 14, 5, 5, 2]
+
+DEFAULT_PASSWORD = 'seeded-password'
+
+_CUMULATIVE_SKILL_WEIGHTS = None
+
+
+def pick_skills(rng, count):
+    """
+    Weighted sample of distinct skills, joined the way users type them.
+    """
+    global _CUMULATIVE_SKILL_WEIGHTS
+    if _CUMULATIVE_SKILL_WEIGHTS is None:
+        total = 0
+        _CUMULATIVE_SKILL_WEIGHTS = []
+        for weight in SKILL_WEIGHTS.values():
+            total += weight
+            _CUMULATIVE_SKILL_WEIGHTS.append(total)
+
+    chosen = []
+    while len(chosen) < count:
+        skill = rng.choices(SKILLS, cum_weights=_CUMULATIVE_SKILL_WEIGHTS)[0]
+        if skill not in chosen:
+            chosen.append(skill)
+    return ', '.join(chosen)
+
+
+def pick_budget(rng):
+    """
+    Log-normal job budget (median around 500), rounded like real postings.
+    """
+    value = min(max(rng.lognormvariate(6.2, 1.0), 20), 50000)
+    step = 5 if value < 200 else 50 if value < 5000 else 500
+    return Decimal(int(value // step * step) or step)
+
+
+def pick_bid(rng, budget):
+    """
+    Bids cluster a little under the budget with a long tail either side.
+    """
+    ratio = min(max(rng.gauss(0.9, 0.15), 0.4), 1.5)
+    return (budget * Decimal(str(round(ratio, 3)))).quantize(Decimal('0.01'))
+
+
+def split_range(total, chunk_size):
+    """
+    Split ``range(total)`` into ``(start, stop)`` chunks.
+    """
+    return [(start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+
+
+def supports_parallel_writes(using=DEFAULT_DB_ALIAS):
+    """
+    Whether forked workers can write to the database at the same time.
+    """
+    return connections[using].vendor != 'sqlite'
+
+
+class MarketplaceSeeder:
+    """
+    Generate users, profiles, jobs and proposals in bulk.
+
+    Args:
+        users: Total users to create
+        freelancer_ratio: Fraction of users that are freelancers
+        jobs: Total jobs to create
+        proposals: Total proposals to create, spread with a heavy tail
+        prefix: Username prefix, also used to find the seeded rows again
+        batch_size: Rows per INSERT
+        workers: Worker processes per phase; 1 runs everything in-process
+        seed: Random seed so runs are repeatable
+        using: Database alias
+    """
+
+    def __init__(self, users, jobs, proposals, freelancer_ratio=0.7, prefix='seed',
+                 batch_size=5000, workers=1, seed=0, using=DEFAULT_DB_ALIAS, progress=None):
+        self.users = users
+        self.freelancers = int(users * freelancer_ratio)
+        self.jobs = jobs
+        self.proposals = proposals
+        self.proposals_per_job = proposals / max(1, jobs)
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.workers = workers
+        self.seed = seed
+        self.using = using
+        self.progress = progress or (lambda phase, done, total: None)
+        self.password = make_password(DEFAULT_PASSWORD)
+        self.now = timezone.now()
+        self.client_ids = []
+        self.freelancer_ids = []
+
+    def run(self):
+        """
+        Seed every phase and return the number of rows created per model.
+        """
+        created = {}
+        created['users'] = self._run_phase('users', self.seed_users, split_range(self.users, self.batch_size))
+        self.load_user_ids()
+        if self.jobs and not self.client_ids:
+            raise ValueError('Cannot seed jobs without any client users')
+        created['jobs'] = self._run_phase('jobs', self.seed_jobs, split_range(self.jobs, self.batch_size))
+
+        job_bounds = Job.objects.using(self.using).filter(
+            client__username__startswith=self.prefix
+        ).values_list('id', flat=True)
+        first_job = job_bounds.order_by('id').first()
+        last_job = job_bounds.order_by('-id').first()
+        if self.proposals and first_job is not None:
+            if not self.freelancer_ids:
+                raise ValueError('Cannot seed proposals without any freelancer users')
+            chunks = [
+                (first_job + start, first_job + stop)
+                for start, stop in split_range(last_job - first_job + 1, max(1, self.batch_size // 4))
+            ]
+            created['proposals'] = self._run_phase('proposals', self.seed_proposals, chunks)
+        else:
+            created['proposals'] = 0
+        created['profiles'] = created['users']
+        return created
+
+    def _run_phase(self, phase, func, chunks):
+        total = 0
+        self.progress(phase, 0, len(chunks))
+        if self.workers <= 1 or len(chunks) <= 1:
+            for index, chunk in enumerate(chunks, 1):
+                total += func(*chunk)
+                self.progress(phase, index, len(chunks))
+            return total
+
+        # Forked children inherit this seeder (and its id lists) without
+        # pickling; they must open their own database connections.
+        connections.close_all()
+        global _ACTIVE_SEEDER
+        _ACTIVE_SEEDER = self
+        context = multiprocessing.get_context('fork')
+        with context.Pool(self.workers) as pool:
+            for index, count in enumerate(pool.imap_unordered(_run_chunk, [(func.__name__, chunk) for chunk in chunks]), 1):
+                total += count
+                self.progress(phase, index, len(chunks))
+        _ACTIVE_SEEDER = None
+        return total
+
+    def load_user_ids(self):
+        """
+        Collect ids of seeded clients and freelancers for the later phases.
+        """
+        profiles = Profile.objects.using(self.using).filter(user__username__startswith=self.prefix)
+        self.freelancer_ids = list(profiles.filter(is_freelancer=True).values_list('user_id', flat=True))
+        self.client_ids = list(profiles.filter(is_freelancer=False).values_list('user_id', flat=True))
+
+    def _rng(self, phase, start):
+        return random.Random(f'{self.seed}:{phase}:{start}')
+
+    def seed_users(self, start, stop):
+        """
+        Insert users ``start``..``stop`` and their profiles.
+        """
+        rng = self._rng('users', start)
+        with transaction.atomic(using=self.using):
+            users = User.objects.using(self.using).bulk_create([
+                User(
+                    username=f'{self.prefix}{i}',
+                    email=f'{self.prefix}{i}@example.com',
+                    password=self.password,
+                    date_joined=self.now,
+                )
+                for i in range(start, stop)
+            ])
+            if users and users[0].pk is None:
+                users = list(User.objects.using(self.using).filter(
+                    username__in=[user.username for user in users]
+                ))
+
+            profiles = []
+            for user in users:
+                index = int(user.username[len(self.prefix):])
+                is_freelancer = index < self.freelancers
+                profiles.append(Profile(
+                    user_id=user.pk,
+                    is_freelancer=is_freelancer,
+                    skills=pick_skills(rng, rng.randint(2, 6)) if is_freelancer else '',
+                    bio=f'{rng.randint(1, 15)} years of experience' if is_freelancer else '',
+                ))
+            Profile.objects.using(self.using).bulk_create(profiles)
+        return len(users)
+
+    def seed_jobs(self, start, stop):
+        """
+        Insert jobs ``start``..``stop``; a minority of clients post most jobs.
+        """
+        rng = self._rng('jobs', start)
+        clients = self.client_ids
+        jobs = []
+        for _ in range(start, stop):
+            skills = pick_skills(rng, rng.randint(1, 4))
+            deadline = None
+            if rng.random() < 0.6:
+                deadline = self.now + timedelta(days=rng.randint(-90, 120))
+            jobs.append(Job(
+                title=rng.choice(JOB_TITLES).format(skill=skills.split(', ')[0]),
+                description=' '.join(rng.choices(SKILLS, k=rng.randint(20, 120))),
+                budget=pick_budget(rng),
+                client_id=clients[int(len(clients) * rng.betavariate(0.6, 2.0))],
+                skills_required=skills,
+                deadline=deadline,
+                is_active=rng.random() < 0.8,
+            ))
+        with transaction.atomic(using=self.using):
+            Job.objects.using(self.using).bulk_create(jobs)
+        return len(jobs)
+
+    def seed_proposals(self, first_id, stop_id):
+        """
+        Insert proposals for seeded jobs with ids in ``first_id``..``stop_id``.
+
+        Proposal counts per job follow a Pareto tail so a few jobs attract
+        hundreds of bids while most get a handful.
+        """
+        rng = self._rng('proposals', first_id)
+        jobs = list(Job.objects.using(self.using).filter(
+            id__gte=first_id, id__lt=stop_id, client__username__startswith=self.prefix,
+        ).values_list('id', 'budget'))
+        if not jobs:
+            return 0
+
+        weights = [rng.paretovariate(2.0) for _ in jobs]
+        scale = self.proposals_per_job * len(jobs) / sum(weights)
+        freelancers = self.freelancer_ids
+        proposals = []
+        for (job_id, budget), weight in zip(jobs, weights):
+            count = min(int(weight * scale + rng.random()), len(freelancers))
+            for freelancer_id in rng.sample(freelancers, count):
+                proposals.append(Proposal(
+                    job_id=job_id,
+                    freelancer_id=freelancer_id,
+                    cover_letter=f'I have delivered {rng.randint(1, 200)} similar projects. ' * rng.randint(2, 10),
+                    bid_amount=pick_bid(rng, budget),
+                    delivery_time=rng.choices(DELIVERY_DAYS, weights=DELIVERY_WEIGHTS)[0],
+                    status='pending',
+                ))
+        with transaction.atomic(using=self.using):
+            Proposal.objects.using(self.using).bulk_create(proposals, batch_size=self.batch_size)
+        return len(proposals)
+
+
+_ACTIVE_SEEDER = None
+
+
+def _run_chunk(args):
+    name, chunk = args
+    try:
+        return getattr(_ACTIVE_SEEDER, name)(*chunk)
+    finally:
+        connections.close_all()
+
+
+def default_workers(using=DEFAULT_DB_ALIAS):
+    """
+    One worker per CPU when the backend supports concurrent writers.
+    """
+    if not supports_parallel_writes(using):
+        return 1
+    return os.cpu_count() or 1
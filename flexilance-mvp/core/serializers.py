@@ -1,10 +1,80 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Profile, Job, Proposal
-from .storage_utils import upload_file, delete_file, get_file_url
+from django.core.files.uploadedfile import UploadedFile
+from django.db import models
+from .models import Contract, Message, Milestone, Notification, Payment, Profile, Job, Proposal, Thread
+from .instrumentation import span
+from .row_serializers import RowSerializer
+from .storage_utils import ingest_file, field_file_url
 
 
-class UserSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """Report serialization time to the request instrumentation"""
+
+    @property
+    def data(self):
+        with span('serialize'):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """List serializer whose output time is reported as one span"""
+
+
+class StoredFileURLMixin:
+    """Render a stored file as the URL storage_url gives, like the row serializers"""
+
+    def to_representation(self, value):
+        url = field_file_url(value)
+        request = self.context.get('request')
+        if url is not None and request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class StoredFileField(StoredFileURLMixin, serializers.FileField):
+    """FileField whose URL handles local fallback names and signed media paths"""
+
+
+class StoredImageField(StoredFileURLMixin, serializers.ImageField):
+    """ImageField whose URL handles local fallback names and signed media paths"""
+
+
+class AttachmentIngestMixin:
+    """
+    Write each uploaded file exactly once on create and update
+
+    Uploads for the model's file fields are stored through ingest_file and
+    replaced by their stored names before the model is saved, so the
+    field's own pre_save finds nothing left to write. File fields are
+    rendered through storage_url, so their URLs are the signed ones
+    serve_media accepts.
+    """
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.FileField: StoredFileField,
+        models.ImageField: StoredImageField,
+    }
+
+    def _ingest_uploads(self, validated_data):
+        for field in self.Meta.model._meta.fields:
+            if not isinstance(field, models.FileField):
+                continue
+            upload = validated_data.get(field.name)
+            if isinstance(upload, UploadedFile):
+                name = ingest_file(upload, folder=str(field.upload_to).strip('/') or None)
+                if name:
+                    validated_data[field.name] = name
+        return validated_data
+
+    def create(self, validated_data):
+        return super().create(self._ingest_uploads(validated_data))
+
+    def update(self, instance, validated_data):
+        return super().update(instance, self._ingest_uploads(validated_data))
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for User model"""
     profile = serializers.SerializerMethodField()
 
@@ -14,6 +84,7 @@ class UserSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'password': {'write_only': True}
         }
+        list_serializer_class = TimedListSerializer
 
     def get_profile(self, obj):
         """Get profile data for the user"""
@@ -21,7 +92,7 @@ class UserSerializer(serializers.ModelSerializer):
             profile = obj.profile
             return {
                 'is_freelancer': profile.is_freelancer,
-                'profile_picture': profile.profile_picture.url if profile.profile_picture else None,
+                'profile_picture': field_file_url(profile.profile_picture),
                 'skills': profile.skills,
                 'bio': profile.bio
             }
@@ -29,7 +100,7 @@ class UserSerializer(serializers.ModelSerializer):
             return None
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(AttachmentIngestMixin, TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Profile model"""
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.CharField(source='user.email', read_only=True)
@@ -42,33 +113,14 @@ class ProfileSerializer(serializers.ModelSerializer):
             'profile_picture_url', 'skills', 'bio', 'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        list_serializer_class = TimedListSerializer
 
     def get_profile_picture_url(self, obj):
         """Get profile picture URL if exists"""
-        if obj.profile_picture:
-            return obj.profile_picture.url
-        return None
-
-    def update(self, instance, validated_data):
-        """Handle profile picture upload using storage utilities"""
-        profile_picture = validated_data.get('profile_picture')
-        
-        if profile_picture:
-            # Upload the file using storage utilities
-            upload_result = upload_file(profile_picture, folder='profiles')
-            
-            if upload_result['success']:
-                # For local storage, the file is automatically saved
-                # For Cloudinary, we need to update the filename
-                if upload_result['storage_backend'] == 'cloudinary':
-                    validated_data['profile_picture'].name = upload_result['public_id']
-                else:
-                    validated_data['profile_picture'].name = upload_result['filename']
-        
-        return super().update(instance, validated_data)
+        return field_file_url(obj.profile_picture)
 
 
-class JobSerializer(serializers.ModelSerializer):
+class JobSerializer(AttachmentIngestMixin, TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Job model"""
     client_name = serializers.CharField(source='client.username', read_only=True)
     client_email = serializers.CharField(source='client.email', read_only=True)
@@ -82,51 +134,14 @@ class JobSerializer(serializers.ModelSerializer):
             'attachment_url', 'is_active', 'created_at', 'updated_at'
         ]
         read_only_fields = ['client', 'created_at', 'updated_at']
+        list_serializer_class = TimedListSerializer
 
     def get_attachment_url(self, obj):
         """Get attachment URL if exists"""
-        if obj.attachment:
-            return obj.attachment.url
-        return None
-
-    def create(self, validated_data):
-        """Handle job attachment upload using storage utilities"""
-        attachment = validated_data.get('attachment')
-        
-        if attachment:
-            # Upload the file using storage utilities
-            upload_result = upload_file(attachment, folder='jobs')
-            
-            if upload_result['success']:
-                # For local storage, the file is automatically saved
-                # For Cloudinary, we need to update the filename
-                if upload_result['storage_backend'] == 'cloudinary':
-                    validated_data['attachment'].name = upload_result['public_id']
-                else:
-                    validated_data['attachment'].name = upload_result['filename']
-        
-        return super().create(validated_data)
+        return field_file_url(obj.attachment)
 
-    def update(self, instance, validated_data):
-        """Handle job attachment upload using storage utilities"""
-        attachment = validated_data.get('attachment')
-        
-        if attachment:
-            # Upload the file using storage utilities
-            upload_result = upload_file(attachment, folder='jobs')
-            
-            if upload_result['success']:
-                # For local storage, the file is automatically saved
-                # For Cloudinary, we need to update the filename
-                if upload_result['storage_backend'] == 'cloudinary':
-                    validated_data['attachment'].name = upload_result['public_id']
-                else:
-                    validated_data['attachment'].name = upload_result['filename']
-        
-        return super().update(instance, validated_data)
 
-
-class ProposalSerializer(serializers.ModelSerializer):
+class ProposalSerializer(AttachmentIngestMixin, TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Proposal model"""
     freelancer_name = serializers.CharField(source='freelancer.username', read_only=True)
     freelancer_email = serializers.CharField(source='freelancer.email', read_only=True)
@@ -143,48 +158,120 @@ class ProposalSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['freelancer', 'status', 'created_at', 'updated_at']
+        list_serializer_class = TimedListSerializer
 
     def get_proposal_attachment_url(self, obj):
         """Get proposal attachment URL if exists"""
-        if obj.proposal_attachment:
-            return obj.proposal_attachment.url
-        return None
+        return field_file_url(obj.proposal_attachment)
 
-    def create(self, validated_data):
-        """Handle proposal attachment upload using storage utilities"""
-        proposal_attachment = validated_data.get('proposal_attachment')
-        
-        if proposal_attachment:
-            # Upload the file using storage utilities
-            upload_result = upload_file(proposal_attachment, folder='proposals')
-            
-            if upload_result['success']:
-                # For local storage, the file is automatically saved
-                # For Cloudinary, we need to update the filename
-                if upload_result['storage_backend'] == 'cloudinary':
-                    validated_data['proposal_attachment'].name = upload_result['public_id']
-                else:
-                    validated_data['proposal_attachment'].name = upload_result['filename']
-        
-        return super().create(validated_data)
 
-    def update(self, instance, validated_data):
-        """Handle proposal attachment upload using storage utilities"""
-        proposal_attachment = validated_data.get('proposal_attachment')
-        
-        if proposal_attachment:
-            # Upload the file using storage utilities
-            upload_result = upload_file(proposal_attachment, folder='proposals')
-            
-            if upload_result['success']:
-                # For local storage, the file is automatically saved
-                # For Cloudinary, we need to update the filename
-                if upload_result['storage_backend'] == 'cloudinary':
-                    validated_data['proposal_attachment'].name = upload_result['public_id']
-                else:
-                    validated_data['proposal_attachment'].name = upload_result['filename']
-        
-        return super().update(instance, validated_data)
+# Read-only fast paths for list endpoints; output matches the serializers above
+JOB_ROW_SERIALIZER = RowSerializer(JobSerializer, url_fields={'attachment_url': 'attachment'})
+PROPOSAL_ROW_SERIALIZER = RowSerializer(
+    ProposalSerializer, url_fields={'proposal_attachment_url': 'proposal_attachment'}
+)
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    """Serializer for Notification model"""
+
+    class Meta:
+        model = Notification
+        fields = ['id', 'kind', 'message', 'data', 'count', 'is_read', 'created_at']
+        read_only_fields = fields
+
+
+class ThreadSerializer(serializers.ModelSerializer):
+    """Serializer for Thread model, with the requesting user's unread count"""
+    unread = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Thread
+        fields = ['id', 'proposal', 'subject', 'client', 'freelancer', 'created_at', 'last_message_at', 'unread']
+        read_only_fields = fields
+
+
+class MessageSerializer(serializers.ModelSerializer):
+    """Serializer for Message model"""
+
+    class Meta:
+        model = Message
+        fields = ['id', 'thread', 'sender', 'seq', 'body', 'created_at']
+        read_only_fields = fields
+
+
+class SendMessageSerializer(serializers.Serializer):
+    """Serializer for sending a message to a thread or about a proposal"""
+    thread = serializers.IntegerField(required=False)
+    proposal = serializers.IntegerField(required=False)
+    body = serializers.CharField(max_length=5000)
+
+    def validate(self, data):
+        """Require exactly one of thread and proposal"""
+        if ('thread' in data) == ('proposal' in data):
+            raise serializers.ValidationError("Give either thread or proposal")
+        return data
+
+
+class MilestoneSerializer(serializers.ModelSerializer):
+    """Serializer for Milestone model"""
+
+    class Meta:
+        model = Milestone
+        fields = ['id', 'title', 'amount', 'due_date', 'status', 'position']
+        read_only_fields = ['id', 'status', 'position']
+
+
+class ContractSerializer(serializers.ModelSerializer):
+    """Serializer for Contract model with its milestones and escrow totals"""
+    milestones = MilestoneSerializer(many=True, read_only=True)
+    held = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Contract
+        fields = [
+            'id', 'proposal', 'title', 'client', 'freelancer', 'amount', 'status', 'created_at',
+            'completed_at', 'escrowed', 'released', 'refunded', 'held', 'milestones',
+        ]
+        read_only_fields = fields
+
+
+class ContractCreateSerializer(serializers.Serializer):
+    """Serializer for creating a contract from an accepted proposal"""
+    proposal = serializers.IntegerField()
+    milestones = MilestoneSerializer(many=True, required=False)
+
+    def validate_milestones(self, value):
+        """Require positive amounts"""
+        if any(milestone['amount'] <= 0 for milestone in value):
+            raise serializers.ValidationError("Milestone amounts must be positive")
+        return value
+
+
+class PaymentSerializer(serializers.ModelSerializer):
+    """Serializer for Payment model"""
+
+    class Meta:
+        model = Payment
+        fields = ['id', 'contract', 'milestone', 'kind', 'amount', 'status', 'reference', 'created_at']
+        read_only_fields = fields
+
+
+class ProposalDecisionSerializer(serializers.Serializer):
+    """Serializer for accepting and rejecting a job's proposals"""
+    accept = serializers.ListField(child=serializers.IntegerField(), default=list)
+    reject = serializers.ListField(child=serializers.IntegerField(), default=list)
+    reject_others = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        """Require at least one decision, at most one hire and no id both accepted and rejected"""
+        if not (data['accept'] or data['reject'] or data['reject_others']):
+            raise serializers.ValidationError("Nothing to decide: give accept, reject or reject_others")
+        if len(set(data['accept'])) > 1:
+            raise serializers.ValidationError("Only one proposal can be accepted")
+        if set(data['accept']) & set(data['reject']):
+            raise serializers.ValidationError("A proposal cannot be both accepted and rejected")
+        return data
 
 
 class RegisterSerializer(serializers.Serializer):
@@ -0,0 +1,173 @@
+"""
+Server-Sent Events stream of new jobs and proposals.
+
+``GET /api/stream/`` is served by ``stream``, a bare ASGI app mounted in
+``flexilance.asgi`` next to Django. An idle connection is one coroutine
+blocked on its subscription queue plus a small watcher task, so a process
+holds thousands of them; no thread or database connection is kept per
+client. The token is checked once, when the stream opens.
+
+Authenticate with ``Authorization: Token <key>`` or, for ``EventSource``
+which cannot set headers, ``?token=<key>``. Events:
+
+* ``proposal.created`` to the job's owner for each new proposal;
+* ``job.created`` to freelancers for each new job matching one of their
+  profile skills (every job if they list none);
+* ``message.created`` to the other participant of a message thread.
+
+A ``: ping`` comment is sent every ``SSE_HEARTBEAT_INTERVAL`` seconds so
+proxies keep idle streams open.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from rest_framework.authtoken.models import Token
+
+from .metrics import STREAM_CONNECTIONS
+from .pubsub import CLOSED, get_broker
+
+
+HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    # Stop nginx-style proxies from buffering the stream
+    (b'x-accel-buffering', b'no'),
+]
+
+# Reconnect delay sent to EventSource clients, in milliseconds
+RETRY_MS = 5000
+
+
+def request_token(scope):
+    """
+    The API token from the Authorization header or the ``token`` query parameter.
+    """
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            kind, _, key = value.decode('latin-1').partition(' ')
+            if kind.lower() == 'token' and key.strip():
+                return key.strip()
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return query.get('token', [None])[0]
+
+
+def _subscriber(key):
+    """
+    Look up the token's user.
+
+    Returns:
+        tuple: (channels, skills) for the stream, or None if the token is invalid
+    """
+    _close_old_connections()
+    try:
+        token = Token.objects.select_related('user__profile').filter(key=key).first()
+        if token is None or not token.user.is_active:
+            return None
+        user = token.user
+        channels = [f'user:{user.pk}']
+        skills = []
+        profile = getattr(user, 'profile', None)
+        if profile is not None and profile.is_freelancer:
+            channels.append('jobs')
+            skills = parse_skills(profile.skills)
+        return channels, skills
+    finally:
+        _close_old_connections()
+
+
+def _close_old_connections():
+    # What Django does around each request, skipped inside a transaction
+    # (an outer atomic block, e.g. a test case) that it would break
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+def parse_skills(text):
+    """
+    Lower-cased skills from a comma separated list.
+    """
+    return [skill.strip().lower() for skill in (text or '').split(',') if skill.strip()]
+
+
+def job_matches(job, skills):
+    """
+    Whether a ``job.created`` payload mentions any of ``skills`` in its title or skills.
+    """
+    if not skills:
+        return True
+    text = f"{job.get('title', '')} {job.get('skills_required', '')}".lower()
+    return any(skill in text for skill in skills)
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+
+async def _send_json(send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+async def not_found(send):
+    """
+    404 for paths a stream-only ASGI service does not serve.
+    """
+    await _send_json(send, 404, {'detail': 'Not found.'})
+
+
+async def _watch_disconnect(receive, subscription):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            subscription.queue.put_nowait(CLOSED)
+            return
+
+
+async def stream(scope, receive, send):
+    """
+    ASGI app streaming the authenticated user's events until they disconnect.
+    """
+    if scope['method'] != 'GET':
+        await _send_json(send, 405, {'detail': f"Method \"{scope['method']}\" not allowed."})
+        return
+    key = request_token(scope)
+    subscriber = await sync_to_async(_subscriber)(key) if key else None
+    if subscriber is None:
+        await _send_json(send, 401, {'detail': 'Invalid or missing token.'})
+        return
+    channels, skills = subscriber
+
+    broker = get_broker()
+    subscription = broker.subscribe(channels)
+    watcher = asyncio.ensure_future(_watch_disconnect(receive, subscription))
+    STREAM_CONNECTIONS.labels('opened').inc()
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': HEADERS})
+        await send({'type': 'http.response.body', 'body': f'retry: {RETRY_MS}\n\n'.encode(), 'more_body': True})
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), settings.SSE_HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+                continue
+            if message is CLOSED:
+                break
+            event, data = message['event'], message['data']
+            if event == 'job.created' and not job_matches(data, skills):
+                continue
+            await send({'type': 'http.response.body', 'body': format_event(event, data), 'more_body': True})
+        if not watcher.done():
+            # Server side close (the subscriber fell behind): end the response
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        watcher.cancel()
+        broker.unsubscribe(subscription)
+        STREAM_CONNECTIONS.labels('closed').inc()
@@ -0,0 +1,295 @@
+"""
+Resilient client for the Cloudinary upload API.
+
+All remote storage calls go through one ``StorageGateway`` per process. It
+keeps a pooled keep-alive HTTP session, retries transient failures
+(connection errors, 429 and 5xx) a bounded number of times with jittered
+exponential backoff, and trips a circuit breaker after repeated failures so
+callers fall back to local storage at once instead of waiting for timeouts
+while Cloudinary is unhealthy.
+
+Requests are signed with ``cloudinary.utils`` and sent to
+``cloudinary.utils.cloudinary_api_url``, so the configured ``upload_prefix``
+decides the host; tests point it at a local fake server.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import urllib3
+from django.conf import settings
+
+from .metrics import STORAGE_CALLS
+
+
+logger = logging.getLogger('core.storage')
+
+
+class StorageGatewayError(Exception):
+    """Remote storage call failed"""
+
+    def __init__(self, message, retryable=True, status=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status = status
+
+
+class CircuitOpenError(StorageGatewayError):
+    """Remote storage skipped because the circuit breaker is open"""
+
+    def __init__(self, message='Remote storage circuit is open'):
+        super().__init__(message, retryable=False)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` failures in a row the circuit opens and
+    ``allow()`` returns False for ``reset_timeout`` seconds. Then a single
+    trial call is let through (half-open): success closes the circuit,
+    failure opens it again for another ``reset_timeout``.
+
+    Args:
+        failure_threshold: Consecutive failures that open the circuit
+        reset_timeout: Seconds to stay open before a trial call
+        clock: Monotonic time source, replaceable in tests
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning('Remote storage circuit opened after %d failures', self.failures)
+                self.opened_at = self.clock()
+            self._trial_in_flight = False
+
+
+class StorageGateway:
+    """
+    Signed Cloudinary API calls over a shared connection pool.
+
+    Args:
+        retries: Extra attempts after the first for transient failures
+        backoff: Base delay in seconds; attempt ``n`` sleeps a random time
+            up to ``backoff * 2 ** n`` (full jitter)
+        max_backoff: Upper bound on a single delay
+        connect_timeout: Seconds to establish a connection
+        read_timeout: Seconds to wait for the response
+        pool_size: Keep-alive connections kept per host
+        breaker: CircuitBreaker shared by every call
+        sleep: Delay function, replaceable in tests
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, retries=2, backoff=0.2, max_backoff=2.0, connect_timeout=3.0,
+                 read_timeout=30.0, pool_size=10, breaker=None, sleep=time.sleep):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+        self.http = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=pool_size,
+            block=False,
+            retries=False,
+            timeout=urllib3.Timeout(connect=connect_timeout, read=read_timeout),
+        )
+
+    def upload(self, file_obj, folder=None, resource_type='image'):
+        """
+        Upload a file and return Cloudinary's response.
+
+        Args:
+            file_obj: File-like object; it is read once and resent on retries
+            folder: Optional Cloudinary folder
+            resource_type: Cloudinary resource type ('image', 'raw', 'auto')
+
+        Returns:
+            dict: Parsed response with ``public_id``, ``secure_url`` and
+            ``resource_type``
+
+        Raises:
+            StorageGatewayError: If the upload failed or the circuit is open
+        """
+        if hasattr(file_obj, 'seek'):
+            file_obj.seek(0)
+        name = os.path.basename(getattr(file_obj, 'name', None) or 'file')
+        content_type = getattr(file_obj, 'content_type', None) or 'application/octet-stream'
+        params = {'timestamp': int(time.time())}
+        if folder:
+            params['folder'] = folder
+        return self.call('upload', params, resource_type, file=(name, file_obj.read(), content_type))
+
+    def destroy(self, public_id, resource_type='image'):
+        """
+        Delete an uploaded asset.
+
+        Returns:
+            bool: True if Cloudinary reports it deleted
+        """
+        params = {'public_id': public_id, 'timestamp': int(time.time())}
+        return self.call('destroy', params, resource_type).get('result') == 'ok'
+
+    def resource(self, public_id, resource_type='image'):
+        """
+        Details of an uploaded asset (``bytes``, ``format``, ...), or None if
+        there is no such asset.
+
+        Raises:
+            StorageGatewayError: If Cloudinary could not be asked
+        """
+        params = {'public_id': public_id, 'type': 'upload', 'timestamp': int(time.time())}
+        try:
+            return self.call('explicit', params, resource_type)
+        except StorageGatewayError as exc:
+            if exc.status == 404:
+                return None
+            raise
+
+    def exists(self, public_id, resource_type='image'):
+        """
+        Whether an uploaded asset exists.
+
+        Raises:
+            StorageGatewayError: If Cloudinary could not be asked
+        """
+        return self.resource(public_id, resource_type) is not None
+
+    def call(self, action, params, resource_type='image', file=None):
+        """
+        Make a signed API call with retries, guarded by the circuit breaker.
+        """
+        from cloudinary import utils
+
+        try:
+            fields = list(utils.sign_request(params, {}).items())
+            url = utils.cloudinary_api_url(action, resource_type=resource_type)
+        except ValueError as exc:
+            raise StorageGatewayError(f'Cloudinary is not configured: {exc}', retryable=False)
+        if file is not None:
+            fields.append(('file', file))
+
+        if not self.breaker.allow():
+            STORAGE_CALLS.labels(action, 'short_circuit').inc()
+            raise CircuitOpenError()
+
+        attempt = 0
+        while True:
+            try:
+                result = self._request(url, fields)
+            except StorageGatewayError as exc:
+                if exc.retryable and attempt < self.retries:
+                    STORAGE_CALLS.labels(action, 'retry').inc()
+                    self.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+                    attempt += 1
+                    continue
+                STORAGE_CALLS.labels(action, 'error').inc()
+                if exc.retryable:
+                    self.breaker.record_failure()
+                else:
+                    # The service answered; a rejected request says nothing about its health
+                    self.breaker.record_success()
+                raise
+            STORAGE_CALLS.labels(action, 'ok').inc()
+            self.breaker.record_success()
+            return result
+
+    def _request(self, url, fields):
+        try:
+            response = self.http.request('POST', url, fields=fields)
+        except urllib3.exceptions.HTTPError as exc:
+            raise StorageGatewayError(f'Request failed: {exc}')
+
+        if response.status in self.RETRY_STATUSES:
+            raise StorageGatewayError(f'HTTP {response.status}')
+        try:
+            result = json.loads(response.data.decode('utf-8'))
+        except ValueError:
+            raise StorageGatewayError(f'Invalid response (HTTP {response.status})', retryable=False)
+        if 'error' in result:
+            raise StorageGatewayError(
+                result['error'].get('message', f'HTTP {response.status}'), retryable=False, status=response.status,
+            )
+        return result
+
+
+_gateway = None
+_gateway_pid = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """
+    The storage gateway for this process, rebuilt after a fork.
+    """
+    global _gateway, _gateway_pid
+    pid = os.getpid()
+    if _gateway_pid != pid:
+        with _gateway_lock:
+            if _gateway_pid != pid:
+                _gateway = StorageGateway(
+                    retries=settings.STORAGE_RETRIES,
+                    backoff=settings.STORAGE_RETRY_BACKOFF,
+                    connect_timeout=settings.STORAGE_CONNECT_TIMEOUT,
+                    read_timeout=settings.STORAGE_READ_TIMEOUT,
+                    breaker=CircuitBreaker(
+                        failure_threshold=settings.STORAGE_CIRCUIT_THRESHOLD,
+                        reset_timeout=settings.STORAGE_CIRCUIT_RESET,
+                    ),
+                )
+                _gateway_pid = pid
+    return _gateway
+
+
+def reset_gateway():
+    """
+    Drop this process's gateway; the next call builds one from settings.
+    """
+    global _gateway, _gateway_pid
+    with _gateway_lock:
+        _gateway = None
+        _gateway_pid = None
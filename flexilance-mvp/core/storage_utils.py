@@ -1,9 +1,70 @@
 """
 Utility functions for handling file storage with Cloudinary and local storage backends.
 """
+import logging
 import os
+import time
 from django.conf import settings
-from django.core.files.storage import default_storage
+from django.core.files.storage import FileSystemStorage, default_storage
+
+from .instrumentation import span
+from .media import signed_media_url
+from .metrics import UPLOAD_FAILURES, record_upload
+from .storage_gateway import CircuitOpenError, StorageGatewayError, get_gateway
+
+
+logger = logging.getLogger('core.storage')
+
+# Names of files kept on local disk because Cloudinary was unavailable.
+# The prefix records the backend, since file fields store only the name.
+LOCAL_FALLBACK_PREFIX = 'local/'
+
+# Cloudinary public ids of attachments uploaded as raw files (any document
+# type) rather than images. The prefix selects the raw resource type for
+# URLs and deletes.
+RAW_PREFIX = 'raw/'
+
+
+def local_storage():
+    """
+    Storage for files under MEDIA_ROOT, whatever DEFAULT_FILE_STORAGE is.
+    """
+    return FileSystemStorage(location=settings.MEDIA_ROOT, base_url=settings.MEDIA_URL)
+
+
+def is_local_fallback(name):
+    """
+    Whether a stored name was written by the local fallback.
+    """
+    return bool(name) and name.startswith(LOCAL_FALLBACK_PREFIX)
+
+
+def cloudinary_resource_type(name):
+    """
+    Cloudinary resource type of a stored name: 'raw' or 'image'.
+    """
+    return 'raw' if name.startswith(RAW_PREFIX) else 'image'
+
+
+def storage_url(storage, name):
+    """
+    URL of a stored name, served from MEDIA_URL if the fallback wrote it.
+
+    MEDIA_URL addresses are signed, since ``serve_media`` only serves
+    signed paths.
+
+    Args:
+        storage: The file field's storage
+        name: Stored name
+    """
+    if settings.CLOUDINARY_ENABLED and cloudinary_resource_type(name) == 'raw':
+        from cloudinary.utils import cloudinary_url
+
+        return cloudinary_url(name, resource_type='raw', secure=True)[0]
+    url = local_storage().url(name) if is_local_fallback(name) else storage.url(name)
+    if url.startswith(settings.MEDIA_URL):
+        return signed_media_url(url, name)
+    return url
 
 
 def upload_file(file_obj, folder=None):
@@ -17,16 +78,22 @@ def upload_file(file_obj, folder=None):
     Returns:
         dict: Upload result with file information
     """
+    with span('storage'):
+        started = time.perf_counter()
+        result = _upload_file(file_obj, folder)
+        record_upload(
+            result.get('storage_backend', 'local'),
+            getattr(file_obj, 'size', None),
+            time.perf_counter() - started,
+            success=result['success'],
+        )
+        return result
+
+
+def _upload_file(file_obj, folder=None):
     if settings.CLOUDINARY_ENABLED:
         try:
-            from cloudinary.uploader import upload
-            
-            # Upload to Cloudinary
-            upload_options = {}
-            if folder:
-                upload_options['folder'] = folder
-            
-            result = upload(file_obj, **upload_options)
+            result = get_gateway().upload(file_obj, folder=folder)
             
             return {
                 'success': True,
@@ -36,27 +103,73 @@ def upload_file(file_obj, folder=None):
                 'resource_type': result['resource_type']
             }
             
-        except Exception as e:
-            print(f"Cloudinary upload failed: {e}")
+        except CircuitOpenError:
+            # Cloudinary is known to be down; don't wait for it
+            return upload_file_fallback(file_obj, folder)
+        except StorageGatewayError as e:
+            logger.warning("Cloudinary upload failed, using local storage: %s", e)
+            UPLOAD_FAILURES.labels('cloudinary').inc()
             # Fallback to local storage
-            return upload_file_local(file_obj, folder)
+            if hasattr(file_obj, 'seek'):
+                file_obj.seek(0)
+            return upload_file_fallback(file_obj, folder)
     
     else:
         # Use local storage
         return upload_file_local(file_obj, folder)
 
 
-def upload_file_local(file_obj, folder=None):
+def ingest_file(file_obj, folder=None):
+    """
+    Store an uploaded file once and return the name a FileField should hold.
+    
+    Assigning the returned name (rather than the upload) to the model field
+    marks the file as committed, so the field's pre_save does not write it
+    a second time.
+    
+    Args:
+        file_obj: The uploaded file
+        folder: Folder matching the model field's upload_to
+        
+    Returns:
+        str: Cloudinary public ID or local storage name, or None if the
+        upload failed and the model field should save the file itself
+    """
+    result = upload_file(file_obj, folder=folder)
+    if not result['success']:
+        return None
+    if result['storage_backend'] == 'cloudinary':
+        return result['public_id']
+    return result['filename']
+
+
+def upload_file_fallback(file_obj, folder=None):
+    """
+    Keep a file on local disk while Cloudinary is unavailable.
+    
+    With Cloudinary enabled, default_storage is Cloudinary too, so the
+    file goes to a FileSystemStorage under LOCAL_FALLBACK_PREFIX instead.
+    
+    Returns:
+        dict: Upload result, as from upload_file_local
+    """
+    folder = LOCAL_FALLBACK_PREFIX + (folder.strip('/') if folder else '')
+    return upload_file_local(file_obj, folder.rstrip('/'), storage=local_storage())
+
+
+def upload_file_local(file_obj, folder=None, storage=None):
     """
     Upload a file to local storage.
     
     Args:
         file_obj: The file object to upload
         folder: Optional folder path for organization
+        storage: Storage to write to, default_storage if not given
         
     Returns:
         dict: Upload result with file information
     """
+    storage = storage or default_storage
     try:
         # Generate filename
         if folder:
@@ -64,18 +177,17 @@ def upload_file_local(file_obj, folder=None):
         else:
             filename = file_obj.name
         
-        # Save file using default storage
-        saved_name = default_storage.save(filename, file_obj)
+        saved_name = storage.save(filename, file_obj)
         
         return {
             'success': True,
             'storage_backend': 'local',
             'filename': saved_name,
-            'url': default_storage.url(saved_name)
+            'url': storage_url(storage, saved_name)
         }
         
     except Exception as e:
-        print(f"Local file upload failed: {e}")
+        logger.exception("Local file upload failed: %s", e)
         return {
             'success': False,
             'error': str(e)
@@ -88,32 +200,46 @@ def delete_file(file_identifier, storage_backend='auto'):
     
     Args:
         file_identifier: Public ID (Cloudinary) or filename (local)
-        storage_backend: 'cloudinary', 'local', or 'auto' to detect
+        storage_backend: 'cloudinary', 'local', or 'auto' to detect from
+            the name and settings
         
     Returns:
         bool: True if deletion was successful
     """
+    with span('storage'):
+        return _delete_file(file_identifier, storage_backend)
+
+
+def backend_for(name):
+    """
+    The backend holding a stored name: 'local' for fallback names or with
+    Cloudinary disabled, otherwise 'cloudinary'.
+    """
+    if settings.CLOUDINARY_ENABLED and not is_local_fallback(name):
+        return 'cloudinary'
+    return 'local'
+
+
+def _delete_file(file_identifier, storage_backend='auto'):
     if storage_backend == 'auto':
-        storage_backend = 'cloudinary' if settings.CLOUDINARY_ENABLED else 'local'
+        storage_backend = backend_for(file_identifier)
     
     if storage_backend == 'cloudinary':
         try:
-            from cloudinary.uploader import destroy
+            return get_gateway().destroy(file_identifier, cloudinary_resource_type(file_identifier))
             
-            result = destroy(file_identifier)
-            return result.get('result') == 'ok'
-            
-        except Exception as e:
-            print(f"Cloudinary deletion failed: {e}")
+        except StorageGatewayError as e:
+            logger.warning("Cloudinary deletion failed: %s", e)
             return False
     
     else:
         # Local storage
         try:
-            default_storage.delete(file_identifier)
+            storage = local_storage() if is_local_fallback(file_identifier) else default_storage
+            storage.delete(file_identifier)
             return True
         except Exception as e:
-            print(f"Local file deletion failed: {e}")
+            logger.warning("Local file deletion failed: %s", e)
             return False
 
 
@@ -128,29 +254,50 @@ def get_file_url(file_identifier, storage_backend='auto'):
     Returns:
         str: File URL or None if not found
     """
+    with span('storage'):
+        return _get_file_url(file_identifier, storage_backend)
+
+
+def _get_file_url(file_identifier, storage_backend='auto'):
     if storage_backend == 'auto':
-        storage_backend = 'cloudinary' if settings.CLOUDINARY_ENABLED else 'local'
+        storage_backend = backend_for(file_identifier)
     
     if storage_backend == 'cloudinary':
         try:
             from cloudinary.utils import cloudinary_url
             
-            url, _ = cloudinary_url(file_identifier)
+            url, _ = cloudinary_url(file_identifier, resource_type=cloudinary_resource_type(file_identifier))
             return url
             
         except Exception as e:
-            print(f"Cloudinary URL generation failed: {e}")
+            logger.exception("Cloudinary URL generation failed: %s", e)
             return None
     
     else:
         # Local storage
         try:
-            return default_storage.url(file_identifier)
+            return storage_url(default_storage, file_identifier)
         except Exception as e:
-            print(f"Local file URL generation failed: {e}")
+            logger.exception("Local file URL generation failed: %s", e)
             return None
 
 
+def field_file_url(field_file):
+    """
+    Get the URL of a model FileField value.
+    
+    Args:
+        field_file: FieldFile from a model instance, possibly empty
+        
+    Returns:
+        str: File URL or None if no file is set
+    """
+    if not field_file:
+        return None
+    with span('storage'):
+        return storage_url(field_file.storage, field_file.name)
+
+
 def get_storage_info():
     """
     Get information about the current storage configuration.
@@ -0,0 +1,77 @@
+"""
+Periodic maintenance tasks run by ``core.scheduler``.
+"""
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+
+from .escrow import reconcile_pending
+from .idempotency import purge_expired
+from .models import Job
+from .notifications import deliver_pending
+from .scheduler import periodic
+from .uploads import purge_confirmed
+
+
+logger = logging.getLogger('core.tasks')
+
+
+def expire_jobs(now=None, batch_size=None):
+    """
+    Deactivate active jobs whose deadline has passed.
+
+    Works in chunks: each chunk selects up to ``batch_size`` ids from the
+    (is_active, deadline) index and flips them with one ``UPDATE``, so no
+    statement holds row locks on more than a chunk however large the
+    backlog. Jobs without a deadline never expire.
+
+    Args:
+        now: Cut-off time, defaults to timezone.now()
+        batch_size: Jobs per UPDATE, defaults to JOB_EXPIRY_BATCH_SIZE
+
+    Returns:
+        int: Number of jobs deactivated
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.JOB_EXPIRY_BATCH_SIZE
+    expired = 0
+    while True:
+        ids = list(
+            Job.objects.filter(is_active=True, deadline__lte=now)
+            .order_by('deadline').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        # Queryset.update() skips save(), so set updated_at explicitly
+        expired += Job.objects.filter(id__in=ids, is_active=True).update(is_active=False, updated_at=now)
+        if len(ids) < batch_size:
+            break
+    if expired:
+        logger.info('Expired %d jobs past their deadline', expired)
+    return expired
+
+
+@periodic('expire_jobs', interval=lambda: settings.JOB_EXPIRY_INTERVAL)
+def expire_jobs_task():
+    expire_jobs()
+
+
+@periodic('deliver_notifications', interval=lambda: settings.NOTIFICATION_DELIVERY_INTERVAL)
+def deliver_notifications_task():
+    deliver_pending()
+
+
+@periodic('purge_idempotency_keys', interval=lambda: settings.IDEMPOTENCY_PURGE_INTERVAL)
+def purge_idempotency_keys_task():
+    purge_expired()
+
+
+@periodic('purge_confirmed_uploads', interval=lambda: settings.UPLOAD_TICKET_MAX_AGE)
+def purge_confirmed_uploads_task():
+    purge_confirmed()
+
+
+@periodic('reconcile_payments', interval=lambda: settings.PAYMENT_RECONCILE_INTERVAL)
+def reconcile_payments_task():
+    reconcile_pending()
@@ -1,14 +1,29 @@
-from django.test import TestCase
+from django.core.files.storage import InMemoryStorage
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth.models import User
+from django.test.utils import override_settings
 from django.urls import reverse
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from .models import Profile, Job, Proposal
+from rest_framework.utils.encoders import JSONEncoder
+from .models import Profile, Job, Proposal, Thread
+import json
+import shutil
 import tempfile
 import os
+from io import StringIO
 from PIL import Image
 
 
+# Test settings keep uploads in memory; tests that check files on disk
+# switch back to the filesystem with a temporary MEDIA_ROOT.
+DISK_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedStaticFilesStorage'},
+}
+
 class UserAuthenticationTests(APITestCase):
     """Test user registration and authentication flows"""
     
@@ -98,12 +113,15 @@ class UserAuthenticationTests(APITestCase):
 class JobCRUDTests(APITestCase):
     """Test CRUD operations for Job model"""
     
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('clientuser', 'client@example.com', 'clientpass123')
+        cls.profile = cls.user.profile
+        cls.profile.is_freelancer = False
+        cls.profile.save()
+
     def setUp(self):
         self.client = APIClient()
-        self.user = User.objects.create_user('clientuser', 'client@example.com', 'clientpass123')
-        self.profile = self.user.profile
-        self.profile.is_freelancer = False
-        self.profile.save()
         self.client.force_authenticate(user=self.user)
         self.jobs_url = reverse('job-list')
         
@@ -192,28 +210,29 @@ class JobCRUDTests(APITestCase):
 class ProposalCRUDTests(APITestCase):
     """Test CRUD operations for Proposal model"""
     
-    def setUp(self):
-        self.client = APIClient()
-        
+    @classmethod
+    def setUpTestData(cls):
         # Create client and freelancer users - profiles are automatically created
-        self.client_user = User.objects.create_user('client', 'client@example.com', 'clientpass')
-        self.client_profile = self.client_user.profile
-        self.client_profile.is_freelancer = False
-        self.client_profile.save()
+        cls.client_user = User.objects.create_user('client', 'client@example.com', 'clientpass')
+        cls.client_profile = cls.client_user.profile
+        cls.client_profile.is_freelancer = False
+        cls.client_profile.save()
         
-        self.freelancer_user = User.objects.create_user('freelancer', 'freelancer@example.com', 'freelancerpass')
-        self.freelancer_profile = self.freelancer_user.profile
-        self.freelancer_profile.is_freelancer = True
-        self.freelancer_profile.save()
+        cls.freelancer_user = User.objects.create_user('freelancer', 'freelancer@example.com', 'freelancerpass')
+        cls.freelancer_profile = cls.freelancer_user.profile
+        cls.freelancer_profile.is_freelancer = True
+        cls.freelancer_profile.save()
         
         # Create a job
-        self.job = Job.objects.create(
+        cls.job = Job.objects.create(
             title='Test Job',
             description='Test Description',
             budget=1000.00,
-            client=self.client_user
+            client=cls.client_user
         )
-        
+
+    def setUp(self):
+        self.client = APIClient()
         self.proposals_url = reverse('proposal-list')
         
     def test_create_proposal_success(self):
@@ -313,12 +332,15 @@ class ProposalCRUDTests(APITestCase):
 class ProfilePictureTests(APITestCase):
     """Test profile picture upload functionality with Cloudinary integration"""
     
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('testuser', 'test@example.com', 'testpass123')
+        cls.profile = cls.user.profile
+        cls.profile.is_freelancer = True
+        cls.profile.save()
+
     def setUp(self):
         self.client = APIClient()
-        self.user = User.objects.create_user('testuser', 'test@example.com', 'testpass123')
-        self.profile = self.user.profile
-        self.profile.is_freelancer = True
-        self.profile.save()
         self.client.force_authenticate(user=self.user)
         self.profile_picture_url = reverse('update-profile-picture')
         
@@ -350,16 +372,17 @@ class ProfilePictureTests(APITestCase):
 class DataIntegrityTests(TestCase):
     """Test data integrity and relationships between models"""
     
-    def setUp(self):
-        self.client_user = User.objects.create_user('client', 'client@example.com', 'clientpass')
-        self.client_profile = self.client_user.profile
-        self.client_profile.is_freelancer = False
-        self.client_profile.save()
-        
-        self.freelancer_user = User.objects.create_user('freelancer', 'freelancer@example.com', 'freelancerpass')
-        self.freelancer_profile = self.freelancer_user.profile
-        self.freelancer_profile.is_freelancer = True
-        self.freelancer_profile.save()
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('client', 'client@example.com', 'clientpass')
+        cls.client_profile = cls.client_user.profile
+        cls.client_profile.is_freelancer = False
+        cls.client_profile.save()
+        
+        cls.freelancer_user = User.objects.create_user('freelancer', 'freelancer@example.com', 'freelancerpass')
+        cls.freelancer_profile = cls.freelancer_user.profile
+        cls.freelancer_profile.is_freelancer = True
+        cls.freelancer_profile.save()
         
     def test_user_profile_relationship(self):
         """Test User-Profile one-to-one relationship"""
@@ -440,12 +463,15 @@ class DataIntegrityTests(TestCase):
 class ErrorHandlingTests(APITestCase):
     """Test error handling for various scenarios"""
     
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('testuser', 'test@example.com', 'testpass123')
+        cls.profile = cls.user.profile
+        cls.profile.is_freelancer = True
+        cls.profile.save()
+
     def setUp(self):
         self.client = APIClient()
-        self.user = User.objects.create_user('testuser', 'test@example.com', 'testpass123')
-        self.profile = self.user.profile
-        self.profile.is_freelancer = True
-        self.profile.save()
         self.client.force_authenticate(user=self.user)
         
     def test_invalid_file_type_upload(self):
@@ -468,3 +494,2678 @@ class ErrorHandlingTests(APITestCase):
         for endpoint in endpoints:
             response = self.client.get(endpoint)
             self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class BenchmarkSuiteTests(TransactionTestCase):
+    """Test the benchmark dataset, runner and baseline comparison"""
+
+    def test_run_scenario_in_process(self):
+        """Test driving an endpoint through the WSGI app"""
+        from .benchmarks import WSGITransport, prepare_dataset, run_scenario, seed_dataset
+
+        dataset = prepare_dataset(seed_dataset(clients=2, freelancers=3, jobs_per_client=2, proposals_per_job=2))
+        self.assertEqual(Job.objects.count(), 4)
+        self.assertEqual(Proposal.objects.count(), 8)
+
+        result = run_scenario('jobs-list', WSGITransport(), dataset, requests=6, concurrency=2, warmup=1)
+        self.assertEqual(result['requests'], 6)
+        self.assertEqual(result['errors'], 0)
+        self.assertGreater(result['queries_per_request'], 0)
+        self.assertGreaterEqual(result['p99_ms'], result['p50_ms'])
+
+    def test_compare_to_baseline(self):
+        """Test that slower latency and extra queries are reported as regressions"""
+        from .benchmarks import compare_to_baseline, summarize
+
+        baseline = {'jobs-list': summarize('jobs-list', [0.01] * 10, 0.1, queries=[3] * 10)}
+        same = summarize('jobs-list', [0.011] * 10, 0.11, queries=[3] * 10)
+        slower = summarize('jobs-list', [0.05] * 10, 0.5, queries=[4] * 10)
+
+        self.assertEqual(compare_to_baseline([same], baseline), [])
+        regressions = compare_to_baseline([slower], baseline)
+        self.assertTrue(any('p95_ms' in message for message in regressions))
+        self.assertTrue(any('queries_per_request' in message for message in regressions))
+
+
+class MarketplaceSeederTests(TestCase):
+    """Test the bulk marketplace data generator"""
+
+    def test_seed_creates_consistent_rows(self):
+        """Test row counts, profiles and proposal uniqueness"""
+        from .seeding import MarketplaceSeeder
+
+        created = MarketplaceSeeder(users=40, jobs=30, proposals=120, prefix='seedtest', batch_size=16).run()
+
+        self.assertEqual(created['users'], 40)
+        self.assertEqual(created['jobs'], 30)
+        self.assertEqual(Profile.objects.filter(user__username__startswith='seedtest').count(), 40)
+        self.assertEqual(Profile.objects.filter(is_freelancer=True).count(), 28)
+        self.assertEqual(Proposal.objects.count(), created['proposals'])
+        self.assertGreater(created['proposals'], 60)
+
+        # Freelancers never bid on the same job twice and clients never bid
+        pairs = list(Proposal.objects.values_list('job_id', 'freelancer_id'))
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertFalse(Proposal.objects.filter(freelancer__profile__is_freelancer=False).exists())
+        self.assertFalse(Job.objects.filter(client__profile__is_freelancer=True).exists())
+
+
+class ServerTimingTests(APITestCase):
+    """Test per-request Server-Timing instrumentation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('timed', 'timed@example.com', 'timedpass123')
+        cls.token = Token.objects.create(user=cls.user)
+        Job.objects.create(title='Timed Job', description='Description', budget=100, client=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_sampled_request_reports_timings(self):
+        """Test that a sampled request gets a Server-Timing header and a log line"""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+        with self.assertLogs('core.perf', level='INFO') as logs:
+            response = self.client.get(reverse('job-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'auth;dur=', 'serialize;dur=', 'total;dur='):
+            self.assertIn(metric, header)
+        self.assertIn('status=200', logs.output[0])
+        self.assertIn('view=job-list', logs.output[0])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0.0)
+    def test_unsampled_request_has_no_header(self):
+        """Test that unsampled requests are left untouched"""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = self.client.get(reverse('job-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_nested_spans_count_once(self):
+        """Test that re-entering a span does not double count"""
+        from .instrumentation import RequestTimings, activate, deactivate, span
+
+        timings = RequestTimings()
+        token = activate(timings)
+        try:
+            with span('storage'):
+                with span('storage'):
+                    pass
+        finally:
+            deactivate(token)
+        self.assertEqual(timings.counts, {'storage': 1})
+
+
+class MetricsEndpointTests(APITestCase):
+    """Test the Prometheus metrics endpoint and multiprocess aggregation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('metrics', 'metrics@example.com', 'metricspass123')
+
+    def setUp(self):
+        from . import metrics
+
+        self.metrics = metrics
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        self.settings_override = override_settings(METRICS_MULTIPROC_DIR=self.metrics_dir, METRICS_TOKEN=None)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        metrics.reset_store()
+        self.addCleanup(metrics.reset_store)
+        self.client.force_authenticate(user=self.user)
+
+    @override_settings(DEBUG=True)
+    def test_request_metrics_exposed(self):
+        """Test that per-view latency, status and query counts are exported"""
+        self.client.get(reverse('job-list'))
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE flexilance_http_request_duration_seconds histogram', body)
+        self.assertIn('flexilance_http_request_duration_seconds_bucket{view="job-list",method="GET",le="+Inf"} 1', body)
+        self.assertIn('flexilance_http_request_duration_seconds_count{view="job-list",method="GET"} 1', body)
+        self.assertIn('flexilance_http_requests_total{view="job-list",method="GET",status="200"} 1', body)
+        self.assertIn('flexilance_db_queries_total{view="job-list"}', body)
+
+    def test_worker_files_are_summed(self):
+        """Test that samples written by other worker processes are aggregated"""
+        self.metrics.record_cache('idempotency', hit=True)
+        other_worker = self.metrics._MmapStore(os.path.join(self.metrics_dir, 'metrics_999999.db'))
+        other_worker.inc(self.metrics.CACHE_REQUESTS.labels('idempotency', 'hit').key, 2)
+
+        body = self.metrics.render()
+        self.assertIn('flexilance_cache_requests_total{cache="idempotency",result="hit"} 3', body)
+
+    def test_upload_metrics_by_backend(self):
+        """Test upload bytes and durations are split by storage backend"""
+        self.metrics.record_upload('local', 2048, 0.02)
+        self.metrics.record_upload('cloudinary', None, 1.5, success=False)
+
+        body = self.metrics.render()
+        self.assertIn('flexilance_storage_upload_bytes_total{backend="local"} 2048', body)
+        self.assertIn('flexilance_storage_upload_failures_total{backend="cloudinary"} 1', body)
+        self.assertIn('flexilance_storage_upload_duration_seconds_bucket{backend="local",le="0.025"} 1', body)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_token_required(self):
+        """Test that a configured scrape token is enforced"""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(DEBUG=False)
+    def test_metrics_closed_without_token_outside_debug(self):
+        """Test the endpoint is refused when no token is configured and DEBUG is off"""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class QueryStatsTests(APITestCase):
+    """Test SQL fingerprinting, slow query logging and the query report"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('sqlstats', 'sqlstats@example.com', 'sqlstatspass123')
+
+    def setUp(self):
+        from . import querystats
+
+        self.querystats = querystats
+        querystats.stats.reset()
+        self.addCleanup(querystats.stats.reset)
+        self.client.force_authenticate(user=self.user)
+
+    def test_fingerprint_normalizes_values(self):
+        """Test that literals, placeholders and IN lists collapse"""
+        fingerprint = self.querystats.fingerprint
+        self.assertEqual(
+            fingerprint("SELECT * FROM core_job WHERE id IN (1, 2, 3) AND title = 'x'"),
+            fingerprint("SELECT *  FROM core_job WHERE id IN (%s, %s) AND title = 'it''s'"),
+        )
+        self.assertEqual(
+            fingerprint('SELECT * FROM core_job LIMIT 20'),
+            'SELECT * FROM core_job LIMIT ?',
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_queries_aggregated_and_slow_ones_logged_with_view(self):
+        """Test per-fingerprint aggregation and the originating view in slow query logs"""
+        with self.assertLogs('core.slowquery', level='WARNING') as logs:
+            self.client.get(reverse('job-list'))
+            self.client.get(reverse('job-list'))
+
+        self.assertTrue(any('view=job-list' in line for line in logs.output))
+        snapshot = self.querystats.stats.snapshot()
+        job_queries = [entry for fp, entry in snapshot.items() if 'FROM "core_job"' in fp]
+        self.assertTrue(job_queries)
+        self.assertTrue(all(entry['views'].get('job-list') == entry['count'] for entry in job_queries))
+        self.assertTrue(any(entry['count'] == 2 for entry in job_queries))
+
+    def test_query_report_merges_snapshots(self):
+        """Test that the report command ranks fingerprints across process snapshots"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.querystats.stats.record('SELECT 1 FROM core_job WHERE id = %s', 0.5, 'job-list')
+        self.querystats.stats.flush(directory)
+        with open(os.path.join(directory, 'querystats_1.json'), 'w') as f:
+            f.write('{"SELECT ? FROM core_proposal": {"count": 3, "total": 0.1, "max": 0.05, "views": {"proposal-list": 3}}}')
+
+        out = StringIO()
+        call_command('query_report', dir=directory, top=1, stdout=out)
+        self.assertIn('SELECT ? FROM core_job WHERE id = ?', out.getvalue())
+        self.assertNotIn('core_proposal', out.getvalue())
+
+
+class RowSerializerParityTests(APITestCase):
+    """Test that the fast list path renders exactly what the serializers do"""
+
+    @classmethod
+    def setUpTestData(cls):
+        import datetime
+        from decimal import Decimal
+
+        cls.client_user = User.objects.create_user('rowclient', 'rowclient@example.com', 'rowclientpass')
+        cls.freelancer = User.objects.create_user('rowfreelancer', 'rowfreelancer@example.com', 'rowfreelancerpass')
+        cls.freelancer.profile.is_freelancer = True
+        cls.freelancer.profile.save()
+
+        lagos = datetime.timezone(datetime.timedelta(hours=1))
+        cls.jobs = [
+            Job.objects.create(
+                title='Logo design ✏️', description='Brand refresh', budget=Decimal('1234.5'),
+                client=cls.client_user, skills_required='Figma',
+                deadline=datetime.datetime(2030, 5, 1, 9, 30, 15, 123456, tzinfo=lagos),
+                attachment='jobs/brief.pdf',
+            ),
+            Job.objects.create(
+                title='API work', description='', budget=Decimal('75'), client=cls.client_user,
+            ),
+        ]
+        Proposal.objects.create(
+            job=cls.jobs[0], freelancer=cls.freelancer, cover_letter='Hire me',
+            bid_amount=Decimal('999.999'), delivery_time=3, proposal_attachment='proposals/cv.pdf',
+        )
+        Proposal.objects.create(
+            job=cls.jobs[1], freelancer=cls.freelancer, cover_letter='', bid_amount=Decimal('10'),
+            delivery_time=1, status='accepted',
+        )
+
+    def test_job_rows_match_serializer(self):
+        """Test job row output with and without a request in context"""
+        from rest_framework.test import APIRequestFactory
+        from .serializers import JobSerializer, JOB_ROW_SERIALIZER
+
+        request = APIRequestFactory().get('/api/jobs/')
+        jobs = Job.objects.all()
+        rows = JOB_ROW_SERIALIZER.values(jobs)
+        self.assertEqual(JOB_ROW_SERIALIZER.serialize(rows, request),
+                         JobSerializer(jobs, many=True, context={'request': request}).data)
+        self.assertEqual(JOB_ROW_SERIALIZER.serialize(rows), JobSerializer(jobs, many=True).data)
+
+    def test_proposal_rows_match_serializer(self):
+        """Test proposal row output including joined job and freelancer fields"""
+        from rest_framework.test import APIRequestFactory
+        from .serializers import ProposalSerializer, PROPOSAL_ROW_SERIALIZER
+
+        request = APIRequestFactory().get('/api/proposals/')
+        proposals = Proposal.objects.all()
+        rows = PROPOSAL_ROW_SERIALIZER.values(proposals)
+        self.assertEqual(PROPOSAL_ROW_SERIALIZER.serialize(rows, request),
+                         ProposalSerializer(proposals, many=True, context={'request': request}).data)
+
+    def test_list_endpoint_uses_fixed_query_count(self):
+        """Test that the job list page renders serializer-identical rows in two queries"""
+        from .serializers import JobSerializer
+
+        self.client.force_authenticate(user=self.freelancer)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('job-list'))
+
+        expected = JobSerializer(Job.objects.all(), many=True, context={'request': response.wsgi_request}).data
+        self.assertEqual(response.json()['results'], json.loads(json.dumps(expected, cls=JSONEncoder)))
+
+
+class FastJSONTests(APITestCase):
+    """Test that the orjson renderer and parser match DRF's JSON classes byte for byte"""
+
+    def payloads(self):
+        import datetime
+        import uuid
+        from decimal import Decimal
+        from django.utils.translation import gettext_lazy
+
+        lagos = datetime.timezone(datetime.timedelta(hours=1))
+        return [
+            {'id': 1, 'title': 'Logo ✏️ design', 'budget': '1500.00', 'is_active': True, 'deadline': None},
+            [{'nested': {'list': [1, 2.5, -3, None, False]}}, 'quote " backslash \\ slash /'],
+            {'when': datetime.datetime(2030, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+             'local': datetime.datetime(2030, 1, 2, 3, 4, 5, tzinfo=lagos),
+             'naive': datetime.datetime(2030, 1, 2), 'day': datetime.date(2030, 1, 2),
+             'time': datetime.time(9, 30), 'span': datetime.timedelta(hours=1, seconds=1)},
+            {'amount': Decimal('12.34'), 'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678')},
+            {'separator': 'line para end', 'control': 'a\x01\x1fb\tc\n', 'lazy': gettext_lazy('Hello')},
+            {1: 'int key', None: 'none key'},
+            {'big': 2 ** 70},
+            'plain string',
+        ]
+
+    def test_renderer_matches_json_renderer(self):
+        """Test byte-for-byte output for assorted payloads"""
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+
+        for payload in self.payloads():
+            with self.subTest(payload=payload):
+                self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+        self.assertEqual(
+            FastJSONRenderer().render({'a': [1]}, 'application/json; indent=4'),
+            JSONRenderer().render({'a': [1]}, 'application/json; indent=4'),
+        )
+
+    def test_job_page_matches_json_renderer(self):
+        """Test a rendered job list page against the stdlib renderer"""
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+
+        user = User.objects.create_user('jsonclient', 'jsonclient@example.com', 'jsonclientpass')
+        for n in range(5):
+            Job.objects.create(title=f'Job {n} ü', description='Description', budget=100 + n, client=user)
+        self.client.force_authenticate(user=user)
+
+        response = self.client.get(reverse('job-list'))
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        self.assertEqual(response.content, FastJSONRenderer().render(response.data))
+
+    def test_parser_matches_json_parser(self):
+        """Test parsed values and errors against DRF's JSONParser"""
+        from io import BytesIO
+        from rest_framework.exceptions import ParseError
+        from rest_framework.parsers import JSONParser
+        from .parsers import FastJSONParser
+
+        body = '{"title": "Café", "budget": "10.50", "tags": [1, 2.5, null, true], "nested": {"é": [-1e3]}}'
+        self.assertEqual(
+            FastJSONParser().parse(BytesIO(body.encode())),
+            JSONParser().parse(BytesIO(body.encode())),
+        )
+        for invalid in (b'{"a": NaN}', b'{"a": ', b''):
+            with self.subTest(body=invalid):
+                with self.assertRaises(ParseError):
+                    FastJSONParser().parse(BytesIO(invalid))
+
+    def test_json_request_creates_job(self):
+        """Test a JSON request body goes through the fast parser"""
+        user = User.objects.create_user('jsonposter', 'jsonposter@example.com', 'jsonposterpass')
+        self.client.force_authenticate(user=user)
+        response = self.client.post(reverse('job-list'), {
+            'title': 'JSON job', 'description': 'Posted as JSON', 'budget': '250.00',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['budget'], '250.00')
+
+
+class CompressionTests(APITestCase):
+    """Test negotiated brotli/gzip compression of API responses"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('compress', 'compress@example.com', 'compresspass123')
+        Job.objects.bulk_create([
+            Job(title=f'Job {n}', description='A fairly repetitive description ' * 5, budget=100, client=cls.user)
+            for n in range(30)
+        ])
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def test_gzip_when_requested(self):
+        """Test gzip is used when the client only accepts gzip"""
+        import gzip
+
+        plain = self.client.get(reverse('job-list'))
+        response = self.client.get(reverse('job-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_brotli_preferred(self):
+        """Test brotli wins over gzip when both are acceptable"""
+        from . import middleware
+
+        if middleware.brotli is None:
+            self.skipTest('Brotli is not installed')
+        plain = self.client.get(reverse('job-list'))
+        response = self.client.get(reverse('job-list'), HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(response.content), plain.content)
+
+    def test_small_and_unaccepted_responses_untouched(self):
+        """Test responses below the threshold or without a usable encoding stay plain"""
+        response = self.client.get(reverse('job-list'), HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        with override_settings(COMPRESSION_MIN_SIZE=10 ** 7):
+            response = self.client.get(reverse('job-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_accepted_encoding_weights(self):
+        """Test q-values and wildcards in Accept-Encoding"""
+        from .middleware import accepted_encoding
+
+        self.assertEqual(accepted_encoding('br;q=0, gzip'), 'gzip')
+        self.assertEqual(accepted_encoding('gzip;q=0, *;q=0'), None)
+        self.assertEqual(accepted_encoding(''), None)
+        self.assertEqual(accepted_encoding('*'), accepted_encoding('br, gzip'))
+
+
+class MediaServingTests(TestCase):
+    """Test local media serving with conditional and Range requests"""
+
+    def setUp(self):
+        from django.test import RequestFactory
+
+        self.factory = RequestFactory()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        os.makedirs(os.path.join(self.media_root, 'job_attachments'))
+        self.content = bytes(range(256)) * 40
+        with open(os.path.join(self.media_root, 'job_attachments', 'brief.pdf'), 'wb') as f:
+            f.write(self.content)
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT_PREFIX='', MEDIA_SENDFILE_HEADER='',
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def serve(self, path='job_attachments/brief.pdf', method='get', sig=None, **headers):
+        from .media import media_signature, serve_media
+
+        query = {'sig': media_signature(path) if sig is None else sig}
+        response = serve_media(getattr(self.factory, method)('/media/' + path, query, **headers), path)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_full_file_streamed_from_descriptor(self):
+        """Test a whole file is served from an open descriptor with validators"""
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(hasattr(response.file_to_stream, 'fileno'))
+        self.assertEqual(self.body(response), self.content)
+
+    def test_byte_ranges(self):
+        """Test explicit, open-ended and suffix ranges"""
+        for header, start, end in (('bytes=100-199', 100, 199), ('bytes=10000-', 10000, 10239),
+                                   ('bytes=-40', 10200, 10239), ('bytes=10200-99999', 10200, 10239)):
+            with self.subTest(range=header):
+                response = self.serve(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{len(self.content)}')
+                self.assertEqual(response['Content-Length'], str(end - start + 1))
+                self.assertEqual(self.body(response), self.content[start:end + 1])
+
+        response = self.serve(HTTP_RANGE='bytes=20000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_conditional_requests(self):
+        """Test If-None-Match and a stale If-Range"""
+        etag = self.serve()['ETag']
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code, 206)
+
+    def test_offloaded_to_front_server(self):
+        """Test X-Accel-Redirect and X-Sendfile responses carry no body"""
+        with override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self.serve()
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/job_attachments/brief.pdf')
+        self.assertEqual(response.content, b'')
+
+        with override_settings(MEDIA_SENDFILE_HEADER='X-Sendfile'):
+            response = self.serve()
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'job_attachments', 'brief.pdf'))
+
+    def test_missing_and_traversal_paths(self):
+        """Test missing files and paths outside MEDIA_ROOT are 404s"""
+        from django.http import Http404
+
+        for path in ('job_attachments/missing.pdf', '../settings.py', 'job_attachments'):
+            with self.subTest(path=path):
+                with self.assertRaises(Http404):
+                    self.serve(path)
+
+    def test_unsigned_paths_are_not_served(self):
+        """Test a known or guessed media path without its signature is a 404"""
+        from django.http import Http404
+        from .media import media_signature
+
+        for sig in ('', media_signature('job_attachments/other.pdf')):
+            with self.subTest(sig=sig):
+                with self.assertRaises(Http404):
+                    self.serve(sig=sig)
+
+    def test_api_returns_signed_media_urls(self):
+        """Test the attachment URLs the API hands out are the ones the media route serves"""
+        from django.core.files.base import ContentFile
+
+        owner = User.objects.create_user('mediaowner', 'mediaowner@example.com', 'mediapass123')
+        with override_settings(STORAGES=DISK_STORAGES):
+            job = Job.objects.create(title='Brief', description='x', budget=10, client=owner)
+            job.attachment.save('brief.txt', ContentFile(b'brief'), save=False)
+            Job.objects.filter(pk=job.pk).update(attachment=job.attachment.name)
+            client = APIClient()
+            client.force_authenticate(user=owner)
+            [row] = client.get(reverse('my-jobs')).data
+            self.assertEqual(row['attachment'], row['attachment_url'])
+            response = client.get(row['attachment_url'])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), b'brief')
+            response.close()
+            self.assertEqual(client.get(f'/media/{job.attachment.name}').status_code, 404)
+
+
+class SparseFieldsTests(APITestCase):
+    """Test ?fields= and ?omit= on the job and proposal list endpoints"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('sparseclient', 'sparseclient@example.com', 'sparsepass123')
+        cls.freelancer = User.objects.create_user('sparsefree', 'sparsefree@example.com', 'sparsepass123')
+        cls.freelancer.profile.is_freelancer = True
+        cls.freelancer.profile.save()
+        cls.job = Job.objects.create(title='Sparse job', description='Long description ' * 100,
+                                     budget=500, client=cls.client_user)
+        Proposal.objects.create(job=cls.job, freelancer=cls.freelancer, cover_letter='Cover ' * 100,
+                                bid_amount=450, delivery_time=5)
+
+    def get(self, url, user, **params):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        return response, ' '.join(query['sql'] for query in queries.captured_queries)
+
+    def test_fields_limits_payload_and_columns(self):
+        """Test only requested fields are returned and selected"""
+        response, sql = self.get(reverse('job-list'), self.client_user, fields='id,title,budget')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'id': self.job.id, 'title': 'Sparse job', 'budget': '500.00'}])
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('JOIN "auth_user"', sql)
+
+    def test_omit_drops_text_columns(self):
+        """Test omitted fields are removed from the response and the SELECT"""
+        response, sql = self.get(reverse('proposal-list'), self.freelancer, omit='cover_letter,freelancer_email')
+        row = response.data['results'][0]
+        self.assertNotIn('cover_letter', row)
+        self.assertNotIn('freelancer_email', row)
+        self.assertEqual(row['freelancer_name'], 'sparsefree')
+        self.assertNotIn('"cover_letter"', sql)
+
+        response, sql = self.get(reverse('job-proposals', args=[self.job.id]), self.client_user,
+                                 fields='id,status', omit='status')
+        self.assertEqual(response.data, [{'id': self.job.proposals.get().id}])
+
+    def test_full_response_unchanged(self):
+        """Test requests without the parameters get every field"""
+        response, _ = self.get(reverse('my-jobs'), self.client_user)
+        self.assertIn('description', response.data[0])
+        response, _ = self.get(reverse('my-jobs'), self.client_user, fields='')
+        self.assertIn('description', response.data[0])
+
+    def test_unknown_field_rejected(self):
+        """Test unknown field names return a 400 naming them"""
+        response, _ = self.get(reverse('job-list'), self.client_user, fields='id,password')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', str(response.data['fields']))
+
+
+class BatchAndDashboardTests(APITestCase):
+    """Test batch job lookup by id and the composite dashboard endpoint"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('dashclient', 'dashclient@example.com', 'dashpass123')
+        cls.other_client = User.objects.create_user('dashother', 'dashother@example.com', 'dashpass123')
+        cls.freelancers = []
+        for n in range(3):
+            freelancer = User.objects.create_user(f'dashfree{n}', f'dashfree{n}@example.com', 'dashpass123')
+            freelancer.profile.is_freelancer = True
+            freelancer.profile.save()
+            cls.freelancers.append(freelancer)
+        cls.jobs = [
+            Job.objects.create(title=f'Dash job {n}', description='Work', budget=100, client=cls.client_user)
+            for n in range(3)
+        ]
+        cls.inactive = Job.objects.create(title='Closed', description='Done', budget=50,
+                                          client=cls.other_client, is_active=False)
+
+    def add_proposals(self, job, statuses):
+        for freelancer, proposal_status in zip(self.freelancers, statuses):
+            Proposal.objects.create(job=job, freelancer=freelancer, cover_letter='Hi', bid_amount=80 + len(statuses),
+                                    delivery_time=3, status=proposal_status)
+
+    def test_batch_fetch_by_ids(self):
+        """Test ?ids= returns the visible jobs unpaginated in one query"""
+        self.client.force_authenticate(user=self.client_user)
+        ids = f'{self.jobs[0].id},{self.jobs[2].id},{self.inactive.id},999999'
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('job-list'), {'ids': ids})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(job['id'] for job in response.data), sorted([self.jobs[0].id, self.jobs[2].id]))
+
+        self.client.force_authenticate(user=self.other_client)
+        response = self.client.get(reverse('job-list'), {'ids': str(self.inactive.id)})
+        self.assertEqual([job['id'] for job in response.data], [self.inactive.id])
+
+    def test_batch_ids_validated(self):
+        """Test malformed and oversized id lists are rejected"""
+        self.client.force_authenticate(user=self.client_user)
+        response = self.client.get(reverse('job-list'), {'ids': '1,two'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('job-list'), {'ids': ','.join(str(n) for n in range(1, 102))})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_client_dashboard(self):
+        """Test job summaries and counts for a client in a fixed number of queries"""
+        self.add_proposals(self.jobs[0], ['pending', 'accepted', 'rejected'])
+        self.add_proposals(self.jobs[1], ['pending'])
+        self.client.force_authenticate(user=User.objects.get(pk=self.client_user.pk))
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user']['username'], 'dashclient')
+        self.assertEqual(response.data['counts'],
+                         {'jobs': 3, 'active_jobs': 3, 'proposals_received': 4, 'proposals_pending': 2})
+        summaries = {job['id']: job['proposals'] for job in response.data['jobs']}
+        self.assertEqual(summaries[self.jobs[0].id], {
+            'proposal_count': 3, 'pending': 1, 'accepted': 1, 'rejected': 1,
+            'lowest_bid': '83.00', 'average_bid': '83.00',
+        })
+        self.assertEqual(summaries[self.jobs[2].id]['proposal_count'], 0)
+        self.assertIsNone(summaries[self.jobs[2].id]['lowest_bid'])
+
+        for n in range(10):
+            job = Job.objects.create(title=f'More {n}', description='Work', budget=10, client=self.client_user)
+            self.add_proposals(job, ['pending', 'pending'])
+        self.client.force_authenticate(user=User.objects.get(pk=self.client_user.pk))
+        with self.assertNumQueries(3):
+            self.client.get(reverse('dashboard'))
+
+    def test_freelancer_dashboard(self):
+        """Test a freelancer sees their proposals and status counts"""
+        self.add_proposals(self.jobs[0], ['accepted'])
+        self.add_proposals(self.jobs[1], ['pending'])
+        self.client.force_authenticate(user=User.objects.get(pk=self.freelancers[0].pk))
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.data['counts'], {'proposals': 2, 'pending': 1, 'accepted': 1, 'rejected': 0})
+        self.assertEqual({p['job'] for p in response.data['proposals']}, {self.jobs[0].id, self.jobs[1].id})
+        self.assertNotIn('jobs', response.data)
+
+
+class FakeCloudinary:
+    """Local HTTP server answering Cloudinary API calls from a script of responses"""
+
+    def __init__(self):
+        import http.server
+        import threading
+
+        fake = self
+        self.responses = []
+        self.requests = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                fake.requests.append({'path': self.path, 'body': body, 'client': self.client_address})
+                code, payload = fake.responses.pop(0) if fake.responses else (200, {
+                    'public_id': 'flexilance/uploaded', 'secure_url': 'https://res.example.com/uploaded.png',
+                    'resource_type': 'image', 'result': 'ok',
+                })
+                data = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        # A short poll interval lets close() return without waiting half a second
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RemoteOnlyStorage(InMemoryStorage):
+    """Stand-in for MediaCloudinaryStorage: a write through it would be a remote upload"""
+
+    def _save(self, name, content):
+        raise AssertionError(f'{name} was sent through default_storage')
+
+
+class StorageGatewayTests(TestCase):
+    """Test Cloudinary calls through the pooled, retrying, circuit-broken gateway"""
+
+    def setUp(self):
+        import cloudinary
+        from . import storage_gateway
+
+        self.storage_gateway = storage_gateway
+        self.fake = FakeCloudinary()
+        self.addCleanup(self.fake.close)
+
+        config = cloudinary.config()
+        saved = {key: getattr(config, key, None) for key in ('upload_prefix', 'cloud_name', 'api_key', 'api_secret')}
+        cloudinary.config(upload_prefix=self.fake.url, cloud_name='demo', api_key='key', api_secret='secret')
+        self.addCleanup(lambda: cloudinary.config(**saved))
+        storage_gateway.reset_gateway()
+        self.addCleanup(storage_gateway.reset_gateway)
+
+        self.now = [1000.0]
+        self.sleeps = []
+
+    def gateway(self, **kwargs):
+        breaker = self.storage_gateway.CircuitBreaker(
+            failure_threshold=kwargs.pop('threshold', 2), reset_timeout=30, clock=lambda: self.now[0],
+        )
+        return self.storage_gateway.StorageGateway(breaker=breaker, sleep=self.sleeps.append, **kwargs)
+
+    def upload_file_obj(self, name='logo.png'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        return SimpleUploadedFile(name, b'fake image bytes', content_type='image/png')
+
+    def test_signed_upload_reuses_connection(self):
+        """Test uploads are signed, carry the file and share one keep-alive connection"""
+        gateway = self.gateway()
+        result = gateway.upload(self.upload_file_obj(), folder='jobs')
+        gateway.upload(self.upload_file_obj())
+
+        self.assertEqual(result['public_id'], 'flexilance/uploaded')
+        self.assertEqual(self.fake.requests[0]['path'], '/v1_1/demo/image/upload')
+        body = self.fake.requests[0]['body']
+        for part in (b'name="signature"', b'name="api_key"', b'jobs', b'filename="logo.png"', b'fake image bytes'):
+            self.assertIn(part, body)
+        self.assertEqual(len({request['client'] for request in self.fake.requests}), 1)
+
+    def test_transient_errors_retried_with_jitter(self):
+        """Test 503/429 responses are retried with bounded, jittered backoff"""
+        self.fake.responses = [(503, {}), (429, {})]
+        result = self.gateway(retries=2, backoff=0.5).upload(self.upload_file_obj())
+
+        self.assertEqual(result['resource_type'], 'image')
+        self.assertEqual(len(self.fake.requests), 3)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertTrue(0 <= self.sleeps[0] <= 0.5 and 0 <= self.sleeps[1] <= 1.0)
+        self.assertIn(b'fake image bytes', self.fake.requests[2]['body'])
+
+    def test_rejected_request_not_retried(self):
+        """Test an API error is raised at once and does not count against the circuit"""
+        self.fake.responses = [(400, {'error': {'message': 'Invalid image file'}})] * 3
+        gateway = self.gateway(retries=2, threshold=1)
+        for _ in range(2):
+            with self.assertRaisesMessage(self.storage_gateway.StorageGatewayError, 'Invalid image file'):
+                gateway.upload(self.upload_file_obj())
+        self.assertEqual(len(self.fake.requests), 2)
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_circuit_opens_and_recovers(self):
+        """Test failures open the circuit, calls short-circuit, and a trial call closes it"""
+        self.fake.responses = [(500, {})] * 2
+        gateway = self.gateway(retries=0, threshold=2)
+        for _ in range(2):
+            with self.assertRaises(self.storage_gateway.StorageGatewayError):
+                gateway.upload(self.upload_file_obj())
+
+        with self.assertRaises(self.storage_gateway.CircuitOpenError):
+            gateway.upload(self.upload_file_obj())
+        self.assertEqual(len(self.fake.requests), 2)
+
+        self.now[0] += 31
+        self.assertEqual(gateway.breaker.state, 'half-open')
+        self.assertTrue(gateway.destroy('flexilance/uploaded'))
+        self.assertEqual(gateway.breaker.state, 'closed')
+        self.assertEqual(self.fake.requests[-1]['path'], '/v1_1/demo/image/destroy')
+
+    def test_upload_file_falls_back_without_waiting(self):
+        """Test upload_file uses local storage at once while the circuit is open"""
+        from .storage_utils import upload_file
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.fake.responses = [(502, {})] * 5
+        with override_settings(CLOUDINARY_ENABLED=True, MEDIA_ROOT=media_root, STORAGES=DISK_STORAGES, STORAGE_RETRIES=0,
+                               STORAGE_CIRCUIT_THRESHOLD=1):
+            first = upload_file(self.upload_file_obj('a.png'), folder='jobs')
+            second = upload_file(self.upload_file_obj('b.png'), folder='jobs')
+
+        self.assertEqual(len(self.fake.requests), 1)
+        for result in (first, second):
+            self.assertEqual(result['storage_backend'], 'local')
+            with open(os.path.join(media_root, result['filename']), 'rb') as f:
+                self.assertEqual(f.read(), b'fake image bytes')
+
+    def test_fallback_writes_to_disk_not_cloudinary_storage(self):
+        """Test an open circuit sends uploads to MEDIA_ROOT, not through Cloudinary's default_storage"""
+        from .media import signed_media_url
+        from .storage_utils import field_file_url, ingest_file
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        owner = User.objects.create_user('fallbackowner', 'fallbackowner@example.com', 'fallbackpass123')
+        remote_storages = {**DISK_STORAGES, 'default': {'BACKEND': 'core.tests.RemoteOnlyStorage'}}
+        self.fake.responses = [(502, {})]
+        with override_settings(CLOUDINARY_ENABLED=True, MEDIA_ROOT=media_root, STORAGES=remote_storages,
+                               STORAGE_RETRIES=0, STORAGE_CIRCUIT_THRESHOLD=1):
+            ingest_file(self.upload_file_obj('tripped.png'), folder='jobs')
+            self.assertEqual(self.storage_gateway.get_gateway().breaker.state, 'open')
+
+            name = ingest_file(self.upload_file_obj('brief.png'), folder='jobs')
+            job = Job.objects.create(title='Fallback', description='x', budget=10, client=owner, attachment=name)
+            url = field_file_url(job.attachment)
+
+        self.assertEqual(len(self.fake.requests), 1)
+        self.assertTrue(name.startswith('local/jobs/'))
+        self.assertEqual(url, signed_media_url(f'/media/{name}', name))
+        with open(os.path.join(media_root, name), 'rb') as f:
+            self.assertEqual(f.read(), b'fake image bytes')
+
+
+class SingleWriteUploadTests(APITestCase):
+    """Test that every uploaded attachment is written to storage exactly once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('writeclient', 'writeclient@example.com', 'writepass123')
+        cls.freelancer = User.objects.create_user('writefree', 'writefree@example.com', 'writepass123')
+        cls.freelancer.profile.is_freelancer = True
+        cls.freelancer.profile.save()
+
+    def setUp(self):
+        from unittest import mock
+        from django.core.files.storage import FileSystemStorage
+
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, STORAGES=DISK_STORAGES)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        patcher = mock.patch.object(FileSystemStorage, 'save', autospec=True, side_effect=FileSystemStorage.save)
+        self.save = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, name, content=b'attachment body'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        return SimpleUploadedFile(name, content, content_type='text/plain')
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root).replace(os.sep, '/')
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_job_and_proposal_attachments_written_once(self):
+        """Test job and proposal creation each perform one storage write"""
+        self.client.force_authenticate(user=self.client_user)
+        response = self.client.post(reverse('job-list'), {
+            'title': 'With brief', 'description': 'See attached', 'budget': '300.00',
+            'attachment': self.upload('brief.txt'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.save.call_count, 1)
+        job = Job.objects.get(id=response.data['id'])
+        self.assertEqual(job.attachment.name, 'jobs/brief.txt')
+
+        self.client.force_authenticate(user=self.freelancer)
+        response = self.client.post(reverse('proposal-list'), {
+            'job': job.id, 'cover_letter': 'Hello', 'bid_amount': '250.00', 'delivery_time': 4,
+            'proposal_attachment': self.upload('portfolio.txt'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.save.call_count, 2)
+        self.assertEqual(self.stored_files(), ['jobs/brief.txt', 'proposals/portfolio.txt'])
+        with open(os.path.join(self.media_root, 'proposals', 'portfolio.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'attachment body')
+
+    def test_serializer_update_and_profile_picture_written_once(self):
+        """Test updates and the profile picture endpoint perform one write each"""
+        from .serializers import JobSerializer
+
+        job = Job.objects.create(title='Update me', description='x', budget=10, client=self.client_user)
+        serializer = JobSerializer(job, data={'attachment': self.upload('v2.txt')}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(self.save.call_count, 1)
+
+        self.client.force_authenticate(user=self.freelancer)
+        response = self.client.patch(reverse('update-profile-picture'), {
+            'profile_picture': self.upload('me.png', b'png bytes'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.save.call_count, 2)
+        self.assertEqual(self.stored_files(), ['jobs/v2.txt', 'profiles/me.png'])
+
+    def test_cloudinary_upload_not_repeated_locally(self):
+        """Test a Cloudinary upload is stored by public ID without a second local write"""
+        import cloudinary
+        from . import storage_gateway
+
+        fake = FakeCloudinary()
+        self.addCleanup(fake.close)
+        config = cloudinary.config()
+        saved = {key: getattr(config, key, None) for key in ('upload_prefix', 'cloud_name', 'api_key', 'api_secret')}
+        cloudinary.config(upload_prefix=fake.url, cloud_name='demo', api_key='key', api_secret='secret')
+        self.addCleanup(lambda: cloudinary.config(**saved))
+        storage_gateway.reset_gateway()
+        self.addCleanup(storage_gateway.reset_gateway)
+
+        self.client.force_authenticate(user=self.client_user)
+        with override_settings(CLOUDINARY_ENABLED=True):
+            response = self.client.post(reverse('job-list'), {
+                'title': 'Remote brief', 'description': 'See attached', 'budget': '300.00',
+                'attachment': self.upload('brief.txt'),
+            }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(fake.requests), 1)
+        self.assertEqual(self.save.call_count, 0)
+        self.assertEqual(Job.objects.get(id=response.data['id']).attachment.name, 'flexilance/uploaded')
+
+
+class MediaCleanupTests(TestCase):
+    """Test deletion hooks and the gc_media command"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mediaowner', 'mediaowner@example.com', 'mediapass123')
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, STORAGES=DISK_STORAGES, CLOUDINARY_ENABLED=False,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def write(self, name, content=b'x' * 100, age=None):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        if age is not None:
+            import time
+            stamp = time.time() - age
+            os.utime(path, (stamp, stamp))
+        return name
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.media_root, name))
+
+    def test_replaced_and_deleted_files_removed_after_commit(self):
+        """Test files are deleted when replaced or when their row (or its user) is deleted"""
+        profile = Profile.objects.get(user=self.user)
+        profile.profile_picture = self.write('profiles/old.png')
+        profile.save()
+        job = Job.objects.create(title='T', description='D', budget=1, client=self.user,
+                                 attachment=self.write('jobs/brief.txt'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = Profile.objects.get(user=self.user)
+            profile.profile_picture = self.write('profiles/new.png')
+            profile.save()
+        self.assertFalse(self.exists('profiles/old.png'))
+        self.assertTrue(self.exists('profiles/new.png'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Job.objects.get(id=job.id).save()
+        self.assertTrue(self.exists('jobs/brief.txt'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(id=self.user.id).delete()
+        self.assertFalse(self.exists('jobs/brief.txt'))
+        self.assertFalse(self.exists('profiles/new.png'))
+
+    def test_fallback_files_deleted_locally_with_cloudinary_enabled(self):
+        """Test files the local fallback wrote are deleted from disk, not sent to Cloudinary"""
+        from unittest import mock
+
+        remote_storages = {**DISK_STORAGES, 'default': {'BACKEND': 'core.tests.RemoteOnlyStorage'}}
+        job = Job.objects.create(title='T', description='D', budget=1, client=self.user,
+                                 attachment=self.write('local/jobs/brief.txt'))
+        with override_settings(CLOUDINARY_ENABLED=True, STORAGES=remote_storages), \
+                mock.patch('core.storage_utils.get_gateway') as gateway:
+            with self.captureOnCommitCallbacks(execute=True):
+                Job.objects.get(id=job.id).delete()
+        self.assertFalse(self.exists('local/jobs/brief.txt'))
+        gateway.assert_not_called()
+
+        self.write('local/jobs/orphan.txt', age=2 * 86400)
+        out = StringIO()
+        call_command('gc_media', '--backend', 'local', stdout=out)
+        self.assertFalse(self.exists('local/jobs/orphan.txt'))
+
+    def test_rolled_back_delete_keeps_file(self):
+        """Test nothing is deleted when the transaction rolls back"""
+        from django.db import transaction
+
+        job = Job.objects.create(title='T', description='D', budget=1, client=self.user,
+                                 attachment=self.write('jobs/keep.txt'))
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    job.delete()
+                    raise RuntimeError('abort')
+            except RuntimeError:
+                pass
+        self.assertTrue(self.exists('jobs/keep.txt'))
+
+    def test_gc_media_deletes_only_old_orphans(self):
+        """Test gc_media keeps referenced and recent files and reports reclaimed bytes"""
+        Job.objects.create(title='T', description='D', budget=1, client=self.user,
+                           attachment=self.write('jobs/live.txt', age=7200))
+        for n in range(5):
+            self.write(f'proposals/2024/orphan{n}.txt', b'y' * 1000, age=7200)
+        self.write('profiles/fresh.png', age=60)
+        self.write('unrelated/keep.txt', age=7200)
+
+        out = StringIO()
+        call_command('gc_media', '--backend', 'local', '--min-age', '1', '--dry-run', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['orphaned'], 5)
+        self.assertTrue(self.exists('proposals/2024/orphan0.txt'))
+
+        out = StringIO()
+        call_command('gc_media', '--backend', 'local', '--min-age', '1', '--batch-size', '2',
+                     '--workers', '3', '--json', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['scanned'], 7)
+        self.assertEqual(report['referenced'], 1)
+        self.assertEqual(report['too_recent'], 1)
+        self.assertEqual(report['deleted'], 5)
+        self.assertEqual(report['reclaimed_bytes'], 5000)
+        self.assertTrue(self.exists('jobs/live.txt'))
+        self.assertTrue(self.exists('profiles/fresh.png'))
+        self.assertTrue(self.exists('unrelated/keep.txt'))
+        self.assertFalse(self.exists('proposals/2024/orphan3.txt'))
+
+
+class DirectUploadTests(APITestCase):
+    """Test signed upload tickets, the local receiver and confirmation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('directclient', 'directclient@example.com', 'directpass123')
+        cls.other = User.objects.create_user('directother', 'directother@example.com', 'directpass123')
+        cls.job = Job.objects.create(title='Direct', description='x', budget=10, client=cls.client_user)
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, STORAGES=DISK_STORAGES, CLOUDINARY_ENABLED=False,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def issue(self, target='job_attachment', filename='brief.txt', user=None, **extra):
+        self.client.force_authenticate(user=user or self.client_user)
+        return self.client.post(reverse('upload-ticket'), {'target': target, 'filename': filename, **extra})
+
+    def put(self, url, body):
+        return self.client.generic('PUT', url, body, content_type='application/octet-stream')
+
+    def test_local_upload_flow(self):
+        """Test issuing, uploading and confirming a job attachment"""
+        response = self.issue(size=11)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['method'], 'PUT')
+        self.assertTrue(response.data['url'].startswith('http://testserver/api/uploads/receive/'))
+        name = response.data['name']
+        self.assertRegex(name, r'^jobs/[0-9a-f]{32}_brief\.txt$')
+
+        self.client.force_authenticate(user=None)
+        upload = self.put(response.data['url'], b'hello world')
+        self.assertEqual(upload.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(upload.json(), {'name': name, 'size': 11})
+        with open(os.path.join(self.media_root, name), 'rb') as f:
+            self.assertEqual(f.read(), b'hello world')
+
+        self.client.force_authenticate(user=self.client_user)
+        confirm = self.client.post(reverse('upload-confirm'), {
+            'ticket': response.data['ticket'], 'object_id': self.job.id,
+        })
+        self.assertEqual(confirm.status_code, status.HTTP_200_OK)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.attachment.name, name)
+
+    def test_ticket_cannot_be_reused(self):
+        """Test a second upload on the same ticket is refused"""
+        response = self.issue()
+        self.assertEqual(self.put(response.data['url'], b'first').status_code, status.HTTP_201_CREATED)
+        second = self.put(response.data['url'], b'second')
+        self.assertEqual(second.status_code, status.HTTP_400_BAD_REQUEST)
+        with open(os.path.join(self.media_root, response.data['name']), 'rb') as f:
+            self.assertEqual(f.read(), b'first')
+
+    def test_size_limits(self):
+        """Test declared and actual sizes are checked against UPLOAD_MAX_SIZE"""
+        with override_settings(UPLOAD_MAX_SIZE=8):
+            self.assertEqual(self.issue(size=9).status_code, status.HTTP_400_BAD_REQUEST)
+            response = self.issue()
+            upload = self.put(response.data['url'], b'far too long')
+        self.assertEqual(upload.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, response.data['name'])))
+
+    def test_invalid_requests(self):
+        """Test unknown targets and non-image profile pictures are rejected"""
+        self.assertEqual(self.issue(target='avatar').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.issue(target='profile_picture', filename='cv.docx').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.issue(filename='').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tampered_and_expired_tickets(self):
+        """Test the receiver and confirm reject bad or expired tickets"""
+        import time
+        from unittest import mock
+
+        response = self.issue()
+        ticket = response.data['ticket']
+        tampered = reverse('upload-receive', args=[ticket[:-2] + 'xx'])
+        self.assertEqual(self.put(tampered, b'data').status_code, status.HTTP_400_BAD_REQUEST)
+
+        later = time.time() + 3600
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            expired = self.put(response.data['url'], b'data')
+        self.assertEqual(expired.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expired', expired.json()['error'])
+
+    def test_confirm_checks_ownership(self):
+        """Test tickets are bound to their user and jobs to their client"""
+        response = self.issue()
+        self.put(response.data['url'], b'data')
+
+        self.client.force_authenticate(user=self.other)
+        confirm = self.client.post(reverse('upload-confirm'), {
+            'ticket': response.data['ticket'], 'object_id': self.job.id,
+        })
+        self.assertEqual(confirm.status_code, status.HTTP_400_BAD_REQUEST)
+
+        other_job = Job.objects.create(title='Not mine', description='x', budget=10, client=self.other)
+        self.client.force_authenticate(user=self.client_user)
+        confirm = self.client.post(reverse('upload-confirm'), {
+            'ticket': response.data['ticket'], 'object_id': other_job.id,
+        })
+        self.assertEqual(confirm.status_code, status.HTTP_400_BAD_REQUEST)
+        other_job.refresh_from_db()
+        self.assertFalse(other_job.attachment)
+
+    def test_confirm_requires_uploaded_file(self):
+        """Test confirming before the upload arrived fails"""
+        response = self.issue()
+        confirm = self.client.post(reverse('upload-confirm'), {
+            'ticket': response.data['ticket'], 'object_id': self.job.id,
+        })
+        self.assertEqual(confirm.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ticket_confirmed_once(self):
+        """Test a ticket's file cannot be attached again, to the same or another object"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .uploads import purge_confirmed
+
+        response = self.issue()
+        self.put(response.data['url'], b'data')
+        second_job = Job.objects.create(title='Second', description='x', budget=10, client=self.client_user)
+        self.client.force_authenticate(user=self.client_user)
+
+        first = self.client.post(reverse('upload-confirm'), {'ticket': response.data['ticket'], 'object_id': self.job.id})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        for job in (self.job, second_job):
+            again = self.client.post(reverse('upload-confirm'), {'ticket': response.data['ticket'], 'object_id': job.id})
+            self.assertEqual(again.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('already been confirmed', again.data['error'])
+        second_job.refresh_from_db()
+        self.assertFalse(second_job.attachment)
+
+        self.assertEqual(purge_confirmed(), 0)
+        self.assertEqual(purge_confirmed(now=timezone.now() + timedelta(days=1)), 1)
+
+    def test_confirm_validates_profile_picture_content(self):
+        """Test a local profile picture that is not an image is refused and deleted"""
+        import io
+        from PIL import Image
+
+        response = self.issue(target='profile_picture', filename='me.png')
+        self.put(response.data['url'], b'not an image at all')
+        confirm = self.client.post(reverse('upload-confirm'), {'ticket': response.data['ticket']})
+        self.assertEqual(confirm.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('not a valid image', confirm.data['error'])
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, response.data['name'])))
+
+        image = io.BytesIO()
+        Image.new('RGB', (2, 2)).save(image, 'PNG')
+        response = self.issue(target='profile_picture', filename='me.png')
+        self.put(response.data['url'], image.getvalue())
+        confirm = self.client.post(reverse('upload-confirm'), {'ticket': response.data['ticket']})
+        self.assertEqual(confirm.status_code, status.HTTP_200_OK)
+
+    def fake_cloudinary(self):
+        import cloudinary
+        from . import storage_gateway
+
+        fake = FakeCloudinary()
+        self.addCleanup(fake.close)
+        config = cloudinary.config()
+        saved = {key: getattr(config, key, None) for key in ('upload_prefix', 'cloud_name', 'api_key', 'api_secret')}
+        cloudinary.config(upload_prefix=fake.url, cloud_name='demo', api_key='key', api_secret='secret')
+        self.addCleanup(lambda: cloudinary.config(**saved))
+        storage_gateway.reset_gateway()
+        self.addCleanup(storage_gateway.reset_gateway)
+        return fake
+
+    def test_cloudinary_confirm_checks_resource_exists(self):
+        """Test Cloudinary confirms ask the API for the raw resource before attaching it"""
+        fake = self.fake_cloudinary()
+
+        with override_settings(CLOUDINARY_ENABLED=True):
+            response = self.issue()
+            fake.responses = [
+                (404, {'error': {'message': 'Resource not found'}}),
+                (200, {'public_id': response.data['name'], 'resource_type': 'raw', 'bytes': 11}),
+            ]
+            missing = self.client.post(reverse('upload-confirm'), {
+                'ticket': response.data['ticket'], 'object_id': self.job.id,
+            })
+            found = self.client.post(reverse('upload-confirm'), {
+                'ticket': response.data['ticket'], 'object_id': self.job.id,
+            })
+
+        self.assertEqual(missing.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('not been uploaded', missing.data['error'])
+        self.assertEqual(found.status_code, status.HTTP_200_OK)
+        self.assertEqual([request['path'] for request in fake.requests], ['/v1_1/demo/raw/explicit'] * 2)
+        self.assertRegex(response.data['name'], r'^raw/jobs/[0-9a-f]{32}_brief\.txt$')
+        self.assertIn(response.data['name'].encode(), fake.requests[0]['body'])
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.attachment.name, response.data['name'])
+
+    def test_cloudinary_confirm_enforces_limits(self):
+        """Test oversized or wrong-format Cloudinary uploads are destroyed, not attached"""
+        fake = self.fake_cloudinary()
+
+        with override_settings(CLOUDINARY_ENABLED=True, UPLOAD_MAX_SIZE=100):
+            oversized = self.issue(target='profile_picture', filename='me.png')
+            wrong_type = self.issue(target='profile_picture', filename='me.png')
+            fake.responses = [
+                (200, {'public_id': oversized.data['name'], 'format': 'png', 'bytes': 101}),
+                (200, {'result': 'ok'}),
+                (200, {'public_id': wrong_type.data['name'], 'format': 'pdf', 'bytes': 10}),
+                (200, {'result': 'ok'}),
+            ]
+            too_big = self.client.post(reverse('upload-confirm'), {'ticket': oversized.data['ticket']})
+            not_image = self.client.post(reverse('upload-confirm'), {'ticket': wrong_type.data['ticket']})
+
+        self.assertEqual(too_big.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('at most 100 bytes', too_big.data['error'])
+        self.assertEqual(not_image.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("'pdf' is not allowed", not_image.data['error'])
+        self.assertEqual([request['path'] for request in fake.requests], [
+            '/v1_1/demo/image/explicit', '/v1_1/demo/image/destroy',
+        ] * 2)
+        self.assertFalse(Profile.objects.filter(user=self.client_user).exclude(profile_picture='').exists())
+
+    def test_cloudinary_ticket_is_signed_upload(self):
+        """Test Cloudinary tickets carry a signed direct upload for the storage name"""
+        import cloudinary
+        from cloudinary import utils
+
+        config = cloudinary.config()
+        saved = {key: getattr(config, key, None) for key in ('cloud_name', 'api_key', 'api_secret')}
+        cloudinary.config(cloud_name='demo', api_key='key', api_secret='secret')
+        self.addCleanup(lambda: cloudinary.config(**saved))
+
+        with override_settings(CLOUDINARY_ENABLED=True):
+            response = self.issue(target='profile_picture', filename='me.png')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['method'], 'POST')
+        self.assertIn('/demo/image/upload', response.data['url'])
+        fields = response.data['fields']
+        self.assertRegex(fields['public_id'], r'^profiles/[0-9a-f]{32}$')
+        self.assertEqual(fields['public_id'], response.data['name'])
+        self.assertEqual(fields['api_key'], 'key')
+        self.assertEqual(fields['allowed_formats'], 'jpg,jpeg,png,gif,webp')
+        expected = utils.api_sign_request({
+            'public_id': fields['public_id'], 'timestamp': fields['timestamp'],
+            'allowed_formats': fields['allowed_formats'],
+        }, 'secret')
+        self.assertEqual(fields['signature'], expected)
+
+        with override_settings(CLOUDINARY_ENABLED=True):
+            response = self.issue(filename='brief.pdf')
+        self.assertIn('/demo/raw/upload', response.data['url'])
+        self.assertRegex(response.data['fields']['public_id'], r'^raw/jobs/[0-9a-f]{32}_brief\.pdf$')
+
+
+class JobExpiryTests(TestCase):
+    """Test the scheduler's task leases and the job expiry sweep"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('expiryclient', 'expiryclient@example.com', 'expirypass123')
+
+    def setUp(self):
+        from django.utils import timezone
+
+        self.now = timezone.now()
+
+    def make_job(self, title, hours=None, is_active=True):
+        import datetime
+
+        deadline = self.now + datetime.timedelta(hours=hours) if hours is not None else None
+        return Job.objects.create(
+            title=title, description='x', budget=10, client=self.user, deadline=deadline, is_active=is_active,
+        )
+
+    def test_expire_jobs_in_chunks(self):
+        """Test only active jobs past their deadline are deactivated, a chunk per UPDATE"""
+        from .tasks import expire_jobs
+
+        expired = [self.make_job(f'Expired {i}', hours=-i - 1) for i in range(5)]
+        future = self.make_job('Future', hours=1)
+        open_ended = self.make_job('No deadline')
+        self.make_job('Already closed', hours=-1, is_active=False)
+
+        # Three chunks of at most 2 jobs: a SELECT and an UPDATE each
+        with self.assertNumQueries(6):
+            self.assertEqual(expire_jobs(now=self.now, batch_size=2), 5)
+        self.assertEqual(expire_jobs(now=self.now, batch_size=2), 0)
+
+        self.assertFalse(Job.objects.filter(id__in=[job.id for job in expired], is_active=True).exists())
+        self.assertEqual(Job.objects.filter(id__in=[future.id, open_ended.id], is_active=True).count(), 2)
+        self.assertEqual(Job.objects.get(id=expired[0].id).updated_at, self.now)
+
+    def test_listing_hides_jobs_past_deadline(self):
+        """Test the job list drops expired jobs before the sweep has run"""
+        self.make_job('Expired', hours=-1)
+        self.make_job('Future', hours=1)
+        self.make_job('No deadline')
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get(reverse('job-list'))
+        self.assertEqual(sorted(job['title'] for job in response.data['results']), ['Future', 'No deadline'])
+
+    def test_lease_lets_one_process_run(self):
+        """Test a task lease is granted once per interval"""
+        import datetime
+        from .scheduler import acquire
+        from .models import TaskLock
+
+        self.assertTrue(acquire('sweep', 60, now=self.now, owner='worker-1'))
+        self.assertFalse(acquire('sweep', 60, now=self.now, owner='worker-2'))
+        later = self.now + datetime.timedelta(seconds=59)
+        self.assertFalse(acquire('sweep', 60, now=later, owner='worker-2'))
+        self.assertEqual(TaskLock.objects.get(name='sweep').owner, 'worker-1')
+
+        later = self.now + datetime.timedelta(seconds=60)
+        self.assertTrue(acquire('sweep', 60, now=later, owner='worker-2'))
+        self.assertEqual(TaskLock.objects.get(name='sweep').owner, 'worker-2')
+
+    def test_run_due_runs_registered_tasks(self):
+        """Test due tasks run once, failures are counted and leases are kept"""
+        import datetime
+        from unittest import mock
+        from . import metrics, scheduler
+        from .models import TaskLock
+
+        calls = []
+
+        def failing():
+            raise RuntimeError('boom')
+
+        tasks = {
+            'ok-task': scheduler.PeriodicTask('ok-task', 60, lambda: calls.append('ok')),
+            'bad-task': scheduler.PeriodicTask('bad-task', lambda: 60, failing),
+        }
+        with mock.patch.dict(scheduler.TASKS, tasks, clear=True), self.assertLogs('core.scheduler', 'ERROR'):
+            self.assertEqual(scheduler.run_due(now=self.now), ['ok-task', 'bad-task'])
+            self.assertEqual(scheduler.run_due(now=self.now + datetime.timedelta(seconds=30)), [])
+        self.assertEqual(calls, ['ok'])
+        self.assertIsNotNone(TaskLock.objects.get(name='bad-task').last_run_at)
+        self.assertIn('flexilance_task_runs_total{task="bad-task",outcome="error"} 1', metrics.render())
+
+    def test_expire_jobs_command(self):
+        """Test the expire_jobs management command"""
+        self.make_job('Expired', hours=-1)
+        out = StringIO()
+        call_command('expire_jobs', stdout=out)
+        self.assertIn('Expired 1 jobs', out.getvalue())
+        self.assertFalse(Job.objects.filter(is_active=True).exists())
+
+
+class ArchiveTests(APITestCase):
+    """Test archiving closed jobs and reading them back through history views"""
+
+    @classmethod
+    def setUpTestData(cls):
+        import datetime
+        from django.utils import timezone
+
+        cls.client_user = User.objects.create_user('archiveclient', 'archiveclient@example.com', 'archivepass123')
+        cls.freelancer = User.objects.create_user('archivefree', 'archivefree@example.com', 'archivepass123')
+        cls.freelancer.profile.is_freelancer = True
+        cls.freelancer.profile.save()
+
+        cls.old = []
+        for i in range(3):
+            job = Job.objects.create(
+                title=f'Closed {i}', description='x', budget=100, client=cls.client_user, is_active=False,
+            )
+            Proposal.objects.create(
+                job=job, freelancer=cls.freelancer, cover_letter='Hi', bid_amount=90, delivery_time=3,
+                status='rejected',
+            )
+            cls.old.append(job)
+        cls.recent_closed = Job.objects.create(
+            title='Recently closed', description='x', budget=100, client=cls.client_user, is_active=False,
+        )
+        cls.live = Job.objects.create(title='Open', description='x', budget=100, client=cls.client_user)
+        Proposal.objects.create(job=cls.live, freelancer=cls.freelancer, cover_letter='Hi', bid_amount=80,
+                                delivery_time=2)
+        long_ago = timezone.now() - datetime.timedelta(days=120)
+        Job.objects.filter(id__in=[job.id for job in cls.old]).update(updated_at=long_ago)
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, STORAGES=DISK_STORAGES, CLOUDINARY_ENABLED=False,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_archive_moves_closed_jobs_in_batches(self):
+        """Test old inactive jobs and their proposals move, in bounded batches"""
+        from .archive import archive_jobs
+        from .models import ArchivedJob, ArchivedProposal
+
+        self.assertEqual(archive_jobs(dry_run=True).jobs, 3)
+        self.assertEqual(Job.objects.count(), 5)
+
+        report = archive_jobs(batch_size=2, max_batches=1)
+        self.assertEqual((report.batches, report.jobs, report.proposals), (1, 2, 2))
+        report = archive_jobs(batch_size=2)
+        self.assertEqual((report.batches, report.jobs, report.proposals), (1, 1, 1))
+
+        self.assertEqual(sorted(ArchivedJob.objects.values_list('id', flat=True)), [job.id for job in self.old])
+        self.assertEqual(ArchivedProposal.objects.count(), 3)
+        self.assertEqual(set(Job.objects.values_list('title', flat=True)), {'Recently closed', 'Open'})
+        self.assertEqual(Proposal.objects.count(), 1)
+        archived = ArchivedJob.objects.get(id=self.old[0].id)
+        self.assertEqual((archived.title, archived.client, archived.budget), ('Closed 0', self.client_user, 100))
+
+    def test_jobs_with_open_contracts_or_recent_threads_stay_live(self):
+        """Test archiving skips jobs whose proposals still have an active contract or a recent thread"""
+        import datetime
+        from django.utils import timezone
+        from .archive import archive_jobs
+        from .models import Contract
+
+        contracted, talking, done = (job.proposals.get() for job in self.old)
+        Contract.objects.create(
+            proposal=contracted, title='Work', client=self.client_user, freelancer=self.freelancer, amount=90,
+        )
+        Thread.objects.create(
+            proposal=talking, subject='Chat', client=self.client_user, freelancer=self.freelancer,
+            last_message_at=timezone.now(),
+        )
+        Contract.objects.create(
+            proposal=done, title='Done', client=self.client_user, freelancer=self.freelancer, amount=90,
+            status='completed',
+        )
+        Thread.objects.create(
+            proposal=done, subject='Old chat', client=self.client_user, freelancer=self.freelancer,
+            last_message_at=timezone.now() - datetime.timedelta(days=200),
+        )
+
+        report = archive_jobs()
+        self.assertEqual((report.jobs, report.proposals), (1, 1))
+        self.assertEqual(set(Job.objects.filter(is_active=False).values_list('title', flat=True)),
+                         {'Closed 0', 'Closed 1', 'Recently closed'})
+        self.assertEqual(Proposal.objects.filter(id__in=[contracted.id, talking.id]).count(), 2)
+
+    def test_archived_attachments_are_kept(self):
+        """Test archiving keeps stored files and gc_media treats them as referenced"""
+        from django.core.files.base import ContentFile
+        from .archive import archive_jobs
+        from .media_gc import list_local, referenced_names
+
+        job = self.old[0]
+        job.attachment.save('brief.txt', ContentFile(b'brief'), save=False)
+        Job.objects.filter(id=job.id).update(attachment=job.attachment.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_jobs()
+
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, job.attachment.name)))
+        names = [stored.name for stored in list_local(['jobs'])]
+        self.assertEqual(referenced_names(names), {job.attachment.name})
+
+    def test_history_views_include_archived_rows(self):
+        """Test my-jobs, job proposals and the proposal list read archived rows"""
+        from .archive import archive_jobs
+
+        archive_jobs()
+        self.client.force_authenticate(user=self.client_user)
+        response = self.client.get(reverse('my-jobs'))
+        self.assertEqual(
+            [job['title'] for job in response.data],
+            ['Open', 'Recently closed', 'Closed 2', 'Closed 1', 'Closed 0'],
+        )
+        response = self.client.get(reverse('my-jobs'), {'fields': 'title'})
+        self.assertEqual(
+            response.data,
+            [{'title': title} for title in ['Open', 'Recently closed', 'Closed 2', 'Closed 1', 'Closed 0']],
+        )
+
+        response = self.client.get(reverse('job-proposals', args=[self.old[1].id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(p['job_title'], p['status']) for p in response.data], [('Closed 1', 'rejected')])
+
+        self.client.force_authenticate(user=self.freelancer)
+        response = self.client.get(reverse('proposal-list'))
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(response.data['results'][0]['job_title'], 'Open')
+        response = self.client.get(reverse('job-proposals', args=[self.old[1].id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_archive_command(self):
+        """Test the archive_jobs management command"""
+        out = StringIO()
+        call_command('archive_jobs', '--dry-run', stdout=out)
+        self.assertIn('Would archive 3 jobs and 3 proposals', out.getvalue())
+        call_command('archive_jobs', '--batch-size', '2', stdout=out)
+        self.assertIn('Archived in 2 batches: 3 jobs and 3 proposals', out.getvalue())
+
+
+class ThrottlingTests(APITestCase):
+    """Test token-bucket throttles, endpoint costs and the shared bucket stores"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('throttleuser', 'throttleuser@example.com', 'throttlepass123')
+
+    def setUp(self):
+        from django.core.cache import cache
+        from . import throttling
+
+        self.settings_override = override_settings(
+            THROTTLE_ENABLED=True, THROTTLE_STORE_PATH=None,
+            THROTTLE_RATES={'user': '10/min', 'ip': '100/min'},
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        cache.clear()
+        throttling.reset_store()
+        self.addCleanup(throttling.reset_store)
+
+    def test_gcra_bucket(self):
+        """Test a bucket allows its capacity at once, then refills over time"""
+        from .throttling import gcra
+
+        tat = None
+        for _ in range(3):
+            allowed, tat, wait = gcra(tat, 100.0, 2.0, 3, 1)
+            self.assertTrue(allowed)
+        allowed, tat, wait = gcra(tat, 100.0, 2.0, 3, 1)
+        self.assertFalse(allowed)
+        self.assertEqual(wait, 2.0)
+        self.assertTrue(gcra(tat, 102.0, 2.0, 3, 1)[0])
+        # A cost above the capacity is capped so the request can ever pass
+        self.assertTrue(gcra(None, 100.0, 2.0, 3, 10)[0])
+
+    def test_search_costs_more(self):
+        """Test searches spend more tokens and refusals carry Retry-After"""
+        from . import metrics
+
+        self.client.force_authenticate(user=self.user)
+        url = reverse('job-list')
+        self.assertEqual(self.client.get(url, {'search': 'logo'}).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url, {'search': 'logo'}).status_code, status.HTTP_200_OK)
+        response = self.client.get(url, {'search': 'logo'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertIn('flexilance_throttled_requests_total{scope="user"}', metrics.render())
+
+        other = User.objects.create_user('throttleother', 'throttleother@example.com', 'throttlepass123')
+        self.client.force_authenticate(user=other)
+        for _ in range(10):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_registration_limited_per_ip(self):
+        """Test anonymous registrations and logins drain the per-IP bucket"""
+        with override_settings(THROTTLE_RATES={'user': '10/min', 'ip': '40/min'}):
+            for i in range(2):
+                response = self.client.post(reverse('register'), {
+                    'username': f'burst{i}', 'email': f'burst{i}@example.com', 'password': 'burstpass123',
+                })
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            response = self.client.post(reverse('api-token-auth'), {
+                'username': 'burst0', 'password': 'burstpass123',
+            })
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            other_ip = self.client.post(
+                reverse('api-token-auth'), {'username': 'burst0', 'password': 'burstpass123'},
+                REMOTE_ADDR='10.1.2.3',
+            )
+            self.assertEqual(other_ip.status_code, status.HTTP_200_OK)
+
+    def test_forwarded_for_cannot_be_spoofed(self):
+        """Test the per-IP bucket keys on the address the trusted proxy appended"""
+        from django.conf import settings
+        from rest_framework.settings import api_settings
+
+        rest_framework = {**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}
+        with override_settings(REST_FRAMEWORK=rest_framework, THROTTLE_RATES={'user': '10/min', 'ip': '40/min'}):
+            self.assertEqual(api_settings.NUM_PROXIES, 1)
+            for i in range(2):
+                response = self.client.post(reverse('register'), {
+                    'username': f'spoof{i}', 'email': f'spoof{i}@example.com', 'password': 'spoofpass123',
+                }, HTTP_X_FORWARDED_FOR=f'10.9.9.{i}, 203.0.113.7')
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            response = self.client.post(
+                reverse('api-token-auth'), {'username': 'spoof0', 'password': 'spoofpass123'},
+                HTTP_X_FORWARDED_FOR='10.9.9.99, 203.0.113.7',
+            )
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            other_client = self.client.post(
+                reverse('api-token-auth'), {'username': 'spoof0', 'password': 'spoofpass123'},
+                HTTP_X_FORWARDED_FOR='10.9.9.99, 198.51.100.4',
+            )
+            self.assertEqual(other_client.status_code, status.HTTP_200_OK)
+
+    def test_disabled(self):
+        """Test nothing is throttled when THROTTLE_ENABLED is off"""
+        self.client.force_authenticate(user=self.user)
+        with override_settings(THROTTLE_ENABLED=False):
+            for _ in range(12):
+                self.assertEqual(self.client.get(reverse('job-list')).status_code, status.HTTP_200_OK)
+
+    def test_shared_memory_store(self):
+        """Test buckets in the shared memory file are seen by every opener"""
+        from .throttling import SharedMemoryBucketStore
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'buckets')
+        worker_a = SharedMemoryBucketStore(path, slots=64)
+        worker_b = SharedMemoryBucketStore(path, slots=64)
+
+        self.assertTrue(worker_a.consume('user:1', 1.0, 2, 1, 100.0)[0])
+        self.assertTrue(worker_b.consume('user:1', 1.0, 2, 1, 100.0)[0])
+        allowed, wait = worker_a.consume('user:1', 1.0, 2, 1, 100.0)
+        self.assertFalse(allowed)
+        self.assertEqual(wait, 1.0)
+        self.assertTrue(worker_b.consume('user:2', 1.0, 2, 1, 100.0)[0])
+        self.assertTrue(worker_b.consume('user:1', 1.0, 2, 1, 101.0)[0])
+
+    def test_shared_memory_store_full_page(self):
+        """Test a full page evicts the bucket closest to refilling"""
+        from .throttling import SharedMemoryBucketStore
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        store = SharedMemoryBucketStore(os.path.join(directory, 'buckets'), slots=8)
+        for i in range(8):
+            store.consume(f'ip:{i}', 1.0, 5, 5 if i else 1, 100.0)
+        # ip:0 is nearest to refilling, so it loses its slot to ip:8
+        self.assertTrue(store.consume('ip:8', 1.0, 5, 5, 100.0)[0])
+        for i in range(1, 9):
+            self.assertFalse(store.consume(f'ip:{i}', 1.0, 5, 1, 100.0)[0])
+
+
+class NotificationTests(APITestCase):
+    """Test the proposal outbox, batched coalescing delivery and the notification API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('notifyclient', 'notifyclient@example.com', 'notifypass123')
+        cls.job = Job.objects.create(title='Logo', description='x', budget=100, client=cls.client_user)
+        cls.other_job = Job.objects.create(title='Site', description='x', budget=100, client=cls.client_user)
+        cls.freelancers = []
+        for i in range(4):
+            user = User.objects.create_user(f'notifyfree{i}', f'notifyfree{i}@example.com', 'notifypass123')
+            user.profile.is_freelancer = True
+            user.profile.save()
+            cls.freelancers.append(user)
+
+    def propose(self, freelancer, job):
+        self.client.force_authenticate(user=freelancer)
+        response = self.client.post(reverse('proposal-list'), {
+            'job': job.id, 'cover_letter': 'Hello', 'bid_amount': '90.00', 'delivery_time': 3,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response
+
+    def test_proposal_writes_outbox_event(self):
+        """Test creating a proposal records one outbox event in the same transaction"""
+        from .models import OutboxEvent
+
+        response = self.propose(self.freelancers[0], self.job)
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.kind, 'proposal.created')
+        self.assertEqual(event.payload['proposal_id'], response.data['id'])
+        self.assertEqual(event.payload['client_id'], self.client_user.id)
+
+        # A rejected duplicate writes nothing
+        self.client.post(reverse('proposal-list'), {
+            'job': self.job.id, 'cover_letter': 'Again', 'bid_amount': '90.00', 'delivery_time': 3,
+        })
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+    def test_delivery_coalesces_bursts(self):
+        """Test a burst of proposals on one job becomes one notification with a count"""
+        from .models import Notification, OutboxEvent
+        from .notifications import deliver_pending, unread_count
+
+        for freelancer in self.freelancers[:3]:
+            self.propose(freelancer, self.job)
+        self.propose(self.freelancers[0], self.other_job)
+
+        self.assertEqual(deliver_pending(batch_size=2), 4)
+        self.assertFalse(OutboxEvent.objects.exists())
+        notifications = list(Notification.objects.filter(recipient=self.client_user).order_by('-id'))
+        self.assertEqual([(n.message, n.count) for n in notifications], [
+            ('New proposal for "Site"', 1),
+            ('3 new proposals for "Logo"', 3),
+        ])
+        self.assertEqual(len(notifications[1].data['proposal_ids']), 3)
+        self.assertEqual(unread_count(self.client_user), 2)
+
+        # A later proposal folds into the unread notification for its job
+        self.propose(self.freelancers[3], self.job)
+        deliver_pending()
+        self.assertEqual(Notification.objects.filter(recipient=self.client_user).count(), 2)
+        self.assertEqual(Notification.objects.filter(recipient=self.client_user).first().count, 4)
+        self.assertEqual(unread_count(self.client_user), 2)
+
+    def test_read_notifications_are_not_merged(self):
+        """Test a read notification starts a new group and counters stay in step"""
+        from .notifications import deliver_pending, mark_read, unread_count
+
+        self.propose(self.freelancers[0], self.job)
+        deliver_pending()
+        self.assertEqual(mark_read(self.client_user), 1)
+        self.assertEqual(unread_count(self.client_user), 0)
+
+        self.propose(self.freelancers[1], self.job)
+        deliver_pending()
+        self.assertEqual(self.client_user.notifications.count(), 2)
+        self.assertEqual(unread_count(self.client_user), 1)
+
+    def test_notification_api(self):
+        """Test the keyset-paginated list, unread count and mark-read endpoint"""
+        from .notifications import deliver_pending
+
+        for job_number in range(3):
+            job = Job.objects.create(title=f'Job {job_number}', description='x', budget=10, client=self.client_user)
+            self.propose(self.freelancers[0], job)
+        deliver_pending()
+
+        self.client.force_authenticate(user=User.objects.get(pk=self.client_user.pk))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('notification-list'), {'page_size': 2})
+        self.assertEqual(response.data['unread'], 3)
+        self.assertEqual([n['message'] for n in response.data['results']],
+                         ['New proposal for "Job 2"', 'New proposal for "Job 1"'])
+        self.assertIn('cursor=', response.data['next'])
+        following = self.client.get(response.data['next'])
+        self.assertEqual([n['message'] for n in following.data['results']], ['New proposal for "Job 0"'])
+
+        first_id = response.data['results'][0]['id']
+        response = self.client.post(reverse('notifications-read'), {'ids': [first_id]}, format='json')
+        self.assertEqual(response.data, {'marked': 1, 'unread': 2})
+        response = self.client.post(reverse('notifications-read'), {}, format='json')
+        self.assertEqual(response.data, {'marked': 2, 'unread': 0})
+        bad = self.client.post(reverse('notifications-read'), {'ids': 'all'}, format='json')
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.freelancers[0])
+        response = self.client.get(reverse('notification-list'))
+        self.assertEqual((response.data['results'], response.data['unread']), ([], 0))
+
+
+class StreamTests(APITestCase):
+    """Test the Server-Sent Events stream and the pub/sub broker behind it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('streamclient', 'streamclient@example.com', 'streampass123')
+        cls.job = Job.objects.create(title='Logo', description='x', budget=100, client=cls.owner)
+        cls.python_dev = User.objects.create_user('streampy', 'streampy@example.com', 'streampass123')
+        cls.python_dev.profile.is_freelancer = True
+        cls.python_dev.profile.skills = 'Python, Django'
+        cls.python_dev.profile.save()
+        cls.generalist = User.objects.create_user('streamany', 'streamany@example.com', 'streampass123')
+        cls.generalist.profile.is_freelancer = True
+        cls.generalist.profile.save()
+
+    def setUp(self):
+        from .pubsub import reset_broker
+
+        overrides = override_settings(PUBSUB_BACKEND='local', SSE_HEARTBEAT_INTERVAL=30, SSE_QUEUE_SIZE=100)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reset_broker()
+        self.addCleanup(reset_broker)
+
+    def open_stream(self, token=None, during=None, method='GET', headers=()):
+        """
+        Run the ASGI stream, call ``during`` (sync) once it is subscribed,
+        then disconnect. Returns (status, body).
+        """
+        import asyncio
+        from asgiref.sync import async_to_sync, sync_to_async
+        from .pubsub import get_broker
+        from .sse import stream
+
+        scope = {
+            'type': 'http', 'method': method, 'path': '/api/stream/', 'headers': list(headers),
+            'query_string': f'token={token}'.encode() if token else b'',
+        }
+
+        async def scenario():
+            disconnected = asyncio.Event()
+            sent = []
+
+            async def receive():
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            task = asyncio.ensure_future(stream(scope, receive, send))
+            for _ in range(200):
+                if task.done() or get_broker().subscriber_count():
+                    break
+                await asyncio.sleep(0.005)
+            if during is not None:
+                await sync_to_async(during)()
+            await asyncio.sleep(0.05)
+            disconnected.set()
+            await asyncio.wait_for(task, 5)
+            return sent
+
+        sent = async_to_sync(scenario)()
+        body = b''.join(message.get('body', b'') for message in sent[1:]).decode()
+        return sent[0]['status'], body
+
+    def token(self, user):
+        return Token.objects.create(user=user).key
+
+    def events(self, body):
+        return [
+            (block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+            for block in body.split('\n\n') if block.startswith('event: ')
+        ]
+
+    def test_requires_token(self):
+        """Test the stream refuses missing and unknown tokens and non-GET methods"""
+        self.assertEqual(self.open_stream()[0], 401)
+        self.assertEqual(self.open_stream(token='nope')[0], 401)
+        self.assertEqual(self.open_stream(token=self.token(self.owner), method='POST')[0], 405)
+
+    def test_owner_receives_new_proposals(self):
+        """Test a job owner is streamed proposals on their jobs once the proposal commits"""
+        def propose():
+            self.client.force_authenticate(user=self.python_dev)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('proposal-list'), {
+                    'job': self.job.id, 'cover_letter': 'Hello', 'bid_amount': '90.00', 'delivery_time': 3,
+                })
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        token = self.token(self.owner)
+        status_code, body = self.open_stream(
+            during=propose, headers=[(b'authorization', f'Token {token}'.encode())],
+        )
+        self.assertEqual(status_code, 200)
+        self.assertTrue(body.startswith('retry: '))
+        [(event, data)] = self.events(body)
+        self.assertEqual(event, 'proposal.created')
+        self.assertEqual(data['job_id'], self.job.id)
+        self.assertEqual(data['freelancer_id'], self.python_dev.id)
+        self.assertEqual(data['bid_amount'], '90.00')
+
+    def test_freelancers_receive_matching_jobs(self):
+        """Test new jobs reach freelancers whose skills match, or who list none"""
+        def post_jobs():
+            self.client.force_authenticate(user=self.owner)
+            for title, skills in (('Django API', ''), ('Logo design', 'illustrator')):
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(reverse('job-list'), {
+                        'title': title, 'description': 'x', 'budget': '50.00', 'skills_required': skills,
+                    })
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        _, body = self.open_stream(token=self.token(self.python_dev), during=post_jobs)
+        self.assertEqual([data['title'] for _, data in self.events(body)], ['Django API'])
+        _, body = self.open_stream(token=self.token(self.generalist), during=post_jobs)
+        self.assertEqual([data['title'] for _, data in self.events(body)], ['Django API', 'Logo design'])
+        _, body = self.open_stream(token=self.token(self.owner), during=post_jobs)
+        self.assertEqual(self.events(body), [])
+
+    def test_heartbeat_and_cleanup(self):
+        """Test idle streams get ping comments and unsubscribe when the client leaves"""
+        import time
+        from .pubsub import get_broker
+
+        with override_settings(SSE_HEARTBEAT_INTERVAL=0.01):
+            _, body = self.open_stream(token=self.token(self.generalist), during=lambda: time.sleep(0))
+        self.assertIn(': ping\n\n', body)
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+    def test_slow_subscriber_is_closed(self):
+        """Test a subscriber that falls more than SSE_QUEUE_SIZE messages behind is closed"""
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from .pubsub import CLOSED, LocalBroker
+
+        async def scenario():
+            broker = LocalBroker()
+            subscription = broker.subscribe(['jobs'], maxsize=2)
+            for number in range(5):
+                broker.publish('jobs', number)
+            await asyncio.sleep(0)
+            received = [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+            broker.unsubscribe(subscription)
+            return received, broker.subscriber_count('jobs')
+
+        received, remaining = async_to_sync(scenario)()
+        self.assertEqual(received, [0, 1, CLOSED])
+        self.assertEqual(remaining, 0)
+
+    def test_stream_only_asgi_refuses_api_paths(self):
+        """Test ASGI_STREAM_ONLY leaves everything but /api/stream/ to the WSGI workers"""
+        from unittest import mock
+        from asgiref.sync import async_to_sync
+        from flexilance import asgi
+
+        async def django_application(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+
+        async def call(path):
+            sent = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {'type': 'http', 'method': 'GET', 'path': path, 'headers': [], 'query_string': b''}
+            await asgi.application(scope, receive, send)
+            return sent[0]['status']
+
+        with mock.patch.object(asgi, 'django_application', django_application):
+            with override_settings(ASGI_STREAM_ONLY=True):
+                self.assertEqual(async_to_sync(call)('/api/jobs/'), 404)
+                self.assertEqual(async_to_sync(call)('/api/stream/'), 401)
+            self.assertEqual(async_to_sync(call)('/api/jobs/'), 200)
+
+    def test_postgres_backend_needs_postgres(self):
+        """Test PUBSUB_BACKEND follows the database engine and refuses postgres on SQLite"""
+        import subprocess
+        import sys
+        from django.conf import settings as django_settings
+
+        self.assertEqual(django_settings.PUBSUB_BACKEND, 'local')
+        env = {**os.environ, 'PUBSUB_BACKEND': 'postgres', 'CLOUDINARY_CHECK': 'False'}
+        result = subprocess.run(
+            [sys.executable, '-c', 'import flexilance.settings'],
+            env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(__file__)),
+        )
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('PUBSUB_BACKEND=postgres needs a PostgreSQL default database', result.stderr)
+
+
+class PostgresBrokerTests(TransactionTestCase):
+    """Test events published with NOTIFY reach local subscribers through the listener"""
+
+    def test_notify_round_trip(self):
+        """Test a published message is relayed back by the LISTEN thread"""
+        import asyncio
+        from asgiref.sync import async_to_sync, sync_to_async
+        from django.db import connection
+        from .pubsub import PostgresBroker
+
+        if connection.vendor != 'postgresql':
+            self.skipTest('LISTEN/NOTIFY needs PostgreSQL')
+
+        async def scenario():
+            broker = PostgresBroker()
+            subscription = broker.subscribe(['user:1'])
+            await asyncio.sleep(0.5)  # let the listener connect
+            await sync_to_async(broker.publish)('user:1', {'event': 'ping', 'data': {}})
+            return await asyncio.wait_for(subscription.queue.get(), 5)
+
+        self.assertEqual(async_to_sync(scenario)(), {'event': 'ping', 'data': {}})
+
+
+class ProposalDecisionTests(APITestCase):
+    """Test bulk accepting and rejecting a job's proposals"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('hireclient', 'hireclient@example.com', 'hirepass123')
+        cls.job = Job.objects.create(title='Logo', description='x', budget=100, client=cls.owner)
+        cls.other_job = Job.objects.create(title='Site', description='x', budget=100, client=cls.owner)
+        cls.proposals = []
+        for i in range(6):
+            user = User.objects.create_user(f'hirefree{i}', f'hirefree{i}@example.com', 'hirepass123')
+            user.profile.is_freelancer = True
+            user.profile.save()
+            cls.proposals.append(Proposal.objects.create(
+                job=cls.job, freelancer=user, cover_letter='Hi', bid_amount=90, delivery_time=3,
+            ))
+        cls.stray = Proposal.objects.create(
+            job=cls.other_job, freelancer=cls.proposals[0].freelancer, cover_letter='Hi', bid_amount=90,
+            delivery_time=3,
+        )
+
+    def setUp(self):
+        self.url = reverse('job-proposals', args=[self.job.id])
+        self.client.force_authenticate(user=User.objects.get(pk=self.owner.pk))
+
+    def statuses(self):
+        return list(Proposal.objects.filter(job=self.job).order_by('id').values_list('status', flat=True))
+
+    def test_accept_one_reject_others(self):
+        """Test hiring one freelancer rejects the rest with constant queries and one event"""
+        from .models import OutboxEvent
+
+        hired = self.proposals[2]
+        # Locked job, hire check, locked proposals, three UPDATEs, outbox insert, savepoint pair
+        with self.assertNumQueries(9):
+            response = self.client.post(self.url, {'accept': [hired.id], 'reject_others': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['accepted'], [hired.id])
+        self.assertEqual(len(response.data['rejected']), 5)
+        self.assertFalse(response.data['is_active'])
+        self.assertEqual(self.statuses(), ['rejected', 'rejected', 'accepted', 'rejected', 'rejected', 'rejected'])
+        self.assertFalse(Job.objects.get(pk=self.job.pk).is_active)
+        self.assertEqual(Proposal.objects.get(pk=self.stray.pk).status, 'pending')
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.kind, 'proposals.decided')
+        self.assertEqual(event.payload['accepted'], [[hired.id, hired.freelancer_id]])
+
+    def test_decisions_notify_each_freelancer(self):
+        """Test the aggregated event becomes one notification per freelancer"""
+        from .notifications import deliver_pending
+
+        self.client.post(self.url, {'accept': [self.proposals[0].id], 'reject_others': True}, format='json')
+        deliver_pending()
+        hired = self.proposals[0].freelancer.notifications.get()
+        self.assertEqual(hired.message, 'Your proposal for "Logo" was accepted')
+        turned_down = self.proposals[1].freelancer.notifications.get()
+        self.assertEqual(turned_down.message, 'Your proposal for "Logo" was not selected')
+
+    def test_reject_only_keeps_job_open(self):
+        """Test rejecting without hiring leaves the job active"""
+        ids = [self.proposals[0].id, self.proposals[1].id]
+        response = self.client.post(self.url, {'reject': ids}, format='json')
+        self.assertEqual(response.data['rejected'], ids)
+        self.assertTrue(response.data['is_active'])
+        self.assertEqual(self.statuses()[:3], ['rejected', 'rejected', 'pending'])
+
+    def test_conflicts_change_nothing(self):
+        """Test decided or foreign proposals are refused with 409 and no partial update"""
+        self.client.post(self.url, {'reject': [self.proposals[0].id]}, format='json')
+
+        # A second hire racing the first sees the proposals already decided
+        response = self.client.post(self.url, {'accept': [self.proposals[0].id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['proposals'], [self.proposals[0].id])
+        response = self.client.post(self.url, {'accept': [self.stray.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.statuses(), ['rejected'] + ['pending'] * 5)
+        self.assertTrue(Job.objects.get(pk=self.job.pk).is_active)
+
+    def test_one_hire_per_job(self):
+        """Test a second decide() accepting another proposal is refused once the job has hired"""
+        from .hiring import DecisionConflict, decide
+
+        first, second = self.proposals[0], self.proposals[1]
+        with self.assertRaises(DecisionConflict) as raised:
+            decide(self.job.id, self.owner, accept=[first.id, second.id])
+        self.assertEqual(raised.exception.proposal_ids, [first.id, second.id])
+
+        decide(self.job.id, self.owner, accept=[first.id])
+        with self.assertRaisesMessage(DecisionConflict, 'The job is closed'):
+            decide(self.job.id, self.owner, accept=[second.id])
+        Job.objects.filter(pk=self.job.pk).update(is_active=True)
+        with self.assertRaises(DecisionConflict) as raised:
+            decide(self.job.id, self.owner, accept=[second.id])
+        self.assertEqual(raised.exception.proposal_ids, [first.id])
+        self.assertEqual(self.statuses(), ['accepted'] + ['pending'] * 5)
+
+        # Rejecting the rest is still allowed after the hire
+        decision = decide(self.job.id, self.owner, reject_others=True)
+        self.assertEqual(len(decision.rejected), 5)
+
+    def test_validation_and_ownership(self):
+        """Test empty or contradictory bodies are rejected and only the owner may decide"""
+        self.assertEqual(self.client.post(self.url, {}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        both = {'accept': [self.proposals[0].id], 'reject': [self.proposals[0].id]}
+        self.assertEqual(self.client.post(self.url, both, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        two = {'accept': [self.proposals[0].id, self.proposals[1].id]}
+        self.assertEqual(self.client.post(self.url, two, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.proposals[0].freelancer)
+        response = self.client.post(self.url, {'reject_others': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        missing = reverse('job-proposals', args=[self.job.id + 100])
+        self.client.force_authenticate(user=self.owner)
+        self.assertEqual(self.client.post(missing, {'reject_others': True}, format='json').status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.statuses(), ['pending'] * 6)
+
+
+class MessagingTests(APITestCase):
+    """Test proposal threads, keyset message history and cursor-based unread counts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('chatclient', 'chatclient@example.com', 'chatpass123')
+        cls.freelancer = User.objects.create_user('chatfree', 'chatfree@example.com', 'chatpass123')
+        cls.freelancer.profile.is_freelancer = True
+        cls.freelancer.profile.save()
+        cls.outsider = User.objects.create_user('chatother', 'chatother@example.com', 'chatpass123')
+        cls.job = Job.objects.create(title='Logo', description='x', budget=100, client=cls.owner)
+        cls.proposal = Proposal.objects.create(
+            job=cls.job, freelancer=cls.freelancer, cover_letter='Hi', bid_amount=90, delivery_time=3,
+        )
+
+    def send(self, user, body, **target):
+        self.client.force_authenticate(user=user)
+        response = self.client.post(reverse('message-send'), {'body': body, **target}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data
+
+    def inbox(self, user):
+        self.client.force_authenticate(user=User.objects.get(pk=user.pk))
+        return self.client.get(reverse('thread-list')).data['results']
+
+    def test_first_message_starts_thread(self):
+        """Test messaging about a proposal creates one thread shared by both participants"""
+        first = self.send(self.freelancer, 'Any questions?', proposal=self.proposal.id)
+        reply = self.send(self.owner, 'Yes, one.', thread=first['thread'])
+        again = self.send(self.owner, 'Also this.', proposal=self.proposal.id)
+        self.assertEqual({first['thread'], reply['thread'], again['thread']}, {first['thread']})
+        self.assertEqual([first['seq'], reply['seq'], again['seq']], [1, 2, 3])
+
+        [thread] = self.inbox(self.owner)
+        self.assertEqual((thread['subject'], thread['proposal'], thread['unread']), ('Logo', self.proposal.id, 0))
+        [thread] = self.inbox(self.freelancer)
+        self.assertEqual(thread['unread'], 2)
+        self.assertEqual(self.inbox(self.outsider), [])
+
+    def test_outsiders_cannot_read_or_send(self):
+        """Test non-participants get 404 for threads and proposals"""
+        thread_id = self.send(self.freelancer, 'Hello', proposal=self.proposal.id)['thread']
+        self.client.force_authenticate(user=self.outsider)
+        for response in (
+            self.client.get(reverse('message-list', args=[thread_id])),
+            self.client.post(reverse('message-send'), {'thread': thread_id, 'body': 'Hi'}, format='json'),
+            self.client.post(reverse('message-send'), {'proposal': self.proposal.id, 'body': 'Hi'}, format='json'),
+            self.client.post(reverse('thread-read', args=[thread_id]), {}, format='json'),
+        ):
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        both = {'thread': thread_id, 'proposal': self.proposal.id, 'body': 'Hi'}
+        self.client.force_authenticate(user=self.owner)
+        self.assertEqual(self.client.post(reverse('message-send'), both, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_history_is_keyset_paginated(self):
+        """Test history pages newest first by id with a cursor"""
+        thread_id = self.send(self.freelancer, 'm1', proposal=self.proposal.id)['thread']
+        for number in range(2, 6):
+            self.send(self.owner if number % 2 else self.freelancer, f'm{number}', thread=thread_id)
+
+        self.client.force_authenticate(user=User.objects.get(pk=self.owner.pk))
+        url = reverse('message-list', args=[thread_id])
+        # participant check, page
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'page_size': 2})
+        self.assertEqual([m['body'] for m in response.data['results']], ['m5', 'm4'])
+        following = self.client.get(response.data['next'])
+        self.assertEqual([m['body'] for m in following.data['results']], ['m3', 'm2'])
+
+    def test_read_cursors(self):
+        """Test marking read moves one participant's cursor forward only"""
+        first = self.send(self.owner, 'one', proposal=self.proposal.id)
+        self.send(self.owner, 'two', thread=first['thread'])
+        third = self.send(self.owner, 'three', thread=first['thread'])
+        url = reverse('thread-read', args=[first['thread']])
+
+        self.client.force_authenticate(user=self.freelancer)
+        self.assertEqual(self.client.post(url, {'up_to': first['id']}, format='json').data, {'unread': 2})
+        self.assertEqual(self.client.post(url, {}, format='json').data, {'unread': 0})
+        self.assertEqual(self.client.post(url, {'up_to': first['id']}, format='json').data, {'unread': 0})
+        self.assertEqual(self.client.post(url, {'up_to': 'x'}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Thread.objects.get(pk=first['thread']).freelancer_read_seq, third['seq'])
+
+    def test_inbox_cost_does_not_grow_with_messages(self):
+        """Test the inbox reads one row per thread however many messages there are"""
+        thread_id = self.send(self.freelancer, 'start', proposal=self.proposal.id)['thread']
+        other_job = Job.objects.create(title='Site', description='x', budget=100, client=self.owner)
+        other = Proposal.objects.create(
+            job=other_job, freelancer=self.freelancer, cover_letter='Hi', bid_amount=90, delivery_time=3,
+        )
+        self.send(self.freelancer, 'start', proposal=other.id)
+        for _ in range(30):
+            self.send(self.freelancer, 'more', thread=thread_id)
+
+        self.client.force_authenticate(user=User.objects.get(pk=self.owner.pk))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('thread-list'))
+        self.assertEqual([t['unread'] for t in response.data['results']], [31, 1])
+
+
+class EscrowTests(APITestCase):
+    """Test contracts, milestone escrow through the fake gateway and the running totals"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('payclient', 'payclient@example.com', 'paypass123')
+        cls.freelancer = User.objects.create_user('payfree', 'payfree@example.com', 'paypass123')
+        cls.freelancer.profile.is_freelancer = True
+        cls.freelancer.profile.save()
+        cls.job = Job.objects.create(title='Logo', description='x', budget=300, client=cls.owner)
+        cls.proposal = Proposal.objects.create(
+            job=cls.job, freelancer=cls.freelancer, cover_letter='Hi', bid_amount=250, delivery_time=3,
+            status='accepted',
+        )
+
+    def setUp(self):
+        from .payment_gateway import reset_gateway
+
+        reset_gateway()
+        self.addCleanup(reset_gateway)
+
+    def as_user(self, user):
+        self.client.force_authenticate(user=User.objects.get(pk=user.pk))
+
+    def create_contract(self, milestones=None):
+        self.as_user(self.owner)
+        body = {'proposal': self.proposal.id}
+        if milestones is not None:
+            body['milestones'] = milestones
+        response = self.client.post(reverse('contract-list'), body, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data
+
+    def pay(self, user, action, milestone_id):
+        self.as_user(user)
+        return self.client.post(reverse(f'payment-{action}'), {'milestone': milestone_id}, format='json')
+
+    def test_create_contract(self):
+        """Test an accepted proposal becomes a contract, once, with its milestones"""
+        contract = self.create_contract([
+            {'title': 'Sketches', 'amount': '100.00'}, {'title': 'Final', 'amount': '150.00'},
+        ])
+        self.assertEqual(contract['amount'], '250.00')
+        self.assertEqual([(m['title'], m['status']) for m in contract['milestones']],
+                         [('Sketches', 'pending'), ('Final', 'pending')])
+        response = self.client.post(reverse('contract-list'), {'proposal': self.proposal.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        pending = Proposal.objects.create(
+            job=self.job, freelancer=self.owner, cover_letter='Hi', bid_amount=10, delivery_time=3,
+        )
+        response = self.client.post(reverse('contract-list'), {'proposal': pending.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.as_user(self.freelancer)
+        response = self.client.post(reverse('contract-list'), {'proposal': self.proposal.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('contract-detail', args=[contract['id']])).data['id'],
+                         contract['id'])
+
+    def test_escrow_release_refund_update_totals(self):
+        """Test each milestone move writes a ledger row and bumps contract and user totals"""
+        from .payment_gateway import get_gateway
+
+        contract = self.create_contract([
+            {'title': 'Sketches', 'amount': '100.00'}, {'title': 'Final', 'amount': '150.00'},
+        ])
+        first, second = [m['id'] for m in contract['milestones']]
+        for milestone in (first, second):
+            self.assertEqual(self.pay(self.owner, 'initiate', milestone).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.pay(self.owner, 'release', first).data['status'], 'succeeded')
+        self.assertEqual(self.pay(self.freelancer, 'refund', second).data['kind'], 'refund')
+        self.assertEqual([call[0] for call in get_gateway().calls], ['charge', 'charge', 'transfer', 'refund'])
+
+        self.as_user(self.owner)
+        detail = self.client.get(reverse('contract-detail', args=[contract['id']])).data
+        self.assertEqual((detail['escrowed'], detail['released'], detail['refunded'], detail['held']),
+                         ('250.00', '100.00', '150.00', '0.00'))
+
+        with self.assertNumQueries(1):
+            totals = self.client.get(reverse('payment-earnings')).data
+        self.assertEqual(totals['client'], {
+            'escrowed': '250.00', 'released': '100.00', 'refunded': '150.00', 'held': '0.00',
+        })
+        self.as_user(self.freelancer)
+        totals = self.client.get(reverse('payment-earnings')).data
+        self.assertEqual(totals['freelancer']['released'], '100.00')
+        self.assertEqual(totals['client']['escrowed'], '0.00')
+
+        history = self.client.get(reverse('payment-history'), {'page_size': 3}).data
+        self.assertEqual([p['kind'] for p in history['results']], ['refund', 'release', 'escrow'])
+        self.assertIsNotNone(history['next'])
+
+        self.as_user(self.owner)
+        response = self.client.post(reverse('contract-complete', args=[contract['id']]))
+        self.assertEqual(response.data['status'], 'completed')
+
+    def test_moves_respect_state_and_role(self):
+        """Test moves are refused out of order, by the wrong party or on others' contracts"""
+        contract = self.create_contract()
+        milestone = contract['milestones'][0]['id']
+        self.assertEqual(self.pay(self.owner, 'release', milestone).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.pay(self.freelancer, 'initiate', milestone).status_code, status.HTTP_403_FORBIDDEN)
+        self.pay(self.owner, 'initiate', milestone)
+        self.assertEqual(self.pay(self.owner, 'initiate', milestone).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.pay(self.owner, 'refund', milestone).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post(reverse('contract-complete', args=[contract['id']]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        outsider = User.objects.create_user('payother', 'payother@example.com', 'paypass123')
+        self.assertEqual(self.pay(outsider, 'release', milestone).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.pay(outsider, 'release', 'x').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('contract-detail', args=[contract['id']])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_declined_payment_changes_no_totals(self):
+        """Test a gateway decline records a failed payment and leaves the milestone payable"""
+        from .models import Contract
+        from .payment_gateway import get_gateway
+
+        contract = self.create_contract()
+        milestone = contract['milestones'][0]['id']
+        get_gateway().decline_next = 1
+        response = self.pay(self.owner, 'initiate', milestone)
+        self.assertEqual(response.status_code, status.HTTP_402_PAYMENT_REQUIRED)
+        self.assertEqual(response.data['payment']['status'], 'failed')
+        self.assertEqual(Contract.objects.get(pk=contract['id']).escrowed, 0)
+
+        response = self.pay(self.owner, 'initiate', milestone)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Contract.objects.get(pk=contract['id']).escrowed, 250)
+
+
+    def test_reconcile_settles_stale_pending_payments(self):
+        """Test stale pending payments are looked up by reference and completed or failed once"""
+        import datetime
+        from django.utils import timezone
+        from .escrow import _settle, reconcile_pending
+        from .models import Contract, Milestone, Payment
+        from .payment_gateway import GatewayResult, get_gateway
+
+        contract = self.create_contract([
+            {'title': 'Sketches', 'amount': '100.00'}, {'title': 'Final', 'amount': '150.00'},
+        ])
+        charged_id, lost_id = (m['id'] for m in contract['milestones'])
+        # Workers that died during the gateway call: one charge reached the provider, one did not
+        charged = Payment.objects.create(
+            contract_id=contract['id'], milestone_id=charged_id, kind='escrow', amount=100, reference='escrow_charged',
+        )
+        get_gateway().charge(charged, self.owner)
+        lost = Payment.objects.create(
+            contract_id=contract['id'], milestone_id=lost_id, kind='escrow', amount=150, reference='escrow_lost',
+        )
+        self.assertEqual(self.pay(self.owner, 'initiate', charged_id).status_code, status.HTTP_409_CONFLICT)
+
+        self.assertEqual(reconcile_pending(), {'succeeded': 0, 'failed': 0})
+        later = timezone.now() + datetime.timedelta(hours=1)
+        self.assertEqual(reconcile_pending(now=later), {'succeeded': 1, 'failed': 1})
+        self.assertEqual(
+            list(Payment.objects.filter(pk__in=[charged.pk, lost.pk]).order_by('pk').values_list('status', flat=True)),
+            ['succeeded', 'failed'],
+        )
+        self.assertEqual(Milestone.objects.get(pk=charged_id).status, 'funded')
+        self.assertEqual(Milestone.objects.get(pk=lost_id).status, 'pending')
+        self.assertEqual(Contract.objects.get(pk=contract['id']).escrowed, 100)
+
+        # The original worker finishing late does not count the payment twice
+        self.assertFalse(_settle(charged, GatewayResult(True, reference='T_late')))
+        self.assertEqual(charged.status, 'succeeded')
+        self.assertEqual(reconcile_pending(now=later), {'succeeded': 0, 'failed': 0})
+        self.assertEqual(Contract.objects.get(pk=contract['id']).escrowed, 100)
+
+        self.assertEqual(self.pay(self.owner, 'initiate', lost_id).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Contract.objects.get(pk=contract['id']).escrowed, 250)
+
+
+    def test_gateway_error_leaves_payment_pending(self):
+        """Test a gateway timeout keeps the payment pending for reconciliation instead of failing it"""
+        import datetime
+        from unittest import mock
+        from django.utils import timezone
+        from .escrow import reconcile_pending
+        from .models import Contract, Payment
+        from .payment_gateway import FakePaystackGateway
+
+        contract = self.create_contract()
+        milestone = contract['milestones'][0]['id']
+
+        charge = FakePaystackGateway.charge
+
+        def charge_then_time_out(gateway, payment, payer):
+            charge(gateway, payment, payer)
+            raise TimeoutError('Read timed out')
+
+        with mock.patch.object(FakePaystackGateway, 'charge', charge_then_time_out), \
+                self.assertLogs('core.escrow', 'ERROR'):
+            response = self.pay(self.owner, 'initiate', milestone)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['payment']['status'], 'pending')
+        self.assertEqual(self.pay(self.owner, 'initiate', milestone).status_code, status.HTTP_409_CONFLICT)
+
+        later = timezone.now() + datetime.timedelta(hours=1)
+        self.assertEqual(reconcile_pending(now=later), {'succeeded': 1, 'failed': 0})
+        self.assertEqual(Payment.objects.get().status, 'succeeded')
+        self.assertEqual(Contract.objects.get(pk=contract['id']).escrowed, 250)
+
+    def test_production_needs_a_payment_gateway(self):
+        """Test settings refuse to fall back to the fake gateway when DEBUG is off"""
+        import subprocess
+        import sys
+
+        env = {name: value for name, value in os.environ.items() if name != 'PAYMENT_GATEWAY'}
+        env.update(DEBUG='False', CLOUDINARY_CHECK='False')
+        result = subprocess.run(
+            [sys.executable, '-c', 'import flexilance.settings'],
+            env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(__file__)),
+        )
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('PAYMENT_GATEWAY must be set when DEBUG is off', result.stderr)
+
+
+class IdempotencyTests(APITestCase):
+    """Test Idempotency-Key replay on job and proposal creation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('idemclient', 'idemclient@example.com', 'idempass123')
+        cls.freelancer = User.objects.create_user('idemfree', 'idemfree@example.com', 'idempass123')
+        cls.freelancer.profile.is_freelancer = True
+        cls.freelancer.profile.save()
+        cls.job = Job.objects.create(title='Logo', description='x', budget=100, client=cls.owner)
+
+    def setUp(self):
+        self.job_body = {'title': 'Retry me', 'description': 'x', 'budget': '50.00'}
+
+    def post(self, user, name, body, key):
+        self.client.force_authenticate(user=User.objects.get(pk=user.pk))
+        return self.client.post(reverse(name), body, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_job_retry_replays_first_response(self):
+        """Test a retried job POST returns the stored response without creating a duplicate"""
+        first = self.post(self.owner, 'job-list', self.job_body, 'job-key-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.client.force_authenticate(user=User.objects.get(pk=self.owner.pk))
+        # Key lookup only: no serializer, no insert
+        with self.assertNumQueries(1):
+            retry = self.client.post(reverse('job-list'), self.job_body, HTTP_IDEMPOTENCY_KEY='job-key-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Job.objects.filter(title='Retry me').count(), 1)
+
+        self.post(self.owner, 'job-list', self.job_body, 'job-key-2')
+        self.assertEqual(Job.objects.filter(title='Retry me').count(), 2)
+
+    def test_proposal_retry_gets_original_success(self):
+        """Test a retried proposal gets its 201 back instead of the duplicate error"""
+        body = {'job': self.job.id, 'cover_letter': 'Hello', 'bid_amount': '90.00', 'delivery_time': 3}
+        first = self.post(self.freelancer, 'proposal-list', body, 'proposal-key')
+        retry = self.post(self.freelancer, 'proposal-list', body, 'proposal-key')
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.data['id'], first.data['id'])
+        unkeyed = self.post(self.freelancer, 'proposal-list', body, '')
+        self.assertEqual(unkeyed.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_key_reuse_rules(self):
+        """Test keys are per user, bound to one endpoint, and busy while the first request runs"""
+        from .models import IdempotencyKey
+
+        self.post(self.owner, 'job-list', self.job_body, 'shared-key')
+        other = self.post(self.freelancer, 'job-list', self.job_body, 'shared-key')
+        self.assertEqual(other.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Job.objects.filter(title='Retry me').count(), 2)
+
+        body = {'job': self.job.id, 'cover_letter': 'Hello', 'bid_amount': '90.00', 'delivery_time': 3}
+        response = self.post(self.freelancer, 'proposal-list', body, 'shared-key')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        IdempotencyKey.objects.filter(user=self.owner, key='shared-key').update(status_code=None, response=None)
+        response = self.post(self.owner, 'job-list', self.job_body, 'shared-key')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Retry-After'], '1')
+        response = self.post(self.owner, 'job-list', self.job_body, 'k' * 256)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_abandoned_claim_is_taken_over(self):
+        """Test a claim left unfinished by a killed worker stops blocking retries after its lease"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import IdempotencyKey
+
+        IdempotencyKey.objects.create(
+            user=self.owner, key='killed', fingerprint='POST /api/jobs/',
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+        response = self.post(self.owner, 'job-list', self.job_body, 'killed')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        response = self.post(self.owner, 'job-list', self.job_body, 'killed')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        replay = self.post(self.owner, 'job-list', self.job_body, 'killed')
+        self.assertEqual((replay['Idempotent-Replayed'], replay.data['id']), ('true', response.data['id']))
+
+    def test_failures_release_and_keys_expire(self):
+        """Test a rejected request frees its key, and expired keys run again and are purged"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .idempotency import purge_expired
+        from .models import IdempotencyKey
+
+        invalid = self.post(self.owner, 'job-list', {'title': 'No budget'}, 'fix-and-retry')
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        fixed = self.post(self.owner, 'job-list', self.job_body, 'fix-and-retry')
+        self.assertEqual(fixed.status_code, status.HTTP_201_CREATED)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        again = self.post(self.owner, 'job-list', self.job_body, 'fix-and-retry')
+        self.assertNotEqual(again.data['id'], fixed.data['id'])
+        self.assertEqual(purge_expired(now=timezone.now() + timedelta(days=2)), 1)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class AdminChangelistTests(TestCase):
+    """Test the job and proposal changelists stay at a fixed number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser('siteadmin', 'siteadmin@example.com', 'adminpass123')
+        cls.owner = User.objects.create_user('adminclient', 'adminclient@example.com', 'adminpass123')
+        cls.freelancers = [
+            User.objects.create_user(f'adminfree{i}', f'adminfree{i}@example.com', 'adminpass123')
+            for i in range(3)
+        ]
+        cls.add_rows(3)
+
+    @classmethod
+    def add_rows(cls, count):
+        start = Job.objects.count()
+        for i in range(start, start + count):
+            job = Job.objects.create(title=f'Logo {i}', description='x', budget=100, client=cls.owner)
+            for freelancer in cls.freelancers:
+                Proposal.objects.create(job=job, freelancer=freelancer, cover_letter='Hi', bid_amount=90,
+                                        delivery_time=3)
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Test each changelist page costs the same number of queries at 3 and 10 jobs"""
+        urls = {
+            'job': reverse('admin:core_job_changelist'),
+            'proposal': reverse('admin:core_proposal_changelist'),
+            'filtered job': reverse('admin:core_job_changelist') + f'?client__id__exact={self.owner.pk}',
+            'filtered proposal': reverse('admin:core_proposal_changelist') + f'?freelancer__id__exact={self.freelancers[0].pk}',
+        }
+        # Session, user, the page and its count; filtered pages add the selected object
+        expected = {'job': 4, 'proposal': 4, 'filtered job': 5, 'filtered proposal': 5}
+        for rows in (3, 10):
+            self.add_rows(rows - Job.objects.count())
+            for name, url in urls.items():
+                with self.subTest(name, rows=rows):
+                    count, response = self.count_queries(url)
+                    self.assertEqual(count, expected[name])
+                    self.assertNotContains(response, 'total)')
+
+    def test_filters_list_only_the_selected_object(self):
+        """Test the sidebar never lists every user, and shows the one being filtered on"""
+        response = self.client.get(reverse('admin:core_job_changelist'))
+        self.assertNotContains(response, 'adminfree1</a>')
+        self.assertContains(response, f'href="?client__id__exact={self.owner.pk}"')
+
+        response = self.client.get(
+            reverse('admin:core_proposal_changelist') + f'?freelancer__id__exact={self.freelancers[1].pk}'
+        )
+        changelist = response.context['cl']
+        filters = {spec.title: spec for spec in changelist.filter_specs}
+        self.assertEqual(changelist.result_count, 3)
+        self.assertNotIn('job', filters)
+        self.assertEqual([choice['display'] for choice in filters['freelancer'].choices(changelist)],
+                         ['All', 'adminfree1'])
+
+    def test_search_matches_prefixes_and_exact_usernames(self):
+        """Test search uses prefix and exact lookups instead of icontains"""
+        url = reverse('admin:core_proposal_changelist')
+        self.assertEqual(self.client.get(url, {'q': '"Logo 1"'}).context['cl'].result_count, 3)
+        self.assertEqual(self.client.get(url, {'q': 'adminfree2'}).context['cl'].result_count, 3)
+        self.assertEqual(self.client.get(url, {'q': 'ogo'}).context['cl'].result_count, 0)
+        self.assertEqual(self.client.get(url, {'q': 'Hi'}).context['cl'].result_count, 0)
+
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'term': 'adminf', 'app_label': 'core', 'model_name': 'proposal', 'field_name': 'freelancer',
+        })
+        self.assertEqual([result['text'] for result in response.json()['results']],
+                         ['adminfree0', 'adminfree1', 'adminfree2'])
@@ -0,0 +1,236 @@
+"""
+Token-bucket rate limiting shared by every worker.
+
+Each client gets a bucket of ``N`` tokens that refills at ``N`` per period
+(``THROTTLE_RATES``, e.g. ``'300/min'``); a request spends its cost in
+tokens (``THROTTLE_COSTS``, default 1), so expensive endpoints such as
+search or registration drain the bucket faster. Buckets are tracked with
+GCRA: the only state per client is the time at which its bucket will be
+full again, so a check is one read and one write of a float.
+
+That state lives in one of two stores:
+
+* ``SharedMemoryBucketStore`` when ``THROTTLE_STORE_PATH`` is set: a
+  memory-mapped file shared by the gunicorn workers on a host. Updates
+  take a byte-range ``lockf`` on the key's page, so they are atomic and
+  cost a few microseconds.
+* ``CacheBucketStore`` otherwise: the ``THROTTLE_CACHE`` cache alias, e.g.
+  Redis shared by several hosts. Reads and writes are not atomic, so
+  concurrent requests from one client can overshoot by about one request
+  per worker.
+"""
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import THROTTLED
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    Parse ``'<tokens>/<period>'`` (period s, min, hour or day).
+
+    Returns:
+        tuple: (capacity in tokens, seconds per token)
+    """
+    tokens, period = rate.split('/')
+    tokens = int(tokens)
+    return tokens, PERIODS[period.strip()[0]] / tokens
+
+
+def gcra(tat, now, interval, capacity, cost):
+    """
+    Spend ``cost`` tokens from a bucket whose theoretical arrival time is ``tat``.
+
+    Args:
+        tat: Time the bucket is full again, or None for a new bucket
+        now: Current time in seconds
+        interval: Seconds to refill one token
+        capacity: Bucket size in tokens
+        cost: Tokens this request spends (capped at ``capacity``)
+
+    Returns:
+        tuple: (allowed, new tat to store, seconds to wait if refused)
+    """
+    tat = max(tat or now, now)
+    new_tat = tat + min(cost, capacity) * interval
+    allow_at = new_tat - capacity * interval
+    if allow_at > now:
+        return False, tat, allow_at - now
+    return True, new_tat, 0.0
+
+
+class CacheBucketStore:
+    """
+    Bucket state in a Django cache, one key per client.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def consume(self, key, interval, capacity, cost, now):
+        cache_key = f'throttle:{key}'
+        allowed, tat, wait = gcra(self.cache.get(cache_key), now, interval, capacity, cost)
+        if allowed:
+            self.cache.set(cache_key, tat, timeout=math.ceil(tat - now) + 1)
+        return allowed, wait
+
+
+class SharedMemoryBucketStore:
+    """
+    Bucket state in a memory-mapped file shared between processes.
+
+    The file is a table of ``slots`` entries of ``<uint64 key hash><float64
+    tat>``, grouped in pages of ``PAGE`` slots. A key hashes to one page and
+    takes the slot holding its hash, else a free slot (empty, or a bucket
+    that has refilled completely and so carries no state), else the slot
+    closest to refilling. Only that page is locked while it is updated.
+    """
+
+    PAGE = 8
+    SLOT = struct.Struct('<Qd')
+
+    def __init__(self, path, slots=65536):
+        self.pages = max(1, slots // self.PAGE)
+        size = self.pages * self.PAGE * self.SLOT.size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size)
+
+    def consume(self, key, interval, capacity, cost, now):
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        page_size = self.PAGE * self.SLOT.size
+        start = (digest % self.pages) * page_size
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, page_size, start)
+        try:
+            found = free = oldest = None
+            for offset in range(start, start + page_size, self.SLOT.size):
+                stored, tat = self.SLOT.unpack_from(self.map, offset)
+                if stored == digest:
+                    found = offset
+                    break
+                if free is None and (stored == 0 or tat <= now):
+                    free = offset
+                if oldest is None or tat < oldest[1]:
+                    oldest = (offset, tat)
+            if found is not None:
+                slot = found
+            else:
+                slot = free if free is not None else oldest[0]
+                tat = None
+            allowed, new_tat, wait = gcra(tat, now, interval, capacity, cost)
+            if allowed:
+                self.SLOT.pack_into(self.map, slot, digest, new_tat)
+            return allowed, wait
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, page_size, start)
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    The bucket store for this process, reopened after a fork.
+    """
+    global _store, _store_pid
+    pid = os.getpid()
+    if _store_pid != pid:
+        with _store_lock:
+            if _store_pid != pid:
+                if settings.THROTTLE_STORE_PATH:
+                    _store = SharedMemoryBucketStore(settings.THROTTLE_STORE_PATH, settings.THROTTLE_STORE_SLOTS)
+                else:
+                    _store = CacheBucketStore(settings.THROTTLE_CACHE)
+                _store_pid = pid
+    return _store
+
+
+def reset_store():
+    """
+    Drop this process's store; the next check opens one from settings.
+    """
+    global _store, _store_pid
+    with _store_lock:
+        _store = None
+        _store_pid = None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF throttle spending a per-endpoint cost from a token bucket.
+
+    Views can set the cost of a request with ``get_throttle_cost(request)``;
+    otherwise it is ``THROTTLE_COSTS[url name]``, defaulting to 1.
+    Subclasses set ``scope`` (a key of ``THROTTLE_RATES``) and return the
+    bucket key from ``get_bucket_key``, or None to skip the request.
+    """
+    scope = None
+
+    def get_bucket_key(self, request, view):
+        raise NotImplementedError
+
+    def get_cost(self, request, view):
+        if hasattr(view, 'get_throttle_cost'):
+            return view.get_throttle_cost(request)
+        match = request.resolver_match
+        return settings.THROTTLE_COSTS.get(match.url_name if match else None, 1)
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        if not settings.THROTTLE_ENABLED:
+            return True
+        key = self.get_bucket_key(request, view)
+        if key is None:
+            return True
+        capacity, interval = parse_rate(settings.THROTTLE_RATES[self.scope])
+        allowed, wait = get_store().consume(
+            f'{self.scope}:{key}', interval, capacity, self.get_cost(request, view), time.time(),
+        )
+        if not allowed:
+            THROTTLED.labels(self.scope).inc()
+            self.retry_after = wait
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """
+    One bucket per authenticated user.
+    """
+    scope = 'user'
+
+    def get_bucket_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return str(request.user.pk)
+        return None
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """
+    One bucket per client IP, for every request including anonymous ones.
+
+    The IP comes from DRF's ``get_ident``, which trusts only the last
+    ``NUM_PROXIES`` entries of X-Forwarded-For.
+    """
+    scope = 'ip'
+
+    def get_bucket_key(self, request, view):
+        return self.get_ident(request)
@@ -0,0 +1,345 @@
+"""
+Signed upload tickets for direct-to-storage uploads.
+
+Clients upload files straight to the storage target instead of through an
+API request:
+
+1. ``POST /api/uploads/`` issues a short-lived ticket naming the storage
+   key the file will get, plus where and how to send it: a Cloudinary
+   signed upload when Cloudinary is enabled, otherwise the local receiver
+   at ``PUT /api/uploads/receive/<ticket>/``.
+2. The client sends the file there.
+3. ``POST /api/uploads/confirm/`` attaches the stored name to a profile,
+   job or proposal the user owns.
+
+The ticket is signed with ``django.core.signing`` and carries the user,
+target and storage name, so a client can only confirm files it was issued
+a ticket for, and only before the ticket expires. A ticket is confirmed at
+most once: the name is recorded in ``ConfirmedUpload`` (unique) in the
+same transaction that attaches it, so one file never backs two rows whose
+delete hooks would remove it from under each other.
+
+Limits are enforced where the bytes land. Cloudinary uploads sign
+``allowed_formats`` (Cloudinary's upload API has no signed size limit),
+and confirm checks the stored asset's ``bytes`` and ``format``; the local
+receiver stops reading at the size limit, and confirm checks that profile
+pictures decode as images. Files that break a limit are deleted at confirm.
+Profile pictures are Cloudinary images; attachments are raw resources, so
+documents of any allowed type can be uploaded.
+"""
+import os
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import ConfirmedUpload, Job, Profile, Proposal
+from .storage_gateway import StorageGatewayError, get_gateway
+from .storage_utils import RAW_PREFIX, delete_file
+
+
+SALT = 'core.uploads'
+
+# target -> (model, file field)
+TARGETS = {
+    'profile_picture': (Profile, 'profile_picture'),
+    'job_attachment': (Job, 'attachment'),
+    'proposal_attachment': (Proposal, 'proposal_attachment'),
+}
+
+# target -> Cloudinary resource type
+RESOURCE_TYPES = {
+    'profile_picture': 'image',
+    'job_attachment': 'raw',
+    'proposal_attachment': 'raw',
+}
+
+
+class UploadTicketError(Exception):
+    """Ticket is invalid, expired, or does not fit the request"""
+
+
+def allowed_formats(target):
+    """
+    File extensions (Cloudinary formats) a target accepts.
+    """
+    if RESOURCE_TYPES[target] == 'image':
+        return settings.UPLOAD_IMAGE_FORMATS
+    return settings.UPLOAD_ATTACHMENT_FORMATS
+
+
+def storage_name(target, filename):
+    """
+    Unique storage key under the target field's upload_to folder.
+
+    Cloudinary image keys have no extension; Cloudinary appends the
+    format. Raw keys keep the file name, extension included, under
+    ``RAW_PREFIX``.
+    """
+    model, field_name = TARGETS[target]
+    folder = str(model._meta.get_field(field_name).upload_to).strip('/')
+    base = get_valid_filename(os.path.basename(filename)) or 'file'
+    key = uuid.uuid4().hex
+    if settings.CLOUDINARY_ENABLED:
+        if RESOURCE_TYPES[target] == 'raw':
+            return f'{RAW_PREFIX}{folder}/{key}_{base}'
+        return f'{folder}/{key}'
+    return f'{folder}/{key}_{base}'
+
+
+def issue_ticket(user, target, filename, size=None):
+    """
+    Create a signed upload ticket.
+
+    Args:
+        user: Uploading user
+        target: Key of TARGETS
+        filename: Client file name, used for the extension and local name
+        size: Declared size in bytes, if known
+
+    Returns:
+        dict: ``ticket``, ``name``, ``max_size``, ``expires_in`` and the
+        upload instructions (``method``, ``url``, ``fields``) without the
+        URL made absolute
+
+    Raises:
+        UploadTicketError: If the target, file name, type or size is not allowed
+    """
+    if target not in TARGETS:
+        raise UploadTicketError(f"Unknown target '{target}'. Choose one of: {', '.join(TARGETS)}")
+    if not filename:
+        raise UploadTicketError('A filename is required')
+    extension = os.path.splitext(filename)[1][1:].lower()
+    if extension not in allowed_formats(target):
+        raise UploadTicketError(f"File extension '{extension}' is not allowed for {target}")
+    max_size = settings.UPLOAD_MAX_SIZE
+    if size is not None and size > max_size:
+        raise UploadTicketError(f'Files may be at most {max_size} bytes')
+
+    name = storage_name(target, filename)
+    ticket = signing.dumps({'u': user.pk, 't': target, 'n': name, 'm': max_size}, salt=SALT, compress=True)
+    data = {
+        'ticket': ticket,
+        'name': name,
+        'max_size': max_size,
+        'expires_in': settings.UPLOAD_TICKET_MAX_AGE,
+    }
+    if settings.CLOUDINARY_ENABLED:
+        data.update(cloudinary_instructions(name, target))
+    else:
+        data.update(local_instructions(ticket))
+    return data
+
+
+def cloudinary_instructions(name, target):
+    from cloudinary import utils
+
+    fields = utils.sign_request({
+        'public_id': name,
+        'timestamp': int(time.time()),
+        'allowed_formats': ','.join(allowed_formats(target)),
+    }, {})
+    return {
+        'method': 'POST',
+        'url': utils.cloudinary_api_url('upload', resource_type=RESOURCE_TYPES[target]),
+        'fields': fields,
+    }
+
+
+def local_instructions(ticket):
+    from django.urls import reverse
+
+    return {
+        'method': 'PUT',
+        'url': reverse('upload-receive', args=[ticket]),
+        'fields': {},
+    }
+
+
+def read_ticket(ticket, user=None):
+    """
+    Verify a ticket and return its payload.
+
+    Args:
+        ticket: Signed ticket string
+        user: If given, the ticket must have been issued to this user
+
+    Returns:
+        dict: Payload with ``u`` (user id), ``t`` (target), ``n`` (storage
+        name) and ``m`` (max size)
+
+    Raises:
+        UploadTicketError: If the ticket is tampered with, expired or not
+            the user's
+    """
+    try:
+        payload = signing.loads(ticket, salt=SALT, max_age=settings.UPLOAD_TICKET_MAX_AGE)
+    except signing.SignatureExpired:
+        raise UploadTicketError('Upload ticket has expired')
+    except signing.BadSignature:
+        raise UploadTicketError('Invalid upload ticket')
+    if user is not None and payload['u'] != user.pk:
+        raise UploadTicketError('Upload ticket was issued to another user')
+    return payload
+
+
+class LimitedReader:
+    """
+    File-like view of a request body that refuses to read past ``limit`` bytes.
+    """
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.consumed = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.consumed += len(data)
+        if self.consumed > self.limit:
+            raise UploadTicketError(f'Files may be at most {self.limit} bytes')
+        return data
+
+
+def store_local_upload(payload, stream, content_length):
+    """
+    Write a request body to the ticket's storage name, exactly once.
+
+    Returns:
+        int: Bytes written
+
+    Raises:
+        UploadTicketError: If the body is too large or the name was used
+    """
+    from django.core.files import File
+
+    name = payload['n']
+    if content_length is not None and content_length > payload['m']:
+        raise UploadTicketError(f"Files may be at most {payload['m']} bytes")
+    if default_storage.exists(name):
+        raise UploadTicketError('This ticket has already been used')
+
+    reader = LimitedReader(stream, payload['m'])
+    try:
+        saved = default_storage.save(name, File(reader, name=os.path.basename(name)))
+    except UploadTicketError:
+        default_storage.delete(name)
+        raise
+    if saved != name:
+        # Lost a race with a concurrent upload on the same ticket
+        default_storage.delete(saved)
+        raise UploadTicketError('This ticket has already been used')
+    return reader.consumed
+
+
+def confirm(payload, user, object_id=None):
+    """
+    Attach an uploaded file to the object the ticket's target names.
+
+    Args:
+        payload: Verified ticket payload from read_ticket
+        user: Confirming user
+        object_id: Job or proposal id; ignored for profile pictures
+
+    Returns:
+        Model instance that now references the file
+
+    Raises:
+        UploadTicketError: If the object is not the user's, the file is
+            missing or breaks the ticket's limits, or the ticket was
+            already confirmed
+    """
+    model, field_name = TARGETS[payload['t']]
+    if model is Profile:
+        instance = Profile.objects.get(user=user)
+    else:
+        owner = {Job: 'client', Proposal: 'freelancer'}[model]
+        instance = model.objects.filter(pk=object_id, **{owner: user}).first()
+        if instance is None:
+            raise UploadTicketError(f'{model.__name__} not found or not yours')
+
+    name = payload['n']
+    if ConfirmedUpload.objects.filter(name=name).exists():
+        raise UploadTicketError('This ticket has already been confirmed')
+    check_upload(payload)
+
+    try:
+        with transaction.atomic():
+            ConfirmedUpload.objects.create(name=name, user=user)
+            setattr(instance, field_name, name)
+            instance.save(update_fields=[field_name, 'updated_at'])
+    except IntegrityError:
+        # A concurrent confirm of the same ticket won
+        raise UploadTicketError('This ticket has already been confirmed')
+    return instance
+
+
+def check_upload(payload):
+    """
+    Check the file for a ticket arrived and fits the ticket's limits.
+
+    A file that arrived but is too large, of another type, or (for
+    profile pictures) not an image is deleted.
+
+    Raises:
+        UploadTicketError: If the file is missing or was refused, or
+            Cloudinary could not be asked
+    """
+    name, target, max_size = payload['n'], payload['t'], payload['m']
+    if settings.CLOUDINARY_ENABLED:
+        try:
+            resource = get_gateway().resource(name, RESOURCE_TYPES[target])
+        except StorageGatewayError as exc:
+            raise UploadTicketError(f'Could not check the upload, try again: {exc}')
+        if resource is None:
+            raise UploadTicketError('The file has not been uploaded yet')
+        size = resource.get('bytes', 0)
+        extension = resource.get('format') or os.path.splitext(name)[1][1:]
+    else:
+        if not default_storage.exists(name):
+            raise UploadTicketError('The file has not been uploaded yet')
+        size = default_storage.size(name)
+        extension = _image_format(name) if RESOURCE_TYPES[target] == 'image' else os.path.splitext(name)[1][1:]
+
+    if size > max_size:
+        problem = f'Files may be at most {max_size} bytes'
+    elif extension is None:
+        problem = 'The file is not a valid image'
+    elif extension.lower() not in allowed_formats(target):
+        problem = f"File type '{extension}' is not allowed for {target}"
+    else:
+        return
+    delete_file(name)
+    raise UploadTicketError(problem)
+
+
+def _image_format(name):
+    """
+    Format of a stored image as Pillow decodes it, or None if it is not one.
+    """
+    from PIL import Image
+
+    try:
+        with default_storage.open(name) as stored, Image.open(stored) as image:
+            image.verify()
+            return image.format.lower()
+    except Exception:
+        return None
+
+
+def purge_confirmed(now=None):
+    """
+    Forget confirmed names whose tickets have expired and can't be replayed.
+
+    Returns:
+        int: Records deleted
+    """
+    cutoff = (now or timezone.now()) - timedelta(seconds=settings.UPLOAD_TICKET_MAX_AGE)
+    deleted, _ = ConfirmedUpload.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
@@ -6,7 +6,25 @@ urlpatterns = [
     path('profile/', views.user_profile, name='user-profile'),
     path('profile/picture/', views.update_profile_picture, name='update-profile-picture'),
     path('my-jobs/', views.my_jobs, name='my-jobs'),
+    path('dashboard/', views.dashboard, name='dashboard'),
     path('jobs/', views.JobListCreate.as_view(), name='job-list'),
     path('jobs/<int:job_id>/proposals/', views.job_proposals, name='job-proposals'),
     path('proposals/', views.ProposalListCreate.as_view(), name='proposal-list'),
+    path('notifications/', views.NotificationList.as_view(), name='notification-list'),
+    path('notifications/read/', views.mark_notifications_read, name='notifications-read'),
+    path('messages/', views.ThreadList.as_view(), name='thread-list'),
+    path('messages/send/', views.send_message, name='message-send'),
+    path('messages/<int:thread_id>/', views.MessageList.as_view(), name='message-list'),
+    path('messages/<int:thread_id>/read/', views.mark_thread_read, name='thread-read'),
+    path('contracts/', views.ContractListCreate.as_view(), name='contract-list'),
+    path('contracts/<int:pk>/', views.ContractDetail.as_view(), name='contract-detail'),
+    path('contracts/<int:pk>/complete/', views.complete_contract, name='contract-complete'),
+    path('payments/initiate/', views.initiate_payment, name='payment-initiate'),
+    path('payments/release/', views.release_payment, name='payment-release'),
+    path('payments/refund/', views.refund_payment, name='payment-refund'),
+    path('payments/history/', views.PaymentHistory.as_view(), name='payment-history'),
+    path('payments/earnings/', views.earnings, name='payment-earnings'),
+    path('uploads/', views.create_upload_ticket, name='upload-ticket'),
+    path('uploads/confirm/', views.confirm_upload, name='upload-confirm'),
+    path('uploads/receive/<str:ticket>/', views.receive_upload, name='upload-receive'),
 ]
\ No newline at end of file
@@ -1,13 +1,30 @@
-from rest_framework import generics, permissions, status
+from rest_framework import generics, permissions, serializers as drf_serializers, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Q
-from .models import Profile, Job, Proposal
+from django.db import transaction
+from django.db.models import Avg, Count, Min, Q
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from . import metrics as metrics_registry
+from . import escrow, hiring, messaging, notifications, pubsub, uploads
+from .archive import with_archived
+from .idempotency import IdempotentCreateMixin
+from .models import (
+    ArchivedJob, ArchivedProposal, Message, Milestone, Notification, Payment, Profile, Job, Proposal, Thread,
+    UserFinancialTotals,
+)
+from .storage_utils import field_file_url, ingest_file
 from .serializers import (
-    JobSerializer, ProposalSerializer, RegisterSerializer,
-    UserSerializer
+    ContractCreateSerializer, ContractSerializer, JobSerializer, MessageSerializer, NotificationSerializer,
+    PaymentSerializer, ProfileSerializer, ProposalDecisionSerializer, ProposalSerializer, RegisterSerializer,
+    SendMessageSerializer, ThreadSerializer, UserSerializer, JOB_ROW_SERIALIZER, PROPOSAL_ROW_SERIALIZER
 )
 
 
@@ -30,18 +47,97 @@ def register(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class JobListCreate(generics.ListCreateAPIView):
+def sparse_row_serializer(request, row_serializer):
+    """
+    Narrow a row serializer to the ?fields= / ?omit= query parameters
+
+    Both take comma separated field names; omitted columns are left out of
+    the SELECT as well as the response.
+    """
+    fields = request.query_params.get('fields')
+    omit = request.query_params.get('omit')
+    if not fields and not omit:
+        return row_serializer
+
+    def split(value):
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    try:
+        return row_serializer.subset(split(fields) if fields else None, split(omit) if omit else ())
+    except ValueError as exc:
+        raise ValidationError({'fields': [str(exc)]})
+
+
+class RowListMixin:
+    """
+    Serve list requests through a RowSerializer instead of model instances
+
+    Views whose history includes archived rows return them from
+    get_archived_queryset(); they are listed after matching live rows.
+    """
+    row_serializer = None
+
+    def get_archived_queryset(self):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        row_serializer = sparse_row_serializer(request, self.row_serializer)
+        queryset = self.filter_queryset(self.get_queryset())
+        archived = self.get_archived_queryset()
+        if archived is None:
+            rows = row_serializer.values(queryset)
+        else:
+            rows = with_archived(row_serializer, queryset, archived)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(row_serializer.serialize(rows, request))
+        return self.get_paginated_response(row_serializer.serialize(page, request))
+
+
+# Upper bound on ids accepted by /api/jobs/?ids=
+MAX_BATCH_IDS = 100
+
+# Recent jobs/proposals listed on the dashboard; counts cover all of them
+DASHBOARD_LIMIT = 20
+
+
+def batch_ids(request):
+    """
+    Parse the ?ids= query parameter into a list of job ids, or None if absent
+    """
+    value = request.query_params.get('ids')
+    if value is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+    except ValueError:
+        raise ValidationError({'ids': ['Expected a comma separated list of integers.']})
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValidationError({'ids': [f'At most {MAX_BATCH_IDS} ids can be requested at once.']})
+    return ids
+
+
+class JobListCreate(IdempotentCreateMixin, RowListMixin, generics.ListCreateAPIView):
     """
     List all active jobs or create a new job
+
+    With ``?ids=1,2,3`` the listed jobs are returned unpaginated: active
+    jobs plus the user's own inactive ones. Missing ids are skipped.
     """
     serializer_class = JobSerializer
+    row_serializer = JOB_ROW_SERIALIZER
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         """
-        Return active jobs, optionally filtered by search query
+        Return active jobs, optionally filtered by search query or ids
         """
-        queryset = Job.objects.filter(is_active=True)
+        ids = batch_ids(self.request)
+        if ids is not None:
+            return Job.objects.filter(Q(is_active=True) | Q(client=self.request.user), id__in=ids)
+
+        # Jobs past their deadline drop out at once, before the expiry sweep
+        queryset = Job.objects.filter(is_active=True).exclude(deadline__lte=timezone.now())
         
         # Filter by search query if provided
         search_query = self.request.query_params.get('search', None)
@@ -54,18 +150,40 @@ class JobListCreate(generics.ListCreateAPIView):
         
         return queryset
 
+    def get_throttle_cost(self, request):
+        """
+        Charge searches, the most expensive query, more rate limit tokens
+        """
+        if request.method == 'GET' and request.query_params.get('search'):
+            return settings.THROTTLE_COSTS.get('job-search', 1)
+        return 1
+
+    def paginate_queryset(self, queryset):
+        if 'ids' in self.request.query_params:
+            return None
+        return super().paginate_queryset(queryset)
+
     def perform_create(self, serializer):
         """
         Set the client to the current user when creating a job
+        and announce it on the event stream
         """
-        serializer.save(client=self.request.user)
+        job = serializer.save(client=self.request.user)
+        pubsub.publish_on_commit('jobs', 'job.created', {
+            'id': job.id,
+            'title': job.title,
+            'budget': str(job.budget),
+            'skills_required': job.skills_required,
+            'deadline': job.deadline.isoformat() if job.deadline else None,
+        })
 
 
-class ProposalListCreate(generics.ListCreateAPIView):
+class ProposalListCreate(IdempotentCreateMixin, RowListMixin, generics.ListCreateAPIView):
     """
     List all proposals or create a new proposal
     """
     serializer_class = ProposalSerializer
+    row_serializer = PROPOSAL_ROW_SERIALIZER
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -81,6 +199,15 @@ class ProposalListCreate(generics.ListCreateAPIView):
         # If user is a client, show proposals for their jobs
         return Proposal.objects.filter(job__client=user)
 
+    def get_archived_queryset(self):
+        """
+        Return the same user's archived proposals
+        """
+        user = self.request.user
+        if hasattr(user, 'profile') and user.profile.is_freelancer:
+            return ArchivedProposal.objects.filter(freelancer=user)
+        return ArchivedProposal.objects.filter(job__client=user)
+
     def perform_create(self, serializer):
         """
         Set the freelancer to the current user when creating a proposal
@@ -98,7 +225,324 @@ class ProposalListCreate(generics.ListCreateAPIView):
             from rest_framework import serializers
             raise serializers.ValidationError("You have already submitted a proposal for this job")
         
-        serializer.save(freelancer=user)
+        # The outbox event commits, or rolls back, with the proposal
+        with transaction.atomic():
+            proposal = serializer.save(freelancer=user)
+            notifications.emit(
+                'proposal.created',
+                proposal_id=proposal.id,
+                job_id=job.id,
+                job_title=job.title,
+                client_id=job.client_id,
+                freelancer_id=user.id,
+            )
+            pubsub.publish_on_commit(f'user:{job.client_id}', 'proposal.created', {
+                'id': proposal.id,
+                'job_id': job.id,
+                'job_title': job.title,
+                'freelancer_id': user.id,
+                'bid_amount': str(proposal.bid_amount),
+            })
+
+
+class NotificationPagination(CursorPagination):
+    """
+    Keyset pagination over notification ids, newest first
+    """
+    ordering = '-id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['unread'] = notifications.unread_count(self.request.user)
+        return response
+
+
+class NotificationList(generics.ListAPIView):
+    """
+    List the current user's notifications with their unread count
+    """
+    serializer_class = NotificationSerializer
+    pagination_class = NotificationPagination
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Notification.objects.filter(recipient=self.request.user)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_notifications_read(request):
+    """
+    Mark the listed notification ids, or all notifications, as read
+    """
+    ids = request.data.get('ids')
+    if ids is not None:
+        if not isinstance(ids, list):
+            raise ValidationError({'ids': ['Expected a list of notification ids.']})
+        try:
+            ids = [int(value) for value in ids]
+        except (TypeError, ValueError):
+            raise ValidationError({'ids': ['Expected a list of notification ids.']})
+    marked = notifications.mark_read(request.user, ids)
+    return Response({'marked': marked, 'unread': notifications.unread_count(request.user)})
+
+
+class ThreadPagination(CursorPagination):
+    """
+    Keyset pagination over threads, most recent activity first
+    """
+    ordering = ('-last_message_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ThreadList(generics.ListAPIView):
+    """
+    List the current user's message threads with unread counts
+    """
+    serializer_class = ThreadSerializer
+    pagination_class = ThreadPagination
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return messaging.threads_for(self.request.user).filter(last_seq__gt=0)
+
+
+class MessagePagination(CursorPagination):
+    """
+    Keyset pagination over a thread's messages, newest first
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+def _participant_thread(request, thread_id):
+    """
+    The thread if the current user takes part in it, else 404
+    """
+    thread = Thread.objects.filter(
+        Q(client=request.user) | Q(freelancer=request.user), pk=thread_id,
+    ).first()
+    if thread is None:
+        raise NotFound('Thread not found')
+    return thread
+
+
+class MessageList(generics.ListAPIView):
+    """
+    A thread's message history, newest first
+    """
+    serializer_class = MessageSerializer
+    pagination_class = MessagePagination
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        thread = _participant_thread(self.request, self.kwargs['thread_id'])
+        return Message.objects.filter(thread=thread)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def send_message(request):
+    """
+    Send a message to a thread, or about a proposal (starting its thread)
+    """
+    serializer = SendMessageSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    if 'thread' in data:
+        thread = _participant_thread(request, data['thread'])
+    else:
+        proposal = Proposal.objects.select_related('job').filter(
+            Q(job__client=request.user) | Q(freelancer=request.user), pk=data['proposal'],
+        ).first()
+        if proposal is None:
+            raise NotFound('Proposal not found')
+        thread = messaging.thread_for_proposal(proposal)
+    message = messaging.send(thread, request.user, data['body'])
+    return Response(MessageSerializer(message).data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_thread_read(request, thread_id):
+    """
+    Mark a thread read up to message ``up_to``, or entirely
+    """
+    thread = _participant_thread(request, thread_id)
+    up_to = request.data.get('up_to')
+    if up_to is not None:
+        try:
+            up_to = int(up_to)
+        except (TypeError, ValueError):
+            raise ValidationError({'up_to': ['Expected a message id.']})
+    return Response({'unread': messaging.mark_read(thread, request.user, up_to)})
+
+
+class ContractPagination(CursorPagination):
+    """
+    Keyset pagination over contracts or payments, newest first
+    """
+    ordering = '-id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def _escrow_error(exc):
+    """
+    Response for a refused contract or payment operation
+    """
+    if isinstance(exc, escrow.EscrowForbidden):
+        return Response({'error': str(exc)}, status=status.HTTP_403_FORBIDDEN)
+    if isinstance(exc, escrow.PaymentDeclined):
+        return Response(
+            {'error': str(exc), 'payment': PaymentSerializer(exc.payment).data},
+            status=status.HTTP_402_PAYMENT_REQUIRED,
+        )
+    if isinstance(exc, escrow.PaymentPending):
+        return Response(
+            {'error': str(exc), 'payment': PaymentSerializer(exc.payment).data},
+            status=status.HTTP_202_ACCEPTED,
+        )
+    return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+
+
+class ContractListCreate(generics.ListCreateAPIView):
+    """
+    List the current user's contracts or create one from an accepted proposal
+    """
+    serializer_class = ContractSerializer
+    pagination_class = ContractPagination
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return escrow.contracts_for(self.request.user).prefetch_related('milestones')
+
+    def create(self, request, *args, **kwargs):
+        serializer = ContractCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        proposal = Proposal.objects.select_related('job').filter(
+            pk=serializer.validated_data['proposal'], job__client=request.user,
+        ).first()
+        if proposal is None:
+            raise NotFound('Proposal not found')
+        try:
+            contract = escrow.create_contract(
+                proposal, request.user, serializer.validated_data.get('milestones'),
+            )
+        except escrow.EscrowError as exc:
+            return _escrow_error(exc)
+        contract = escrow.contracts_for(request.user).prefetch_related('milestones').get(pk=contract.pk)
+        return Response(ContractSerializer(contract).data, status=status.HTTP_201_CREATED)
+
+
+class ContractDetail(generics.RetrieveAPIView):
+    """
+    A contract with its milestones and escrow totals
+    """
+    serializer_class = ContractSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return escrow.contracts_for(self.request.user).prefetch_related('milestones')
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def complete_contract(request, pk):
+    """
+    Mark a contract completed once every milestone is settled
+    """
+    contract = escrow.contracts_for(request.user).filter(pk=pk).first()
+    if contract is None:
+        raise NotFound('Contract not found')
+    try:
+        escrow.complete_contract(contract, request.user)
+    except escrow.EscrowError as exc:
+        return _escrow_error(exc)
+    contract = escrow.contracts_for(request.user).prefetch_related('milestones').get(pk=pk)
+    return Response(ContractSerializer(contract).data)
+
+
+def _move_milestone(request, kind):
+    milestone_id = request.data.get('milestone')
+    try:
+        milestone_id = int(milestone_id)
+    except (TypeError, ValueError):
+        raise ValidationError({'milestone': ['Expected a milestone id.']})
+    try:
+        payment = escrow.move(milestone_id, request.user, kind)
+    except Milestone.DoesNotExist:
+        raise NotFound('Milestone not found')
+    except escrow.EscrowError as exc:
+        return _escrow_error(exc)
+    return Response(PaymentSerializer(payment).data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def initiate_payment(request):
+    """
+    Pay a pending milestone into escrow (client)
+    """
+    return _move_milestone(request, 'escrow')
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def release_payment(request):
+    """
+    Release an escrowed milestone to the freelancer (client)
+    """
+    return _move_milestone(request, 'release')
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def refund_payment(request):
+    """
+    Refund an escrowed milestone to the client (freelancer or staff)
+    """
+    return _move_milestone(request, 'refund')
+
+
+class PaymentHistory(generics.ListAPIView):
+    """
+    Ledger entries on the current user's contracts, newest first
+    """
+    serializer_class = PaymentSerializer
+    pagination_class = ContractPagination
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        return Payment.objects.filter(Q(contract__client=user) | Q(contract__freelancer=user))
+
+
+_total = drf_serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def earnings(request):
+    """
+    The user's running escrow totals as client and as freelancer
+    """
+    zero = {'escrowed': '0.00', 'released': '0.00', 'refunded': '0.00', 'held': '0.00'}
+    data = {'client': dict(zero), 'freelancer': dict(zero)}
+    for totals in UserFinancialTotals.objects.filter(user=request.user):
+        data[totals.role] = {
+            name: _total.to_representation(getattr(totals, name))
+            for name in ('escrowed', 'released', 'refunded', 'held')
+        }
+    return Response(data)
 
 
 @api_view(['GET'])
@@ -122,12 +566,13 @@ def update_profile_picture(request):
     profile = user.profile
     
     if 'profile_picture' in request.FILES:
-        profile.profile_picture = request.FILES['profile_picture']
+        upload = request.FILES['profile_picture']
+        profile.profile_picture = ingest_file(upload, folder='profiles') or upload
         profile.save()
         
         return Response({
             'message': 'Profile picture updated successfully',
-            'profile_picture_url': profile.profile_picture.url if profile.profile_picture else None
+            'profile_picture_url': field_file_url(profile.profile_picture)
         }, status=status.HTTP_200_OK)
     
     return Response(
@@ -136,6 +581,61 @@ def update_profile_picture(request):
     )
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def create_upload_ticket(request):
+    """
+    Issue a signed ticket for uploading a file directly to storage
+    """
+    size = request.data.get('size')
+    try:
+        ticket = uploads.issue_ticket(
+            request.user,
+            request.data.get('target'),
+            request.data.get('filename'),
+            size=int(size) if size not in (None, '') else None,
+        )
+    except (uploads.UploadTicketError, ValueError) as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    ticket['url'] = request.build_absolute_uri(ticket['url'])
+    return Response(ticket, status=status.HTTP_201_CREATED)
+
+
+@csrf_exempt
+@require_http_methods(['PUT'])
+def receive_upload(request, ticket):
+    """
+    Local stand-in for a storage service: store a raw request body under a ticket
+
+    Authorised by the ticket alone. The body is streamed to storage in
+    chunks and never parsed as a form.
+    """
+    try:
+        payload = uploads.read_ticket(ticket)
+        content_length = request.META.get('CONTENT_LENGTH')
+        size = uploads.store_local_upload(payload, request, int(content_length) if content_length else None)
+    except uploads.UploadTicketError as exc:
+        return JsonResponse({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({'name': payload['n'], 'size': size}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def confirm_upload(request):
+    """
+    Attach a directly uploaded file to the user's profile, job or proposal
+    """
+    try:
+        payload = uploads.read_ticket(request.data.get('ticket') or '', request.user)
+        instance = uploads.confirm(payload, request.user, request.data.get('object_id'))
+    except uploads.UploadTicketError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer_class = {Profile: ProfileSerializer, Job: JobSerializer, Proposal: ProposalSerializer}[type(instance)]
+    return Response(serializer_class(instance, context={'request': request}).data)
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def my_jobs(request):
@@ -149,24 +649,130 @@ def my_jobs(request):
         )
     
     jobs = Job.objects.filter(client=request.user)
-    serializer = JobSerializer(jobs, many=True)
-    return Response(serializer.data)
+    archived = ArchivedJob.objects.filter(client=request.user)
+    row_serializer = sparse_row_serializer(request, JOB_ROW_SERIALIZER)
+    return Response(row_serializer.serialize(with_archived(row_serializer, jobs, archived)))
 
 
-@api_view(['GET'])
+@api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
 def job_proposals(request, job_id):
     """
     Get proposals for a specific job (for job owners)
+
+    POST accepts and rejects pending proposals in one transaction, e.g.
+    ``{"accept": [12], "reject_others": true}`` to hire one freelancer and
+    turn down everyone else. Accepting closes the job.
+    """
+    if request.method == 'POST':
+        return decide_proposals(request, job_id)
+
+    if Job.objects.filter(id=job_id, client=request.user).exists():
+        proposals = Proposal.objects.filter(job_id=job_id)
+    elif ArchivedJob.objects.filter(id=job_id, client=request.user).exists():
+        proposals = ArchivedProposal.objects.filter(job_id=job_id)
+    else:
+        return Response(
+            {'error': 'Job not found or you are not the owner'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    row_serializer = sparse_row_serializer(request, PROPOSAL_ROW_SERIALIZER)
+    return Response(row_serializer.serialize(row_serializer.values(proposals)))
+
+
+def decide_proposals(request, job_id):
     """
+    Apply a job owner's accept/reject decisions (POST to job_proposals)
+    """
+    serializer = ProposalDecisionSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
     try:
-        job = Job.objects.get(id=job_id, client=request.user)
+        decision = hiring.decide(job_id, request.user, **serializer.validated_data)
     except Job.DoesNotExist:
         return Response(
             {'error': 'Job not found or you are not the owner'},
             status=status.HTTP_404_NOT_FOUND
         )
-    
-    proposals = Proposal.objects.filter(job=job)
-    serializer = ProposalSerializer(proposals, many=True)
-    return Response(serializer.data)
+    except hiring.DecisionConflict as exc:
+        return Response({'error': str(exc), 'proposals': exc.proposal_ids}, status=status.HTTP_409_CONFLICT)
+    return Response({
+        'job_id': decision.job_id,
+        'is_active': decision.is_active,
+        'accepted': decision.accepted,
+        'rejected': decision.rejected,
+    })
+
+
+_money = drf_serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def dashboard(request):
+    """
+    Everything the dashboard page needs in one response
+
+    Returns the user's profile, counts, and either their most recent jobs
+    with per-job proposal summaries (clients) or their most recent
+    proposals (freelancers). The query count does not depend on how many
+    jobs or proposals the user has.
+    """
+    user = request.user
+    data = {'user': UserSerializer(user).data}
+
+    if hasattr(user, 'profile') and user.profile.is_freelancer:
+        data['counts'] = Proposal.objects.filter(freelancer=user).aggregate(
+            proposals=Count('id'),
+            pending=Count('id', filter=Q(status='pending')),
+            accepted=Count('id', filter=Q(status='accepted')),
+            rejected=Count('id', filter=Q(status='rejected')),
+        )
+        proposals = Proposal.objects.filter(freelancer=user)[:DASHBOARD_LIMIT]
+        data['proposals'] = PROPOSAL_ROW_SERIALIZER.serialize(PROPOSAL_ROW_SERIALIZER.values(proposals), request)
+        return Response(data)
+
+    data['counts'] = Job.objects.filter(client=user).aggregate(
+        jobs=Count('id', distinct=True),
+        active_jobs=Count('id', distinct=True, filter=Q(is_active=True)),
+        proposals_received=Count('proposals'),
+        proposals_pending=Count('proposals', filter=Q(proposals__status='pending')),
+    )
+
+    columns = JOB_ROW_SERIALIZER.columns
+    summary = ['proposal_count', 'pending', 'accepted', 'rejected', 'lowest_bid', 'average_bid']
+    jobs = Job.objects.filter(client=user).annotate(
+        proposal_count=Count('proposals'),
+        pending=Count('proposals', filter=Q(proposals__status='pending')),
+        accepted=Count('proposals', filter=Q(proposals__status='accepted')),
+        rejected=Count('proposals', filter=Q(proposals__status='rejected')),
+        lowest_bid=Min('proposals__bid_amount'),
+        average_bid=Avg('proposals__bid_amount'),
+    ).order_by('-created_at').values_list(*columns, *summary)[:DASHBOARD_LIMIT]
+
+    data['jobs'] = []
+    rows = list(jobs)
+    for job, row in zip(JOB_ROW_SERIALIZER.serialize(rows, request), rows):
+        counts = dict(zip(summary, row[len(columns):]))
+        for key in ('lowest_bid', 'average_bid'):
+            if counts[key] is not None:
+                counts[key] = _money.to_representation(counts[key])
+        job['proposals'] = counts
+        data['jobs'].append(job)
+    return Response(data)
+
+
+def metrics(request):
+    """
+    Expose aggregated metrics in the Prometheus text format.
+
+    Scrapers must send METRICS_TOKEN as a Bearer token. Without a token the
+    endpoint is only open when DEBUG is on.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(metrics_registry.render(), content_type=metrics_registry.CONTENT_TYPE)
@@ -2,6 +2,9 @@
 ASGI config for flexilance project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests for the event stream go to ``core.sse.stream``; everything else is
+handled by Django, or refused with 404 when ``ASGI_STREAM_ONLY`` is set and
+the API is served by the WSGI workers.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -9,8 +12,26 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "flexilance.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core import scheduler, sse  # noqa: E402
+
+STREAM_PATH = "/api/stream/"
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == STREAM_PATH:
+        await sse.stream(scope, receive, send)
+    elif scope["type"] == "http" and settings.ASGI_STREAM_ONLY:
+        await sse.not_found(send)
+    else:
+        await django_application(scope, receive, send)
+
+
+# Periodic tasks run in the serving processes only, not in manage.py commands
+scheduler.start()
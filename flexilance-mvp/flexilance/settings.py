@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -23,7 +26,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = "django-insecure-&nu0+8jwwoia6lcgk=(#-2^kmr!$gorm-9nkv*s#ynryvyc7t%"
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DEBUG', 'True') == 'True'
 
 ALLOWED_HOSTS = ['*']
 
@@ -45,7 +48,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.ServerTimingMiddleware",
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.QueryStatsMiddleware",
+    "core.middleware.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -121,6 +129,11 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
 STATIC_URL = "static/"
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+# collectstatic writes .gz (and .br when Brotli is installed) next to each
+# asset; WhiteNoise serves the precompressed variant the client accepts.
+STATICFILES_STORAGE = "whitenoise.storage.CompressedStaticFilesStorage"
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -130,11 +143,30 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Django REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'core.authentication.TimedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed JSON; falls back to the stdlib when orjson is missing
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Token buckets per user and per IP; see THROTTLE_* below
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.UserTokenBucketThrottle',
+        'core.throttling.IPTokenBucketThrottle',
+    ],
+    # Proxies in front of the app that append to X-Forwarded-For (Render: 1).
+    # The client IP is the entry that many hops from the right; 0 ignores the
+    # header and uses REMOTE_ADDR, so clients cannot pick their own bucket.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '0')),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
 }
@@ -152,42 +184,208 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # Cloudinary configuration with fallback to local storage
 CLOUDINARY_ENABLED = False  # Set to True when Cloudinary credentials are valid
 
-try:
-    import cloudinary
-    import cloudinary.uploader
-    import cloudinary.api
-    
-    # Check if we have valid Cloudinary credentials
-    cloud_name = os.environ.get('CLOUDINARY_CLOUD_NAME', 'da5ffidmp')
-    api_key = os.environ.get('CLOUDINARY_API_KEY', '958895321617771')
-    api_secret = os.environ.get('CLOUDINARY_API_SECRET', 'TiyAqGUFbM6fKU-Q04LBMbCRvA0')
-    
-    # Configure Cloudinary for django-cloudinary-storage
-    CLOUDINARY_STORAGE = {
-        'CLOUD_NAME': cloud_name,
-        'API_KEY': api_key,
-        'API_SECRET': api_secret,
-    }
-    
-    # Test Cloudinary configuration
-    cloudinary.config(
-        cloud_name=cloud_name,
-        api_key=api_key,
-        api_secret=api_secret,
-        secure=True
-    )
-    
-    # Try a simple API call to validate credentials
-    # If this fails, we'll fall back to local storage
-    cloudinary.api.ping()
-    
-    # If we get here, Cloudinary is working
-    CLOUDINARY_ENABLED = True
-    DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
-    print("SUCCESS: Cloudinary storage enabled successfully")
-    
-except Exception as e:
-    # Fall back to local storage
-    CLOUDINARY_ENABLED = False
+# CLOUDINARY_CHECK=False skips the startup ping (a network call) and uses
+# local storage, e.g. for tests and offline development.
+if os.environ.get('CLOUDINARY_CHECK', 'True') == 'True':
+    try:
+        import cloudinary
+        import cloudinary.uploader
+        import cloudinary.api
+
+        # Check if we have valid Cloudinary credentials
+        cloud_name = os.environ.get('CLOUDINARY_CLOUD_NAME', 'da5ffidmp')
+        api_key = os.environ.get('CLOUDINARY_API_KEY', '958895321617771')
+        api_secret = os.environ.get('CLOUDINARY_API_SECRET', 'TiyAqGUFbM6fKU-Q04LBMbCRvA0')
+
+        # Configure Cloudinary for django-cloudinary-storage
+        CLOUDINARY_STORAGE = {
+            'CLOUD_NAME': cloud_name,
+            'API_KEY': api_key,
+            'API_SECRET': api_secret,
+        }
+
+        # Test Cloudinary configuration
+        cloudinary.config(
+            cloud_name=cloud_name,
+            api_key=api_key,
+            api_secret=api_secret,
+            secure=True
+        )
+
+        # Try a simple API call to validate credentials
+        # If this fails, we'll fall back to local storage
+        cloudinary.api.ping()
+
+        # If we get here, Cloudinary is working
+        CLOUDINARY_ENABLED = True
+        DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+        print("SUCCESS: Cloudinary storage enabled successfully")
+
+    except Exception as e:
+        # Fall back to local storage
+        CLOUDINARY_ENABLED = False
+        DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+        print(f"Cloudinary not available, using local storage: {e}")
+else:
     DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
-    print(f"Cloudinary not available, using local storage: {e}")
+
+# Performance instrumentation
+# Fraction of requests (0.0-1.0) that get a Server-Timing header and a
+# timing line on the core.perf logger.
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get('SERVER_TIMING_SAMPLE_RATE', '0'))
+
+# Prometheus metrics at /metrics. With gunicorn, point METRICS_MULTIPROC_DIR
+# at a directory shared by the workers (e.g. /tmp/flexilance-metrics) so the
+# endpoint aggregates every worker. Scrapers send METRICS_TOKEN as a Bearer
+# token; without one the endpoint is refused unless DEBUG is on.
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# SQL fingerprint aggregation. Queries at or above SLOW_QUERY_THRESHOLD_MS
+# are logged on core.slowquery; per-process snapshots are written to
+# QUERY_STATS_DIR every QUERY_STATS_FLUSH_INTERVAL seconds for query_report.
+QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', 'True') == 'True'
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '200'))
+QUERY_STATS_DIR = os.environ.get('QUERY_STATS_DIR')
+QUERY_STATS_FLUSH_INTERVAL = float(os.environ.get('QUERY_STATS_FLUSH_INTERVAL', '30'))
+
+# Responses of at least COMPRESSION_MIN_SIZE bytes are brotli/gzip
+# compressed by core.middleware.CompressionMiddleware.
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+
+# Local media is served by core.media.serve_media. Behind nginx, set
+# MEDIA_ACCEL_REDIRECT_PREFIX to an internal location aliased to MEDIA_ROOT
+# (e.g. /protected-media/); behind Apache/lighttpd set MEDIA_SENDFILE_HEADER
+# (e.g. X-Sendfile). Otherwise files are streamed with sendfile by gunicorn.
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER', '')
+
+# Remote storage gateway (core.storage_gateway). Transient Cloudinary
+# failures are retried STORAGE_RETRIES times with jittered backoff; after
+# STORAGE_CIRCUIT_THRESHOLD consecutive failures uploads go straight to
+# local storage for STORAGE_CIRCUIT_RESET seconds.
+STORAGE_RETRIES = int(os.environ.get('STORAGE_RETRIES', '2'))
+STORAGE_RETRY_BACKOFF = float(os.environ.get('STORAGE_RETRY_BACKOFF', '0.2'))
+STORAGE_CONNECT_TIMEOUT = float(os.environ.get('STORAGE_CONNECT_TIMEOUT', '3'))
+STORAGE_READ_TIMEOUT = float(os.environ.get('STORAGE_READ_TIMEOUT', '30'))
+STORAGE_CIRCUIT_THRESHOLD = int(os.environ.get('STORAGE_CIRCUIT_THRESHOLD', '5'))
+STORAGE_CIRCUIT_RESET = float(os.environ.get('STORAGE_CIRCUIT_RESET', '30'))
+
+# Direct uploads (core.uploads): tickets expire after UPLOAD_TICKET_MAX_AGE
+# seconds and allow files up to UPLOAD_MAX_SIZE bytes. Profile pictures take
+# UPLOAD_IMAGE_FORMATS, job and proposal attachments UPLOAD_ATTACHMENT_FORMATS.
+UPLOAD_TICKET_MAX_AGE = int(os.environ.get('UPLOAD_TICKET_MAX_AGE', '900'))
+UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', str(10 * 1024 * 1024)))
+UPLOAD_IMAGE_FORMATS = os.environ.get('UPLOAD_IMAGE_FORMATS', 'jpg,jpeg,png,gif,webp').split(',')
+UPLOAD_ATTACHMENT_FORMATS = os.environ.get(
+    'UPLOAD_ATTACHMENT_FORMATS', 'pdf,doc,docx,odt,rtf,txt,csv,xls,xlsx,ppt,pptx,zip,jpg,jpeg,png,gif,webp',
+).split(',')
+
+# Periodic tasks (core.scheduler). Each web worker checks every
+# SCHEDULER_TICK seconds for due tasks; a TaskLock row lets only one worker
+# run each. Expired jobs are deactivated every JOB_EXPIRY_INTERVAL seconds.
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'True') == 'True'
+SCHEDULER_TICK = float(os.environ.get('SCHEDULER_TICK', '5'))
+JOB_EXPIRY_INTERVAL = float(os.environ.get('JOB_EXPIRY_INTERVAL', '300'))
+JOB_EXPIRY_BATCH_SIZE = int(os.environ.get('JOB_EXPIRY_BATCH_SIZE', '500'))
+
+# Jobs inactive for ARCHIVE_AFTER_DAYS days are moved, with their proposals,
+# to the archive tables by `manage.py archive_jobs` (core.archive).
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '90'))
+
+# Notifications (core.notifications). Outbox events are delivered every
+# NOTIFICATION_DELIVERY_INTERVAL seconds in batches of NOTIFICATION_BATCH_SIZE;
+# unread notifications of the same group from the last
+# NOTIFICATION_COALESCE_WINDOW seconds are merged into one.
+NOTIFICATION_DELIVERY_INTERVAL = float(os.environ.get('NOTIFICATION_DELIVERY_INTERVAL', '5'))
+NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', '500'))
+NOTIFICATION_COALESCE_WINDOW = float(os.environ.get('NOTIFICATION_COALESCE_WINDOW', '600'))
+
+# Event stream (core.sse, served by flexilance.asgi). PUBSUB_BACKEND is
+# 'local' (one process) or 'postgres' (LISTEN/NOTIFY between processes); it
+# follows the database engine unless set, and 'postgres' needs PostgreSQL.
+# ASGI_STREAM_ONLY makes the ASGI app answer /api/stream/ only, for a stream
+# service running next to the WSGI API. Idle streams get a heartbeat every
+# SSE_HEARTBEAT_INTERVAL seconds; a client more than SSE_QUEUE_SIZE events
+# behind is disconnected.
+PUBSUB_BACKEND = os.environ.get(
+    'PUBSUB_BACKEND',
+    'postgres' if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql' else 'local',
+)
+if PUBSUB_BACKEND == 'postgres' and DATABASES['default']['ENGINE'] != 'django.db.backends.postgresql':
+    raise ImproperlyConfigured('PUBSUB_BACKEND=postgres needs a PostgreSQL default database')
+ASGI_STREAM_ONLY = os.environ.get('ASGI_STREAM_ONLY', 'False') == 'True'
+SSE_HEARTBEAT_INTERVAL = float(os.environ.get('SSE_HEARTBEAT_INTERVAL', '25'))
+SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', '100'))
+
+# Escrow payments (core.escrow) go through PAYMENT_GATEWAY, a dotted path to
+# a core.payment_gateway.PaymentGateway subclass. It must be set when DEBUG is
+# off; in DEBUG the in-process FakePaystackGateway, which approves every
+# call, is the default. Every PAYMENT_RECONCILE_INTERVAL seconds, payments
+# pending for more than PAYMENT_PENDING_TIMEOUT seconds are looked up with the
+# gateway and settled.
+PAYMENT_GATEWAY = os.environ.get('PAYMENT_GATEWAY', 'core.payment_gateway.FakePaystackGateway' if DEBUG else '')
+if not PAYMENT_GATEWAY:
+    raise ImproperlyConfigured('PAYMENT_GATEWAY must be set when DEBUG is off')
+PAYMENT_RECONCILE_INTERVAL = float(os.environ.get('PAYMENT_RECONCILE_INTERVAL', '300'))
+PAYMENT_PENDING_TIMEOUT = int(os.environ.get('PAYMENT_PENDING_TIMEOUT', '900'))
+
+# Idempotency keys (core.idempotency): responses to job and proposal creation
+# sent with an Idempotency-Key header are replayed for IDEMPOTENCY_KEY_TTL
+# seconds; expired keys are purged every IDEMPOTENCY_PURGE_INTERVAL seconds.
+# A key whose request has not finished after IDEMPOTENCY_CLAIM_TIMEOUT seconds
+# (its worker was killed) can be claimed again by a retry.
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', '86400'))
+IDEMPOTENCY_CLAIM_TIMEOUT = int(os.environ.get('IDEMPOTENCY_CLAIM_TIMEOUT', '120'))
+IDEMPOTENCY_PURGE_INTERVAL = float(os.environ.get('IDEMPOTENCY_PURGE_INTERVAL', '3600'))
+
+# Caches. Set REDIS_URL to share the cache (and cache-backed throttle
+# buckets) between hosts; otherwise each process has its own memory cache.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Rate limiting (core.throttling). Each user and each client IP has a token
+# bucket refilled at THROTTLE_RATES; a request spends THROTTLE_COSTS[url
+# name] tokens (default 1, 'job-search' for /api/jobs/?search=). With
+# THROTTLE_STORE_PATH set, buckets live in a shared memory file used by all
+# workers on the host; otherwise in the THROTTLE_CACHE cache.
+THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', 'False') == 'True'
+THROTTLE_RATES = {
+    'user': os.environ.get('THROTTLE_USER_RATE', '300/min'),
+    'ip': os.environ.get('THROTTLE_IP_RATE', '600/min'),
+}
+THROTTLE_COSTS = {
+    'register': 20,
+    'api-token-auth': 20,
+    'job-search': 5,
+}
+THROTTLE_STORE_PATH = os.environ.get('THROTTLE_STORE_PATH')
+THROTTLE_STORE_SLOTS = int(os.environ.get('THROTTLE_STORE_SLOTS', '65536'))
+THROTTLE_CACHE = os.environ.get('THROTTLE_CACHE', 'default')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core': {
+            'handlers': ['console'],
+            'level': os.environ.get('CORE_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
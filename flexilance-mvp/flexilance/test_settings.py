@@ -0,0 +1,40 @@
+"""
+Settings for the test suite.
+
+``manage.py test`` uses this module unless DJANGO_SETTINGS_MODULE is set.
+It keeps the production settings but removes what makes tests slow or
+flaky: the Cloudinary ping at import, PBKDF2 password hashing, media
+files written to disk, and the background scheduler. Payments go through
+the in-process FakePaystackGateway whatever DEBUG is.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault('CLOUDINARY_CHECK', 'False')
+os.environ.setdefault('PAYMENT_GATEWAY', 'core.payment_gateway.FakePaystackGateway')
+
+from .settings import *  # noqa: E402,F401,F403
+
+# Hashing is not under test; MD5 makes create_user and login ~1000x cheaper
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# Uploads stay in memory. Tests that serve or clean up files on disk
+# override STORAGES and MEDIA_ROOT with a temporary directory.
+del DEFAULT_FILE_STORAGE, STATICFILES_STORAGE  # noqa: F821
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedStaticFilesStorage'},
+}
+# One directory per run: the process that creates it removes it at exit, and
+# parallel workers, which inherit the environment, reuse it.
+MEDIA_ROOT = os.environ.get('FLEXILANCE_TEST_MEDIA_ROOT')
+if not MEDIA_ROOT:
+    MEDIA_ROOT = os.environ['FLEXILANCE_TEST_MEDIA_ROOT'] = tempfile.mkdtemp(prefix='flexilance-media-')
+    atexit.register(shutil.rmtree, MEDIA_ROOT, True)
+
+SCHEDULER_ENABLED = False
+METRICS_MULTIPROC_DIR = None
+QUERY_STATS_DIR = None
+THROTTLE_STORE_PATH = None
@@ -15,12 +15,26 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.authtoken import views
+from rest_framework.settings import api_settings
+from core.media import serve_media
+from core.views import metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("core.urls")),
-    path("api-token-auth/", views.obtain_auth_token),
+    path(
+        "api-token-auth/",
+        views.ObtainAuthToken.as_view(throttle_classes=api_settings.DEFAULT_THROTTLE_CLASSES),
+        name="api-token-auth",
+    ),
+    path("metrics", metrics, name="metrics"),
 ]
+
+# Also mounted with Cloudinary enabled, for files the local fallback wrote
+urlpatterns.append(
+    re_path(rf"^{settings.MEDIA_URL.strip('/')}/(?P<path>.+)$", serve_media, name="media"),
+)
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "flexilance.settings")
 
 application = get_wsgi_application()
+
+# Periodic tasks run in the serving processes only, not in manage.py commands
+from core import scheduler  # noqa: E402
+
+scheduler.start()